@@ -0,0 +1,90 @@
+"""
+مقارنة إزالة العبارات المحتواة: الحلقة الأصلية (issubset) مقابل dedup_contained
+
+يبني فهرس العبارات للمصحف كاملاً في الذاكرة من data/ (بدون قاعدة بيانات)،
+ثم يكرر خطوات start_test حتى الـ dedup لنطاقات 1 و5 و30 جزءاً.
+
+    python benchmarks/bench_phrase_dedup.py
+"""
+import argparse
+import json
+import time
+
+from bench_phrase_engines import BASE_DIR, load_ayat  # يُهيّئ Django
+
+from core.normalization import normalize
+from core.services.corpus_service import QuranCorpus
+from core.services.phrase_dedup import dedup_contained
+from core.services.phrase_index import ngram_occurrences, select_longest_per_ayah_set
+
+
+def naive_dedup(ordered, sets):
+    kept, kept_sets = [], []
+    for pid in ordered:
+        aset = sets[pid]
+        if any(aset.issubset(S) for S in kept_sets): continue
+        kept.append(pid); kept_sets.append(aset)
+    return kept
+
+
+def build_corpus(engine, max_freq):
+    juz_data = json.loads((BASE_DIR / 'data' / 'quran-metadata-juz.json').read_text(encoding='utf-8'))
+    ayah_data = json.loads((BASE_DIR / 'data' / 'quran-metadata-ayah.json').read_text(encoding='utf-8'))
+    juz_of = {}
+    for j_no, info in juz_data.items():
+        for s, rng in info.get('verse_mapping', {}).items():
+            a1, a2 = map(int, rng.split('-'))
+            for a in range(a1, a2 + 1):
+                juz_of[(int(s), a)] = int(j_no)
+
+    ayat = load_ayat(1, 30)
+    kept = ngram_occurrences(ayat, 3, 7, 2, max_freq, normalize, engine=engine)
+    selected = select_longest_per_ayah_set(kept)
+    phrase_rows, occ_rows = [], []
+    for pid, (norm, occs) in enumerate(selected, 1):
+        phrase_rows.append((pid, occs[0][3], norm, len(norm.split()), len(occs), 0.0))
+        occ_rows.extend((pid, a, s, e) for a, s, e, _ in occs)
+
+    # ربع واحد لكل جزء يكفي لتحديد النطاق هنا
+    ayah_rows = []
+    for v in ayah_data.values():
+        j = juz_of[(v['surah_number'], v['ayah_number'])]
+        ayah_rows.append((v['id'], v['surah_number'], v['ayah_number'], j, j, None, None, v['text']))
+    return QuranCorpus(
+        version='bench', ayah_rows=ayah_rows,
+        quarter_rows=[(j, j, 1, f"juz {j}") for j in range(1, 31)],
+        phrase_rows=phrase_rows, occurrence_rows=occ_rows, normalize=normalize,
+    )
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--engine', default='python', choices=['python', 'numpy'])
+    p.add_argument('--max-freq', type=int, default=10 ** 6,
+                   help="سقف التكرار عند بناء الفهرس (افتراضياً بلا سقف لتكبير عدد المرشحين)")
+    p.add_argument('--repeat', type=int, default=3)
+    o = p.parse_args()
+
+    corpus = build_corpus(o.engine, o.max_freq)
+    print(f"{'juz':>4} {'phrases':>8} {'kept':>6} {'issubset s':>11} {'bitset s':>9} {'speedup':>8}")
+    for n_juz in (1, 5, 30):
+        juz = list(range(1, n_juz + 1))
+        scope = corpus.scope_ayah_indices(juz)
+        freq = {pid: f for pid, f in corpus.scope_phrase_frequencies(juz).items() if f >= 2}
+        sets = corpus.phrase_ayah_sets(scope, freq)
+        ordered = sorted(freq, key=lambda pid: (-corpus.phrase(pid).length_words, -freq[pid], corpus.phrase(pid).text))
+
+        def best(fn):
+            t_best = float('inf')
+            for _ in range(o.repeat):
+                t = time.perf_counter(); out = fn(ordered, sets); t_best = min(t_best, time.perf_counter() - t)
+            return t_best, out
+
+        t_naive, kept_naive = best(naive_dedup)
+        t_bits, kept_bits = best(dedup_contained)
+        assert kept_naive == kept_bits
+        print(f"{n_juz:>4} {len(ordered):>8} {len(kept_bits):>6} {t_naive:>11.3f} {t_bits:>9.4f} {t_naive / t_bits:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
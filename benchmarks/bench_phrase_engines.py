@@ -0,0 +1,81 @@
+"""
+مقارنة محركات بناء فهرس العبارات (python / numpy / suffix) على بيانات data/
+
+يقرأ الآيات من data/quran-metadata-ayah.json مباشرة (بدون قاعدة بيانات)
+ويقيس الزمن وذروة الذاكرة وعدد العبارات الناتجة وأطول عبارة.
+
+    python benchmarks/bench_phrase_engines.py --juz-from 1 --juz-to 30
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quran_helper.settings')
+
+import django  # noqa: E402
+django.setup()
+
+from core.normalization import normalize  # noqa: E402
+from core.services.phrase_index import ENGINES, ngram_occurrences, select_longest_per_ayah_set  # noqa: E402
+
+
+def load_ayat(juz_from, juz_to):
+    data_dir = BASE_DIR / 'data'
+    ayah_data = json.loads((data_dir / 'quran-metadata-ayah.json').read_text(encoding='utf-8'))
+    juz_data = json.loads((data_dir / 'quran-metadata-juz.json').read_text(encoding='utf-8'))
+    in_scope = set()
+    for j_no, info in juz_data.items():
+        if juz_from <= int(j_no) <= juz_to:
+            for s, rng in info.get('verse_mapping', {}).items():
+                a1, a2 = map(int, rng.split('-'))
+                in_scope.update(f"{s}:{a}" for a in range(a1, a2 + 1))
+    rows = [v for v in ayah_data.values() if v['verse_key'] in in_scope]
+    rows.sort(key=lambda v: (v['surah_number'], v['ayah_number']))
+    return [(v['id'], v['text']) for v in rows]
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--juz-from', type=int, default=1)
+    p.add_argument('--juz-to', type=int, default=30)
+    p.add_argument('--min-n', type=int, default=3)
+    p.add_argument('--max-n', type=int, default=7)
+    p.add_argument('--min-freq', type=int, default=2)
+    p.add_argument('--max-freq', type=int, default=60)
+    p.add_argument('--engines', nargs='+', default=list(ENGINES), choices=ENGINES)
+    p.add_argument('--repeat', type=int, default=3)
+    o = p.parse_args()
+
+    ayat = load_ayat(o.juz_from, o.juz_to)
+    words = sum(len(t.split()) for _, t in ayat)
+    print(f"juz {o.juz_from}-{o.juz_to}: {len(ayat)} ayat, {words} words")
+    print(f"{'engine':<8} {'best s':>8} {'peak MB':>8} {'phrases':>8} {'occ':>8} {'longest':>8}")
+
+    for engine in o.engines:
+        try:
+            best = float('inf')
+            for _ in range(o.repeat):
+                t = time.perf_counter()
+                kept = ngram_occurrences(ayat, o.min_n, o.max_n, o.min_freq, o.max_freq, normalize, engine=engine)
+                selected = select_longest_per_ayah_set(kept)
+                best = min(best, time.perf_counter() - t)
+            tracemalloc.start()
+            ngram_occurrences(ayat, o.min_n, o.max_n, o.min_freq, o.max_freq, normalize, engine=engine)
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        except ImportError as exc:
+            print(f"{engine:<8} skipped ({exc})")
+            continue
+        longest = max((len(norm.split()) for norm, _ in selected), default=0)
+        occ = sum(len(v) for _, v in selected)
+        print(f"{engine:<8} {best:8.2f} {peak:8.1f} {len(selected):8d} {occ:8d} {longest:8d}")
+
+
+if __name__ == '__main__':
+    main()
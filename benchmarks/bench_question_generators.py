@@ -0,0 +1,70 @@
+"""
+زمن توليد الأسئلة لكل استراتيجية في QuestionGeneratorFactory حسب حجم النطاق
+
+يحمّل لقطة المصحف من قاعدة البيانات (بعد import_quran_data وlink_ayat_to_pages
+وbuild_phrases_ngrams)، ثم يقيس generate() لنطاقات 1 و5 و30 جزءاً:
+- cold: مجمّع المرشحين يُحسب في كل استدعاء (أول طالب على نطاق جديد)
+- warm: المجمّع جاهز (QuestionPool محفوظ) فيبقى الاختيار وبناء المواضع فقط
+
+    python benchmarks/bench_question_generators.py --num-questions 20
+"""
+import argparse
+import random
+import statistics
+import time
+
+from bench_phrase_engines import BASE_DIR  # noqa: F401  يُهيّئ Django
+
+from core.services.corpus_service import load_corpus
+from core.services.question_pool import build_pool
+from tests_app.question_generators.similar_count import SimilarCountQuestionGenerator
+from tests_app.question_generators.similar_on_pages import SimilarOnPagesQuestionGenerator
+from tests_app.question_generators.verse_location_quarters import VerseLocationQuestionGenerator
+
+
+def warm(generator_cls):
+    """نفس الاستراتيجية مع مجمّع محسوب مرة واحدة لكل نطاق"""
+
+    class Warm(generator_cls):
+        pools = {}
+
+        def pool(self, corpus, juz_ids, quarter_ids):
+            key = (tuple(juz_ids), tuple(quarter_ids))
+            if key not in self.pools:
+                self.pools[key] = build_pool(corpus, sorted(set(corpus.scope_quarter_ids(juz_ids, quarter_ids))))
+            return self.pools[key]
+
+    return Warm(pool_store=False)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--num-questions', type=int, default=20)
+    p.add_argument('--difficulty', default='mixed', choices=['easy', 'medium', 'hard', 'mixed'])
+    p.add_argument('--repeat', type=int, default=20)
+    o = p.parse_args()
+
+    corpus = load_corpus()
+    strategies = [
+        ('similar_count cold', SimilarCountQuestionGenerator(pool_store=False)),
+        ('similar_count warm', warm(SimilarCountQuestionGenerator)),
+        ('similar_on_pages warm', warm(SimilarOnPagesQuestionGenerator)),
+        ('verse_location', VerseLocationQuestionGenerator()),
+    ]
+    print(f"{'strategy':<22} {'juz':>4} {'ayat':>6} {'questions':>9} {'median ms':>10} {'max ms':>8}")
+    for name, gen in strategies:
+        for n_juz in (1, 5, 30):
+            juz = list(range(1, n_juz + 1))
+            rng = random.Random(0)
+            gen.generate(None, o.num_questions, o.difficulty, juz_ids=juz, corpus=corpus, rng=rng)
+            times, produced = [], 0
+            for _ in range(o.repeat):
+                t = time.perf_counter()
+                produced = len(gen.generate(None, o.num_questions, o.difficulty, juz_ids=juz, corpus=corpus, rng=rng))
+                times.append((time.perf_counter() - t) * 1000)
+            print(f"{name:<22} {n_juz:>4} {len(corpus.scope_ayah_indices(juz)):>6} {produced:>9} "
+                  f"{statistics.median(times):>10.2f} {max(times):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
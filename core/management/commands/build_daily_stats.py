@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services.daily_stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "بناء التجميع اليومي لإحصائيات الطلاب (StudentDailyStats) من الجلسات المكتملة"
+
+    def handle(self, *args, **options):
+        t = time.perf_counter()
+        count = rebuild_daily_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"StudentDailyStats rows: {count:,} in {time.perf_counter() - t:.2f}s"))
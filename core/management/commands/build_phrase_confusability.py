@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Ayah, Phrase, PhraseOccurrence
+from core.services.confusability import BANDS, confusability_bucket, incoming_matches, iter_matching_ayah, score_phrases
+from core.services.corpus_service import bump_corpus_version
+
+
+class Command(BaseCommand):
+    help = "حساب درجة الالتباس لكل عبارة (Phrase.confusability) من data/matching-ayah.json ومواضع العبارات"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=str(settings.BASE_DIR / 'data' / 'matching-ayah.json'))
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        t = time.perf_counter()
+        index = incoming_matches(iter_matching_ayah(options['file']))
+        ayah_keys = {aid: (s, n) for aid, s, n in Ayah.objects.values_list('id', 'surah', 'number')}
+        rows = (PhraseOccurrence.objects.order_by('phrase_id', 'ayah_id', 'start_word')
+                .values_list('phrase_id', 'ayah_id', 'start_word', 'end_word')
+                .iterator(chunk_size=options['batch_size']))
+
+        counts = dict.fromkeys(BANDS, 0)
+        batch, total = [], 0
+        with transaction.atomic():
+            # العبارات بلا مواضع لا تظهر في أي اختبار
+            Phrase.objects.filter(occurrences__isnull=True).update(confusability=0.0)
+            for pid, score in score_phrases(rows, ayah_keys, index):
+                batch.append(Phrase(id=pid, confusability=score))
+                counts[confusability_bucket(score)] += 1
+                if len(batch) >= options['batch_size']:
+                    Phrase.objects.bulk_update(batch, ['confusability'])
+                    total += len(batch)
+                    batch = []
+            Phrase.objects.bulk_update(batch, ['confusability'])
+            total += len(batch)
+            transaction.on_commit(bump_corpus_version)
+
+        bands = ', '.join(f"{name} {n:,}" for name, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Phrase.confusability: {total:,} phrases ({bands}) in {time.perf_counter() - t:.2f}s"))
@@ -1,18 +1,9 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from core.models import Ayah, Phrase, PhraseOccurrence
-import re, unicodedata
-from collections import defaultdict
-
-DIAC = re.compile(r'[\u064B-\u0652\u0670\u06DF-\u06ED]')
-def normalize(txt: str) -> str:
-    txt = unicodedata.normalize('NFKD', txt)
-    txt = DIAC.sub('', txt)
-    txt = (txt.replace('إ','ا').replace('أ','ا').replace('آ','ا')
-               .replace('ة','ه').replace('ى','ي'))
-    txt = re.sub(r'[^\w\s]', ' ', txt)
-    txt = re.sub(r'\s+', ' ', txt).strip()
-    return txt
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Ayah
+from core.services.phrase_index import ENGINES, ngram_occurrences, select_longest_per_ayah_set
+from core.services.phrase_index_service import PhraseIndexService
+from core.normalization import normalize
+import time
 
 class Command(BaseCommand):
     help = "Build Tarateel-like phrase index from Ayah.text using n-grams"
@@ -24,67 +15,65 @@ class Command(BaseCommand):
         p.add_argument('--max-n', type=int, default=7)
         p.add_argument('--min-freq', type=int, default=2)
         p.add_argument('--max-freq', type=int, default=60)
+        p.add_argument('--engine', choices=ENGINES, default='python',
+                       help="numpy: مفاتيح n-gram صحيحة وعدّ دفعة واحدة (أسرع بكثير للمصحف كاملاً)؛ "
+                            "suffix: تكرارات عظمى بأي طول عبر مصفوفة لاحقات + LCP (يتجاهل --max-n)")
+        p.add_argument('--batch-size', type=int, default=2000,
+                       help="حجم دفعة bulk_create")
+        p.add_argument('--incremental', action='store_true',
+                       help="إعادة فهرسة آيات نطاق الأجزاء فقط وترك باقي الفهرس كما هو")
 
-    @transaction.atomic
     def handle(self, *a, **o):
         jf, jt = o['juz_from'], o['juz_to']
         min_n, max_n = o['min_n'], o['max_n']
         min_f, max_f = o['min_freq'], o['max_freq']
+        engine, batch = o['engine'], o['batch_size']
 
-        # اجمع آيات النطاق
-        ayat = (Ayah.objects
-                .filter(quarter__juz__number__gte=jf, quarter__juz__number__lte=jt)
-                .select_related('quarter__juz')
-                .order_by('surah','number'))
+        if engine == 'numpy':
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                raise CommandError("--engine numpy يحتاج تثبيت numpy (موجودة في requirements.txt)")
 
-        # ابنِ n-grams
-        occs = defaultdict(list)   # norm_phrase -> list of (ayah_id, s, e, raw_text)
-        for a in ayat:
-            words = a.text.split()
-            words_norm = [normalize(w) for w in words]
-            L = len(words)
-            for n in range(min_n, max_n+1):
-                if n > L: break
-                for i in range(0, L-n+1):
-                    raw = " ".join(words[i:i+n]).strip()
-                    norm = normalize(raw)
-                    if len(norm.split()) < min_n:  # أمان إضافي
-                        continue
-                    occs[norm].append((a.id, i+1, i+n, raw))
+        timings = []
+        t0 = time.perf_counter()
+        def stage(name):
+            nonlocal t0
+            now = time.perf_counter()
+            timings.append((name, now - t0))
+            t0 = now
 
-        # فلترة بالتكرار
-        kept = {k:v for k,v in occs.items() if min_f <= len(v) <= max_f}
+        # اجمع آيات النطاق
+        ayat = list(Ayah.objects
+                    .filter(quarter__juz__number__gte=jf, quarter__juz__number__lte=jt)
+                    .order_by('surah', 'number')
+                    .values_list('id', 'text'))
+        stage('load ayat')
 
-        # تجميع حسب مجموعة الآيات المتطابقة ثم اختيار "الأطول"
-        groups = defaultdict(list)  # frozenset(ayah_ids) -> [ (norm, occ_list) ]
-        for norm, v in kept.items():
-            ayids = frozenset(o[0] for o in v)
-            groups[ayids].append((norm, v))
+        # ابنِ n-grams + فلترة بالتكرار
+        kept = ngram_occurrences(ayat, min_n, max_n, min_f, max_f, normalize, engine=engine)
+        stage(f'n-grams ({engine})')
 
-        PhraseOccurrence.objects.all().delete()
-        Phrase.objects.all().delete()
+        # تجميع حسب مجموعة الآيات المتطابقة ثم اختيار "الأطول"
+        selected = select_longest_per_ayah_set(kept)
+        stage('group by ayah set')
 
-        total_phrases = 0
-        total_occ = 0
-        for ayids, items in groups.items():
-            # اختَر الأطول (بعدد الكلمات) ثم الأكثر وضوحاً كبديل
-            items.sort(key=lambda x: (-len(x[0].split()), -len(x[1])))
-            norm, v = items[0]
-            # استخدم أول raw كعرض
-            display_text = v[0][3]
-            ph = Phrase.objects.create(
-                text=display_text,
-                normalized=norm,
-                length_words=len(norm.split()),
-                global_freq=len(v)
-            )
-            total_phrases += 1
-            for ay_id, s, e, _ in v:
-                PhraseOccurrence.objects.create(
-                    phrase=ph, ayah_id=ay_id, start_word=s, end_word=e
-                )
-                total_occ += 1
+        # كتابة تزايدية: مقارنة مع الموجود وإضافة/حذف الفرق فقط في معاملة واحدة
+        # (بدون --incremental النطاق هو كل الآيات، فيُحذف ما خارج نطاق الأجزاء كما كان)
+        stats = PhraseIndexService(batch_size=batch).apply(
+            ((norm, v[0][3], [(ay_id, s, e) for ay_id, s, e, _ in v]) for norm, v in selected),
+            scope_ayah_ids=[ay_id for ay_id, _ in ayat] if o['incremental'] else None,
+        )
+        stage('write index (diff)')
 
+        for name, secs in timings:
+            self.stdout.write(f"  {name:<22} {secs:8.2f}s")
+        self.stdout.write(f"  {'total':<22} {sum(t for _, t in timings):8.2f}s")
+        self.stdout.write(
+            f"  phrases +{stats['phrases_created']} -{stats['phrases_deleted']} "
+            f"(global_freq updated: {stats['phrases_freq_updated']}), "
+            f"occurrences +{stats['occurrences_added']} -{stats['occurrences_deleted']}"
+        )
         self.stdout.write(self.style.SUCCESS(
-            f"Built phrases: {total_phrases}, occurrences: {total_occ}"
+            f"Built phrases: {stats['phrases']}, occurrences: {stats['occurrences']}"
         ))
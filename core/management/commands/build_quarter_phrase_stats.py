@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.services.phrase_index_service import PhraseIndexService
+
+
+class Command(BaseCommand):
+    help = "إعادة بناء مصفوفة تكرار العبارات لكل ربع (QuarterPhraseStat) من PhraseOccurrence"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quarter', type=int, action='append', dest='quarters',
+                            help="ربع محدد (يمكن التكرار)؛ بدونه تُبنى كل الأرباع")
+
+    def handle(self, *args, **options):
+        rows = PhraseIndexService().rebuild_quarter_stats(options['quarters'])
+        self.stdout.write(self.style.SUCCESS(f"QuarterPhraseStat rows: {rows:,}"))
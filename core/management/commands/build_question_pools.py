@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services.question_pool_service import QuestionPoolService
+
+
+class Command(BaseCommand):
+    help = "حساب مجمّعات مرشحي أسئلة المتشابهات مسبقاً لكل ربع ولكل جزء (QuestionPool)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--level', choices=['quarter', 'juz', 'all'], default='all',
+                            help="نطاقات الحساب: كل ربع منفرداً، كل جزء كاملاً، أو الاثنين")
+
+    def handle(self, *args, **options):
+        service = QuestionPoolService()
+        corpus = service.corpus
+        scopes = []
+        if options['level'] in ('quarter', 'all'):
+            scopes.extend([qid] for qid in sorted(corpus.quarters))
+        if options['level'] in ('juz', 'all'):
+            scopes.extend([q.id for q in qs] for _, qs in sorted(corpus.quarters_by_juz.items()))
+
+        t = time.perf_counter()
+        count = service.precompute(scopes)
+        self.stdout.write(self.style.SUCCESS(
+            f"QuestionPool rows: {count:,} (corpus {corpus.version}) in {time.perf_counter() - t:.2f}s"))
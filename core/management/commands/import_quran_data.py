@@ -1,9 +1,12 @@
 from django.core.management.base import BaseCommand
-from core.models import Juz, Quarter, Ayah, Phrase, PhraseOccurrence
+from core.models import Juz, Quarter, Ayah
+from core.normalization import normalize, normalize_words, words_by_offset
+from core.services.phrase_index_service import PhraseIndexService
+from core.services.quarter_boundaries import rebuild_quarter_bounds
+from django.db import transaction
 import json
+import time
 from pathlib import Path
-import re
-import unicodedata
 from collections import defaultdict
 
 # -------- إعدادات النطاق --------
@@ -11,21 +14,7 @@ FIRST_JUZ = 1
 LAST_JUZ  = 4
 
 # -------- أدوات التطبيع --------
-DIAC = re.compile(r'[\u064B-\u0652\u0670\u06DF-\u06ED]')
-
-def normalize(txt: str) -> str:
-    """تطبيع نص عربي: إزالة التشكيل وتوحيد الهمزات والتاء المربوطة… إلخ."""
-    txt = unicodedata.normalize('NFKD', txt)
-    txt = DIAC.sub('', txt)
-    txt = (txt
-           .replace('إ', 'ا')
-           .replace('أ', 'ا')
-           .replace('آ', 'ا')
-           .replace('ة', 'ه')
-           .replace('ى', 'ي'))
-    txt = re.sub(r'[^\w\s]', ' ', txt)
-    txt = re.sub(r'\s+', ' ', txt).strip()
-    return txt
+# normalize موحّدة مع فهرسة العبارات والمطابقة والتظليل
 
 def find_span(words_norm, phrase_norm_words):
     """
@@ -110,6 +99,14 @@ def _parse_match_words(match_words):
 class Command(BaseCommand):
     help = "Import Quran metadata + build Phrase & PhraseOccurrence from matching-ayah.json"
 
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help="إعادة فهرسة عبارات آيات نطاق الاستيراد فقط وترك باقي الفهرس")
+        parser.add_argument('--juz-from', type=int, default=FIRST_JUZ)
+        parser.add_argument('--juz-to', type=int, default=LAST_JUZ)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="حجم دفعة bulk_create / bulk_update")
+
     def handle(self, *args, **opts):
         base_dir = Path(__file__).resolve().parent.parent.parent.parent
         data_dir = base_dir / "data"
@@ -124,29 +121,45 @@ class Command(BaseCommand):
                 self.stderr.write(f"❌ Missing {p}")
                 return
 
+        first_juz, last_juz, batch = opts['juz_from'], opts['juz_to'], opts['batch_size']
+        timings = []
+        t0 = time.perf_counter()
+        def stage(name):
+            nonlocal t0
+            now = time.perf_counter()
+            timings.append((name, now - t0))
+            t0 = now
+
         ayah_data = json.loads(ayah_path.read_text(encoding="utf-8"))
         juz_data  = json.loads(juz_path.read_text(encoding="utf-8"))
         rub_data  = json.loads(rub_path.read_text(encoding="utf-8"))
         matches   = json.loads(match_path.read_text(encoding="utf-8"))
+        stage('read json')
 
         # -------- أجزاء Juz --------
         juz_map = {}   # verse_key -> juz_no
-        created_juz = []
+        juz_numbers = []
         for j_no_str, info in juz_data.items():
             j_no = int(j_no_str)
-            if not (FIRST_JUZ <= j_no <= LAST_JUZ):
+            if not (first_juz <= j_no <= last_juz):
                 continue
-            Juz.objects.get_or_create(number=j_no)
-            created_juz.append(j_no)
+            juz_numbers.append(j_no)
             for s_str, rng in info.get("verse_mapping", {}).items():
                 s = int(s_str)
                 a1, a2 = map(int, rng.split('-'))
                 for a in range(a1, a2 + 1):
                     juz_map[f"{s}:{a}"] = j_no
-        self.stdout.write(f"✔️ Juz done: {created_juz}")
+        existing_juz = set(Juz.objects.filter(number__in=juz_numbers).values_list('number', flat=True))
+        Juz.objects.bulk_create([Juz(number=j) for j in sorted(set(juz_numbers) - existing_juz)])
+        juz_ids = dict(Juz.objects.filter(number__in=juz_numbers).values_list('number', 'id'))
+        self.stdout.write(f"✔️ Juz done: {sorted(juz_numbers)}")
+        stage('juz')
 
         # -------- أرباع (Rubʿ) -> Quarter --------
-        rub_quarter = {}
+        text_by_key = {v["verse_key"]: v["text"] for v in ayah_data.values()}
+        rub_quarter_key = {}   # rub_no -> (juz_no, index_in_juz)
+        rub_verses = {}        # rub_no -> [verse_key, ...]
+        labels = {}            # (juz_no, index_in_juz) -> label
         idx_in_juz = defaultdict(int)
         # رتب بالأرقام
         for rub_no_str, info in sorted(rub_data.items(), key=lambda x: int(x[0])):
@@ -158,70 +171,88 @@ class Command(BaseCommand):
                 continue
             vk0 = verses[0]
             j_no = juz_map.get(vk0)
-            if not j_no or j_no > LAST_JUZ:
+            if not j_no:
                 continue
             idx_in_juz[j_no] += 1
-            juz_obj = Juz.objects.get(number=j_no)
+            key = (j_no, idx_in_juz[j_no])
 
             # أول 3 كلمات من أول آية كـ label للربع
-            first_text = next((v["text"] for v in ayah_data.values() if v["verse_key"] == vk0), "")
-            label = " ".join(first_text.split()[:3]) if first_text else f"Quarter {idx_in_juz[j_no]}"
-            q_obj, _ = Quarter.objects.get_or_create(
-                juz=juz_obj,
-                index_in_juz=idx_in_juz[j_no],
-                defaults={"label": label}
-            )
-            rub_quarter[int(rub_no_str)] = q_obj
+            first_text = text_by_key.get(vk0, "")
+            labels[key] = " ".join(first_text.split()[:3]) if first_text else f"Quarter {key[1]}"
+            rub_quarter_key[int(rub_no_str)] = key
+            rub_verses[int(rub_no_str)] = verses
+
+        def quarter_ids():
+            return {
+                (j_no, idx): qid for qid, j_no, idx in
+                Quarter.objects.filter(juz__number__in=juz_numbers).values_list('id', 'juz__number', 'index_in_juz')
+            }
+        existing_q = quarter_ids()
+        # نفس get_or_create السابقة: الربع الموجود يحتفظ بالـ label الخاص به
+        Quarter.objects.bulk_create([
+            Quarter(juz_id=juz_ids[j_no], index_in_juz=idx, label=labels[(j_no, idx)])
+            for (j_no, idx) in labels if (j_no, idx) not in existing_q
+        ], batch_size=batch)
+        q_id_by_key = quarter_ids()
+        quarter_of = {}   # verse_key -> quarter_id
+        for rub_no, verses in rub_verses.items():
+            qid = q_id_by_key[rub_quarter_key[rub_no]]
+            for vk in verses:
+                quarter_of[vk] = qid
         self.stdout.write("✔️ Quarters done")
+        stage('quarters')
 
-        # -------- إنشاء/تحديث آيات --------
+        # -------- إنشاء/تحديث آيات + ربطها بالأرباع --------
+        # كل آيات النطاق في الذاكرة ثم bulk_create للجديد وbulk_update للمتغير فقط
+        wanted = {}       # (surah, number) -> (verse_key, text, text_normalized, word_offsets)
+        words_cache = {}  # verse_key -> (words_raw, words_norm)
         for v in ayah_data.values():
             vk = v["verse_key"]
-            j_no = juz_map.get(vk)
-            if not j_no or j_no > LAST_JUZ:
-                continue
-            Ayah.objects.update_or_create(
-                surah=v["surah_number"],
-                number=v["ayah_number"],
-                defaults={"text": v["text"]}
-            )
-
-        # -------- ربط الآيات بالأرباع --------
-        for rub_no_str, info in sorted(rub_data.items(), key=lambda x: int(x[0])):
-            rub_no = int(rub_no_str)
-            q_obj = rub_quarter.get(rub_no)
-            if not q_obj:
+            if vk not in juz_map:
                 continue
-            for s_str, rng in info.get("verse_mapping", {}).items():
-                s = int(s_str); a1, a2 = map(int, rng.split('-'))
-                for a in range(a1, a2 + 1):
-                    Ayah.objects.filter(surah=s, number=a).update(quarter=q_obj)
-        self.stdout.write("✔️ Ayah objects assigned to quarters")
+            words_raw = v["text"].split()
+            tokens, offsets = normalize_words(v["text"])
+            text_norm, offsets = " ".join(tokens), " ".join(map(str, offsets))
+            wanted[(v["surah_number"], v["ayah_number"])] = (vk, v["text"], text_norm, offsets)
+            # الكلمة المطبّعة لكل كلمة أصلية من نفس الأعمدة المحفوظة بدون تطبيع ثانٍ
+            words_cache[vk] = (words_raw, list(words_by_offset(text_norm, offsets, len(words_raw))))
+        surahs = {s for s, _ in wanted}
+        existing = {
+            (a.surah, a.number): a
+            for a in Ayah.objects.filter(surah__in=surahs).only(
+                'id', 'surah', 'number', 'text', 'text_normalized', 'word_offsets', 'quarter_id')
+        }
+        to_create, to_update = [], []
+        for (s, n), (vk, text, text_norm, offsets) in wanted.items():
+            # الآيات خارج أي ربع في النطاق تحتفظ بربطها الحالي
+            a = existing.get((s, n))
+            qid = quarter_of.get(vk, a.quarter_id if a else None)
+            if a is None:
+                to_create.append(Ayah(surah=s, number=n, text=text, text_normalized=text_norm,
+                                      word_offsets=offsets, quarter_id=qid))
+            elif (a.text, a.text_normalized, a.word_offsets, a.quarter_id) != (text, text_norm, offsets, qid):
+                a.text, a.text_normalized, a.word_offsets, a.quarter_id = text, text_norm, offsets, qid
+                to_update.append(a)
+        with transaction.atomic():
+            Ayah.objects.bulk_create(to_create, batch_size=batch)
+            Ayah.objects.bulk_update(to_update, ['text', 'text_normalized', 'word_offsets', 'quarter'],
+                                     batch_size=batch)
+        self.stdout.write(f"✔️ Ayah objects: +{len(to_create)} created, {len(to_update)} updated, assigned to quarters")
+        stage('ayat')
+
+        # حدود الأرباع (أول/آخر آية وصفحة) تتبع ربط الآيات بالأرباع
+        rebuild_quarter_bounds()
+        stage('quarter bounds')
 
         # -------- بناء Phrase & PhraseOccurrence --------
-        # تنظيف القديم لبناء نظيف
-        PhraseOccurrence.objects.all().delete()
-        Phrase.objects.all().delete()
+        # نبني الفهرس المطلوب في الذاكرة أولاً ثم نكتب الفرق فقط في معاملة واحدة
+        ayah_by_key = {
+            f"{s}:{n}": aid for aid, s, n in
+            Ayah.objects.filter(surah__in=surahs).values_list('id', 'surah', 'number')
+            if f"{s}:{n}" in words_cache
+        }   # "s:a" -> ayah_id
 
-        # كاش الكلمات المطبّعة لكل آية
-        words_cache = {}   # verse_key -> (words_raw, words_norm)
-        ayah_by_key = {}   # "s:a" -> Ayah instance
-        for v in ayah_data.values():
-            vk = v["verse_key"]
-            j_no = juz_map.get(vk)
-            if not j_no or j_no > LAST_JUZ:
-                continue
-            words_raw = v["text"].split()
-            words_norm = [normalize(w) for w in words_raw]
-            words_cache[vk] = (words_raw, words_norm)
-            try:
-                ayah_by_key[vk] = Ayah.objects.get(surah=v["surah_number"], number=v["ayah_number"])
-            except Ayah.DoesNotExist:
-                pass
-
-        phrase_map = {}   # normalized -> Phrase
-        total_occ = 0
-        total_phrases = 0
+        phrase_map = {}   # normalized -> (text, [(ayah_id, s, e)], seen)
 
         # مرّن التعامل مع match_words
         for src_vk, lst in matches.items():
@@ -250,23 +281,19 @@ class Command(BaseCommand):
                 # أنشئ/أحضر Phrase
                 ph = phrase_map.get(phrase_norm)
                 if ph is None:
-                    ph = Phrase.objects.create(
-                        text=phrase_text,
-                        normalized=phrase_norm,
-                        length_words=len(phrase_norm_words),
-                        global_freq=0
-                    )
-                    phrase_map[phrase_norm] = ph
-                    total_phrases += 1
+                    ph = phrase_map[phrase_norm] = (phrase_text, [], set())
+                _, ph_occs, ph_seen = ph
+
+                def add_occ(ayah_id, s, e):
+                    key = (ayah_id, s, e)
+                    if key not in ph_seen:
+                        ph_seen.add(key)
+                        ph_occs.append(key)
 
                 # occurrence في آية المصدر
                 src_ayah = ayah_by_key.get(src_vk)
-                if src_ayah:
-                    PhraseOccurrence.objects.get_or_create(
-                        phrase=ph, ayah=src_ayah,
-                        start_word=s1, end_word=e1
-                    )
-                    total_occ += 1
+                if src_ayah is not None:
+                    add_occ(src_ayah, s1, e1)
 
                 # occurrence في آية الهدف
                 tgt_vk = m.get("matched_ayah_key")
@@ -280,20 +307,26 @@ class Command(BaseCommand):
                     if not span:
                         span = find_span(t_words_norm, phrase_norm_words)
 
-                    if tgt_ayah and span:
+                    if tgt_ayah is not None and span:
                         s2, e2 = span
-                        PhraseOccurrence.objects.get_or_create(
-                            phrase=ph, ayah=tgt_ayah,
-                            start_word=s2, end_word=e2
-                        )
-                        total_occ += 1
-
-        # حدّث global_freq لكل Phrase
-        for ph in Phrase.objects.all():
-            cnt = PhraseOccurrence.objects.filter(phrase=ph).count()
-            ph.global_freq = cnt
-            # confusability ممكن نحسبها لاحقًا (مثال: cnt / length_words)
-            ph.save(update_fields=['global_freq'])
-
-        self.stdout.write(f"✔️ Phrases: {total_phrases}, Occurrences: {total_occ}")
+                        add_occ(tgt_ayah, s2, e2)
+        stage('match phrases')
+
+        # كتابة الفرق فقط + global_freq في مكانه (confusability ممكن نحسبها لاحقًا)
+        # بدون --incremental يُستبدل الفهرس كله كما كان؛ معه تُمس آيات نطاق الاستيراد فقط
+        stats = PhraseIndexService().apply(
+            ((norm, text, occs) for norm, (text, occs, _) in phrase_map.items()),
+            scope_ayah_ids=list(ayah_by_key.values()) if opts['incremental'] else None,
+        )
+        total_phrases, total_occ = stats['phrases'], stats['occurrences']
+        stage('write index (diff)')
+
+        for name, secs in timings:
+            self.stdout.write(f"  {name:<22} {secs:8.2f}s")
+        self.stdout.write(f"  {'total':<22} {sum(t for _, t in timings):8.2f}s")
+
+        self.stdout.write(
+            f"✔️ Phrases: {total_phrases}, Occurrences: {total_occ} "
+            f"(+{stats['occurrences_added']} / -{stats['occurrences_deleted']})"
+        )
         self.stdout.write(self.style.SUCCESS("تم الاستيراد وبناء العبارات بنجاح 🎉"))
@@ -2,6 +2,8 @@ import sqlite3
 from pathlib import Path
 from django.core.management.base import BaseCommand
 from core.models import Ayah, Page
+from core.services.corpus_service import bump_corpus_version
+from core.services.quarter_boundaries import rebuild_quarter_bounds
 
 # هنحاول نكتشف أسماء الأعمدة الشائعة في جدول words تلقائيًا
 WORDS_COL_SETS = [
@@ -120,6 +122,10 @@ class Command(BaseCommand):
 
             total_lines += 1
 
+        # أرقام الصفحات جزء من لقطة المصحف ومن حدود الأرباع
+        rebuild_quarter_bounds()
+        bump_corpus_version()
+
         self.stdout.write(self.style.SUCCESS(
             f"Processed {total_lines:,} ayah-lines. Linked/updated {linked:,} ayat to pages."
         ))
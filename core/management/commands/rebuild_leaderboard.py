@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.services.leaderboard import rebuild_leaderboard
+
+
+class Command(BaseCommand):
+    help = "إعادة بناء جدول لوحة المنافسة (LeaderboardEntry) من الجلسات المكتملة"
+
+    def handle(self, *args, **options):
+        count = rebuild_leaderboard()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt leaderboard: {count:,} students"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.services.answer_journal import AnswerJournal, idle_session_ids, journal_dir, pending_session_ids
+
+
+class Command(BaseCommand):
+    help = ("تطبيق سجلات الإجابات المتبقية (بعد انهيار أو إعادة تشغيل) على TestQuestion وTestRun؛ "
+            "مع --idle يُجدول على كل خادم لتطبيق سجلات الاختبارات المتروكة")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complete', action='store_true',
+                            help="تعليم الجلسات المطبّقة مكتملة أيضاً")
+        parser.add_argument('--idle', type=int, default=None, metavar='MINUTES',
+                            help="السجلات التي لم يُلحق بها شيء منذ هذه الدقائق فقط (لا تلمس الاختبارات الجارية)")
+
+    def handle(self, *args, **options):
+        if options['idle'] is None:
+            ids = pending_session_ids()
+        else:
+            ids = idle_session_ids(options['idle'] * 60)
+        answers = 0
+        for sid in ids:
+            answers += AnswerJournal(sid).flush(complete=options['complete'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {len(ids):,} journals ({answers:,} answers) from {journal_dir()}"))
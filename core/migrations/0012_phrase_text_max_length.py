@@ -0,0 +1,23 @@
+# Generated by Django 4.0.6 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_ayah_line_ayah_text_imlaei_ayah_text_uthmani'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='phrase',
+            name='normalized',
+            field=models.CharField(db_index=True, max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='phrase',
+            name='text',
+            field=models.CharField(max_length=500),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.0.6 on 2026-10-18 03:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_phrase_text_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuarterPhraseStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('freq', models.PositiveIntegerField()),
+                ('phrase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quarter_stats', to='core.phrase')),
+                ('quarter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='phrase_stats', to='core.quarter')),
+            ],
+            options={
+                'unique_together': {('quarter', 'phrase')},
+            },
+        ),
+    ]
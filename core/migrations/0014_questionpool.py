@@ -0,0 +1,24 @@
+# Generated by Django 4.0.6 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_quarterphrasestat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionPool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope_key', models.CharField(max_length=40, unique=True)),
+                ('quarter_ids', models.TextField()),
+                ('corpus_version', models.CharField(max_length=64)),
+                ('pool', models.TextField()),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
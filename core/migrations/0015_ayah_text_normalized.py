@@ -0,0 +1,78 @@
+# Generated by Django 4.0.6 on 2026-10-18 04:40
+
+import unicodedata
+
+from django.db import migrations, models
+
+# نسخة ثابتة من قواعد core.normalization وقت هذا الترحيل؛ الترحيل لا يستورد
+# كود التطبيق حتى لا يتغير ناتجه لو تغيرت القواعد لاحقاً
+LETTER_MAP = {'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ة': 'ه', 'ى': 'ي'}
+EXTRA_MARKS = 'ـۥۦ'
+
+
+def translate_char(ch):
+    if ch in LETTER_MAP:
+        return LETTER_MAP[ch]
+    if ch in EXTRA_MARKS:
+        return None
+    cat = unicodedata.category(ch)
+    if cat[0] == 'M' or cat == 'Cf':
+        return None
+    if ch.isspace():
+        return ' '
+    if ch.isalnum() or ch == '_':
+        base = ''.join(c for c in unicodedata.normalize('NFKD', ch) if unicodedata.category(c)[0] != 'M')
+        return ''.join(LETTER_MAP.get(c, c) for c in base) or None
+    return ' '
+
+
+class Table(dict):
+    def __missing__(self, cp):
+        value = self[cp] = translate_char(chr(cp))
+        return value
+
+
+def normalize_words(text, table):
+    tokens, offsets = [], []
+    for i, w in enumerate(text.split(), 1):
+        for part in w.translate(table).split():
+            tokens.append(part)
+            offsets.append(i)
+    return tokens, offsets
+
+
+def backfill_normalized(apps, schema_editor):
+    Ayah = apps.get_model('core', 'Ayah')
+    table = Table()
+    batch = []
+    for ayah in Ayah.objects.only('id', 'text').iterator(chunk_size=1000):
+        tokens, offsets = normalize_words(ayah.text, table)
+        ayah.text_normalized = ' '.join(tokens)
+        ayah.word_offsets = ' '.join(map(str, offsets))
+        batch.append(ayah)
+        if len(batch) >= 1000:
+            Ayah.objects.bulk_update(batch, ['text_normalized', 'word_offsets'])
+            batch = []
+    if batch:
+        Ayah.objects.bulk_update(batch, ['text_normalized', 'word_offsets'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_questionpool'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ayah',
+            name='text_normalized',
+            field=models.TextField(blank=True, default='', help_text='كلمات الآية بعد التطبيع مفصولة بمسافة'),
+        ),
+        migrations.AddField(
+            model_name='ayah',
+            name='word_offsets',
+            field=models.TextField(blank=True, default='', help_text='موضع كل كلمة مطبّعة في النص الأصلي (1-based)'),
+        ),
+        migrations.RunPython(backfill_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.0.6 on 2026-10-18 05:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_bounds(apps, schema_editor):
+    """
+    أول وآخر آية (بترتيب السورة ثم الآية) وأول وآخر صفحة وعدد الصفحات لكل
+    ربع، مثل core.services.quarter_boundaries وقت هذا الترحيل
+    """
+    Ayah = apps.get_model('core', 'Ayah')
+    Quarter = apps.get_model('core', 'Quarter')
+
+    first, last, pages = {}, {}, {}
+    for ayah_id, surah, number, quarter_id, page in Ayah.objects.values_list(
+            'id', 'surah', 'number', 'quarter_id', 'page__number'):
+        if not quarter_id:
+            continue
+        key = (surah, number, ayah_id)
+        if quarter_id not in first or key < first[quarter_id]:
+            first[quarter_id] = key
+        if quarter_id not in last or key > last[quarter_id]:
+            last[quarter_id] = key
+        qpages = pages.setdefault(quarter_id, set())
+        if page:
+            qpages.add(page)
+
+    quarters = list(Quarter.objects.only('id'))
+    for q in quarters:
+        qpages = pages.get(q.id, set())
+        q.first_ayah_id = first[q.id][2] if q.id in first else None
+        q.last_ayah_id = last[q.id][2] if q.id in last else None
+        q.first_page = min(qpages) if qpages else None
+        q.last_page = max(qpages) if qpages else None
+        q.page_count = len(qpages)
+    Quarter.objects.bulk_update(
+        quarters, ['first_ayah', 'last_ayah', 'first_page', 'last_page', 'page_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_ayah_text_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quarter',
+            name='first_ayah',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.ayah'),
+        ),
+        migrations.AddField(
+            model_name='quarter',
+            name='first_page',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quarter',
+            name='last_ayah',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.ayah'),
+        ),
+        migrations.AddField(
+            model_name='quarter',
+            name='last_page',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quarter',
+            name='page_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_bounds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.6 on 2026-10-18 05:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_quarter_bounds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('questions', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('test_session', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='run', to='core.testsession')),
+            ],
+        ),
+    ]
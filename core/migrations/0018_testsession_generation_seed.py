@@ -0,0 +1,23 @@
+# Generated by Django 4.0.6 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_testrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testsession',
+            name='corpus_version',
+            field=models.CharField(blank=True, default='', help_text='إصدار لقطة المصحف عند التوليد', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='testsession',
+            name='generation_seed',
+            field=models.BigIntegerField(blank=True, help_text='بذرة توليد الأسئلة', null=True),
+        ),
+    ]
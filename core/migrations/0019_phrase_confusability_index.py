@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_testsession_generation_seed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='phrase',
+            name='confusability',
+            field=models.FloatField(db_index=True, default=0.0),
+        ),
+    ]
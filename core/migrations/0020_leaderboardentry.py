@@ -0,0 +1,71 @@
+# Generated by Django 4.0.6 on 2026-10-18 07:10
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def backfill_leaderboard(apps, schema_editor):
+    """صف لكل طالب له أسئلة في جلسات مكتملة، مثل core.services.leaderboard وقت هذا الترحيل"""
+    TestSession = apps.get_model('core', 'TestSession')
+    LeaderboardEntry = apps.get_model('core', 'LeaderboardEntry')
+
+    rows = (
+        TestSession.objects.filter(completed=True)
+        .values('student_id')
+        .annotate(
+            exams=Count('id', distinct=True),
+            questions_count=Count('questions'),
+            correct=Count('questions', filter=Q(questions__is_correct=True)),
+            wrong=Count('questions', filter=Q(questions__is_correct=False)
+                        & Q(questions__student_response__isnull=False)
+                        & ~Q(questions__student_response='')),
+            unanswered=Count('questions', filter=Q(questions__student_response__isnull=True)
+                             | Q(questions__student_response='')),
+        )
+        .order_by()
+    )
+    entries = []
+    for row in rows:
+        if not row['questions_count']:
+            continue
+        answered = row['correct'] + row['wrong']
+        accuracy = row['correct'] / answered * 100 if answered else 0
+        # النقاط: الدقة 80% + الإجابات الصحيحة + عدد الامتحانات
+        score = accuracy * 0.8 + row['correct'] + row['exams']
+        entries.append(LeaderboardEntry(
+            student_id=row['student_id'], exams=row['exams'], questions=row['questions_count'],
+            correct=row['correct'], wrong=row['wrong'], unanswered=row['unanswered'],
+            accuracy=round(accuracy, 1), score=round(score, 1),
+        ))
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_phrase_confusability_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exams', models.PositiveIntegerField(default=0)),
+                ('questions', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('wrong', models.PositiveIntegerField(default=0)),
+                ('unanswered', models.PositiveIntegerField(default=0)),
+                ('accuracy', models.FloatField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entry', to='core.student')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['-accuracy', '-correct', 'student'], name='leaderboard_rank_idx'),
+        ),
+        migrations.RunPython(backfill_leaderboard, migrations.RunPython.noop),
+    ]
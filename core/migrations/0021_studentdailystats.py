@@ -0,0 +1,70 @@
+# Generated by Django 4.0.6 on 2026-10-18 07:40
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce, TruncDate
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def backfill_daily_stats(apps, schema_editor):
+    """
+    صف لكل (طالب، نوع اختبار، يوم انتهاء الجلسة) من الجلسات المكتملة، مثل
+    core.services.daily_stats وقت هذا الترحيل؛ يُقرأ كتدفق ويُكتب على دفعات
+    """
+    TestSession = apps.get_model('core', 'TestSession')
+    StudentDailyStats = apps.get_model('core', 'StudentDailyStats')
+
+    rows = (
+        TestSession.objects.filter(completed=True)
+        .annotate(day=TruncDate(Coalesce('completed_at', 'created_at')))
+        .values('student_id', 'test_type', 'day')
+        .annotate(
+            sessions=Count('id', distinct=True),
+            questions_count=Count('questions'),
+            correct=Count('questions', filter=Q(questions__is_correct=True)),
+            wrong=Count('questions', filter=Q(questions__is_correct=False)
+                        & Q(questions__student_response__isnull=False)
+                        & ~Q(questions__student_response='')),
+            unanswered=Count('questions', filter=Q(questions__student_response__isnull=True)
+                             | Q(questions__student_response='')),
+        )
+        .order_by('student_id', 'day', 'test_type')
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        row['questions'] = row.pop('questions_count')
+        batch.append(StudentDailyStats(**row))
+        if len(batch) >= BATCH_SIZE:
+            StudentDailyStats.objects.bulk_create(batch)
+            batch = []
+    StudentDailyStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('test_type', models.CharField(max_length=50)),
+                ('day', models.DateField()),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('questions', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('wrong', models.PositiveIntegerField(default=0)),
+                ('unanswered', models.PositiveIntegerField(default=0)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.student')),
+            ],
+            options={
+                'unique_together': {('student', 'test_type', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:10
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # جداول DatabaseCache في CACHES (الكاش المشترك)؛ لا يفعل شيئاً لو موجودة
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_studentdailystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
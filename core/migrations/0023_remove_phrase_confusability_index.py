@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='phrase',
+            name='confusability',
+            field=models.FloatField(default=0.0),
+        ),
+    ]
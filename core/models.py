@@ -57,6 +57,12 @@ class Quarter(models.Model):
     juz = models.ForeignKey(Juz, on_delete=models.CASCADE)
     index_in_juz = models.PositiveSmallIntegerField(help_text="1–8 for each Juz")
     label = models.CharField(max_length=100, help_text="Name of the quarter from the opening words of its first verse")
+    # حدود الربع محسوبة عند الاستيراد/ربط الصفحات (core.services.quarter_boundaries)
+    first_ayah = models.ForeignKey('Ayah', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    last_ayah = models.ForeignKey('Ayah', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    first_page = models.PositiveSmallIntegerField(null=True, blank=True)
+    last_page = models.PositiveSmallIntegerField(null=True, blank=True)
+    page_count = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
         unique_together = ('juz', 'index_in_juz')
@@ -88,6 +94,9 @@ class Ayah(models.Model):
     line = models.PositiveSmallIntegerField(null=True, blank=True, help_text="رقم السطر في الصفحة")
     text_imlaei = models.TextField(blank=True, help_text="النص الإملائي للآية")
     text_uthmani = models.TextField(blank=True, help_text="النص العثماني للآية")
+    # تُملأ عند الاستيراد بـ core.normalization.normalize_words
+    text_normalized = models.TextField(blank=True, default='', help_text="كلمات الآية بعد التطبيع مفصولة بمسافة")
+    word_offsets = models.TextField(blank=True, default='', help_text="موضع كل كلمة مطبّعة في النص الأصلي (1-based)")
 
     class Meta:
         unique_together = ('surah', 'number')
@@ -107,10 +116,12 @@ class SimilarityGroup(models.Model):
 
 
 class Phrase(models.Model):
-    text = models.CharField(max_length=200)
-    normalized = models.CharField(max_length=200, db_index=True)
+    # محرك suffix يُخرج عبارات طويلة (آية كاملة تقريباً) فالحد 500 حرف
+    text = models.CharField(max_length=500)
+    normalized = models.CharField(max_length=500, db_index=True)
     length_words = models.PositiveSmallIntegerField()
     global_freq = models.PositiveIntegerField(default=0)
+    # من أمر build_phrase_confusability
     confusability = models.FloatField(default=0.0)
 
     def __str__(self):
@@ -131,6 +142,28 @@ class PhraseOccurrence(models.Model):
         ]
 
 
+class QuarterPhraseStat(models.Model):
+    """مصفوفة متفرقة quarter × phrase: عدد مواضع العبارة داخل الربع"""
+    quarter = models.ForeignKey(Quarter, related_name='phrase_stats', on_delete=models.CASCADE)
+    phrase = models.ForeignKey(Phrase, related_name='quarter_stats', on_delete=models.CASCADE)
+    freq = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('quarter', 'phrase')
+
+
+class QuestionPool(models.Model):
+    """
+    مرشحو أسئلة المتشابهات محسوبين مسبقاً لنطاق (مجموعة أرباع) عند إصدار
+    معين من لقطة المصحف؛ أي صف بإصدار مختلف يُعتبر قديماً ويُعاد حسابه
+    """
+    scope_key = models.CharField(max_length=40, unique=True)  # sha1 لمعرفات الأرباع مرتبة
+    quarter_ids = models.TextField()  # "1,2,3" للقراءة والتشخيص
+    corpus_version = models.CharField(max_length=64)
+    pool = models.TextField()  # JSON: {'easy': [[phrase_id, freq, [ayah_id, ...]], ...], ...}
+    built_at = models.DateTimeField(auto_now=True)
+
+
 class TestSession(models.Model):
     """Represents one attempt of a test by a student."""
 
@@ -171,6 +204,9 @@ class TestSession(models.Model):
         default='normal',
         help_text='ترتيب المواضع في الأسئلة'
     )
+    # نفس البذرة على نفس إصدار لقطة المصحف تعيد نفس الأسئلة بنفس الترتيب
+    generation_seed = models.BigIntegerField(null=True, blank=True, help_text='بذرة توليد الأسئلة')
+    corpus_version = models.CharField(max_length=64, blank=True, default='', help_text='إصدار لقطة المصحف عند التوليد')
 
     # ManyToMany to Juz and Quarter representing scope
     juzs = models.ManyToManyField(Juz, blank=True)
@@ -204,3 +240,54 @@ class TestQuestion(models.Model):
 
     def __str__(self) -> str:
         return f"Question {self.id} in {self.session}"
+
+
+class TestRun(models.Model):
+    """
+    أسئلة الاختبار الجاري على الخادم بصيغة مضغوطة (معرّفات وإجابات فقط)؛
+    السيشن يحمل test_run_id فقط، والنصوص تُعاد بناؤها من لقطة المصحف
+    """
+    test_session = models.OneToOneField(TestSession, null=True, blank=True, on_delete=models.CASCADE, related_name='run')
+    # JSON: [{'phrase_id': ..., 'given_answer': ...}, ...]، أو للجلسة ذات البذرة
+    # {'deltas': [{'given_answer': ...}, ...]} (التغييرات عن الأسئلة المولَّدة فقط)
+    questions = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class LeaderboardEntry(models.Model):
+    """
+    صف لوحة المنافسة لكل طالب له أسئلة في جلسات مكتملة؛ يُحدَّث في معاملة
+    إكمال الجلسة أو حذفها (core.services.leaderboard)
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, related_name='leaderboard_entry')
+    exams = models.PositiveIntegerField(default=0)
+    questions = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    wrong = models.PositiveIntegerField(default=0)
+    unanswered = models.PositiveIntegerField(default=0)
+    accuracy = models.FloatField(default=0)  # نسبة مئوية من المجاب، بمنزلة عشرية
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-accuracy', '-correct', 'student'], name='leaderboard_rank_idx'),
+        ]
+
+
+class StudentDailyStats(models.Model):
+    """
+    عدّادات جلسات الطالب المكتملة لكل نوع اختبار في يوم؛ تُحدَّث عند إكمال
+    الجلسة أو حذفها (core.services.daily_stats)
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='daily_stats')
+    test_type = models.CharField(max_length=50)
+    day = models.DateField()
+    sessions = models.PositiveIntegerField(default=0)
+    questions = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    wrong = models.PositiveIntegerField(default=0)
+    unanswered = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('student', 'test_type', 'day')
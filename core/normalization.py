@@ -0,0 +1,97 @@
+"""
+تطبيع النص العربي: قواعد واحدة للفهرسة والمطابقة والتظليل
+
+القواعد (لكل حرف على حدة، وتُحسب مرة واحدة لكل حرف ثم تُخزن في جدول
+``str.translate``):
+- حذف كل علامات التشكيل والعلامات القرآنية المركّبة (Mn) ومعها التطويل
+  والواو والياء الصغيرتان في الرسم العثماني
+- الحرف المركّب يُرد لأصله بعد حذف علامته: أ إ آ ← ا، ؤ ← و، ئ ← ي
+- توحيد: ٱ ← ا، ة ← ه، ى ← ي
+- أي رمز أو علامة ترقيم ← مسافة، ثم دمج المسافات
+
+النسخ السابقة كانت تطبّق NFKD ثم تحذف مدى محدوداً من التشكيل، فتبقى همزة
+أ/ؤ/ئ المفككة والمدّة كعلامة منفصلة وتتحول لمسافة تقسم الكلمة (أنزل ← "ا نزل").
+"""
+import unicodedata
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+LETTER_MAP = {'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ة': 'ه', 'ى': 'ي'}
+
+# حروف ليست Mn لكنها تشكيل في الرسم العثماني: التطويل، الواو الصغيرة، الياء الصغيرة
+EXTRA_MARKS = 'ـۥۦ'
+
+
+def _translate_char(ch: str) -> Optional[str]:
+    if ch in LETTER_MAP:
+        return LETTER_MAP[ch]
+    if ch in EXTRA_MARKS:
+        return None
+    cat = unicodedata.category(ch)
+    if cat[0] == 'M' or cat == 'Cf':
+        return None
+    if ch.isspace():
+        return ' '
+    if ch.isalnum() or ch == '_':
+        base = ''.join(c for c in unicodedata.normalize('NFKD', ch) if unicodedata.category(c)[0] != 'M')
+        return ''.join(LETTER_MAP.get(c, c) for c in base) or None
+    return ' '
+
+
+class _Table(dict):
+    """جدول translate يملأ نفسه: كل حرف جديد يُصنَّف مرة واحدة فقط"""
+
+    def __missing__(self, cp: int) -> Optional[str]:
+        value = self[cp] = _translate_char(chr(cp))
+        return value
+
+
+TABLE = _Table()
+
+
+def normalize(txt: str) -> str:
+    return ' '.join(txt.translate(TABLE).split())
+
+
+def normalize_words(text: str) -> Tuple[List[str], List[int]]:
+    """
+    كلمات الآية المطبّعة مع موضع كل كلمة في النص الأصلي (1-based، على
+    text.split()). الكلمة التي يحذفها التطبيع كلها (مثل ۞) لا تظهر.
+    """
+    tokens: List[str] = []
+    offsets: List[int] = []
+    for i, w in enumerate(text.split(), 1):
+        for part in w.translate(TABLE).split():
+            tokens.append(part)
+            offsets.append(i)
+    return tokens, offsets
+
+
+def words_by_offset(text_normalized: str, word_offsets: str, word_count: int) -> Tuple[str, ...]:
+    """عكس الأعمدة المحفوظة على Ayah إلى الكلمة المطبّعة لكل كلمة أصلية"""
+    out = [[] for _ in range(word_count)]
+    for token, off in zip(text_normalized.split(), word_offsets.split()):
+        out[int(off) - 1].append(token)
+    return tuple(' '.join(parts) for parts in out)
+
+
+@lru_cache(maxsize=8192)
+def normalize_with_map(text: str) -> Tuple[str, Tuple[int, ...]]:
+    """
+    النص المطبّع وموضع كل حرف منه في النص الأصلي؛ للتظليل على النص الأصلي
+    بعد المطابقة على النص المطبّع
+    """
+    chars: List[str] = []
+    index: List[int] = []
+    for i, ch in enumerate(text):
+        mapped = TABLE[ord(ch)]
+        if not mapped:
+            continue
+        for c in mapped:
+            if c == ' ' and (not chars or chars[-1] == ' '):
+                continue
+            chars.append(c)
+            index.append(i)
+    while chars and chars[-1] == ' ':
+        chars.pop(); index.pop()
+    return ''.join(chars), tuple(index)
@@ -0,0 +1,210 @@
+"""
+سجل إجابات الاختبار الجاري (answer journal) مع كتابة مجمّعة
+
+كل إجابة كانت UPDATE على TestQuestion في معاملة منفصلة، وكل حفظ لحالة
+الأسئلة UPDATE على TestRun؛ على SQLite تتسلسل هذه المعاملات بين كل الطلاب.
+هنا تُلحق الإجابات وحالة الأسئلة سطراً في ملف JSONL خاص بالجلسة، وتُكتب
+لقاعدة البيانات في معاملة واحدة عند نقطة حفظ (كل CHECKPOINT_EVERY أسئلة)
+أو عند انتهاء الاختبار.
+
+الأمان عند الانهيار: السطر يُكتب بـ fsync قبل الرد، والملف يُنقل لاسم
+.flushing قبل تطبيقه ويُحذف بعده؛ أي ملف متبقٍ (بأي الاسمين) يُعاد تطبيقه
+بأمر replay_answer_journals، والتطبيق idempotent (آخر قيمة لكل سؤال).
+
+الاختبار المتروك لا يصل لنقطة حفظ: سجله يُطبَّق عند بدء الطالب اختباراً
+جديداً (TestRunStore.start)، وإلا بـ replay_answer_journals --idle الذي
+يُجدول (cron) على كل خادم لأن الملفات محلية عليه. التطبيق والإلحاق لنفس
+الجلسة متسلسلان بقفل ملف (قفل نظام التشغيل، يُحرر تلقائياً لو ماتت العملية).
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# نقطة حفظ بعد كل هذا العدد من الأسئلة
+CHECKPOINT_EVERY = 10
+
+# ملفات الأقفال موزعة على عدد ثابت (الجلسة % LOCK_STRIPES) فلا تتراكم
+LOCK_STRIPES = 64
+
+
+def journal_dir() -> str:
+    return str(getattr(settings, 'ANSWER_JOURNAL_DIR', os.path.join(settings.BASE_DIR, 'data', 'answer_journal')))
+
+
+def pending_session_ids() -> List[int]:
+    """الجلسات التي لها سجل لم يُطبَّق بعد"""
+    ids = set()
+    try:
+        names = os.listdir(journal_dir())
+    except FileNotFoundError:
+        return []
+    for name in names:
+        stem, _, suffix = name.partition('.')
+        if stem.isdigit() and suffix in ('jsonl', 'jsonl.flushing'):
+            ids.add(int(stem))
+    return sorted(ids)
+
+
+def idle_session_ids(idle_seconds: float) -> List[int]:
+    """الجلسات التي لم يُلحق بسجلها شيء منذ idle_seconds (اختبارات متروكة)"""
+    cutoff = time.time() - idle_seconds
+    ids = []
+    for sid in pending_session_ids():
+        journal = AnswerJournal(sid)
+        mtimes = [os.path.getmtime(p) for p in (journal.path, journal.flushing_path) if os.path.exists(p)]
+        if mtimes and max(mtimes) < cutoff:
+            ids.append(sid)
+    return ids
+
+
+class AnswerJournal:
+    """سجل جلسة اختبار واحدة (TestSession)"""
+
+    def __init__(self, test_session_id: int):
+        self.test_session_id = int(test_session_id)
+        self.path = os.path.join(journal_dir(), f"{self.test_session_id}.jsonl")
+        self.flushing_path = f"{self.path}.flushing"
+        self.lock_path = os.path.join(journal_dir(), 'locks', f"{self.test_session_id % LOCK_STRIPES}.lock")
+
+    # ------------------------------------------------------------------
+    # الإلحاق
+    # ------------------------------------------------------------------
+    def record_answer(self, question_id: int, response: str, is_correct: bool, position: Optional[int] = None) -> None:
+        """
+        إجابة سؤال؛ position هو ترتيب السؤال (0-based) لتحديد نقاط الحفظ
+        """
+        self._append({
+            't': 'answer', 'q': int(question_id), 'r': response, 'c': bool(is_correct),
+            'at': timezone.now().isoformat(),
+        })
+        if position is not None and (position + 1) % CHECKPOINT_EVERY == 0:
+            self.flush()
+
+    def record_state(self, questions: Union[List[Dict[str, Any]], Dict[str, Any]]) -> None:
+        """حالة أسئلة TestRun بصيغة صفها؛ آخر حالة هي المعتمدة"""
+        self._append({'t': 'state', 'questions': questions})
+
+    def latest_state(self) -> Optional[Union[List[Dict[str, Any]], Dict[str, Any]]]:
+        state = None
+        with self._locked():
+            for record in self._records():
+                if record['t'] == 'state':
+                    state = record['questions']
+        return state
+
+    # ------------------------------------------------------------------
+    # التطبيق
+    # ------------------------------------------------------------------
+    def flush(self, complete: bool = False) -> int:
+        """
+        تطبيق السجل في معاملة واحدة (و complete يعلّم الجلسة مكتملة)؛
+        يرجع عدد الإجابات المطبّقة
+        """
+        with self._locked():
+            return self._flush(complete)
+
+    def _flush(self, complete: bool) -> int:
+        from core.models import TestQuestion, TestRun, TestSession
+        from core.services.daily_stats import refresh_session_day
+        from core.services.leaderboard import refresh_students
+
+        if os.path.exists(self.path):
+            if os.path.exists(self.flushing_path):
+                # تطبيق سابق لم يكتمل: ندمج الجديد خلفه بنفس الترتيب
+                with open(self.path, encoding='utf-8') as src, open(self.flushing_path, 'a', encoding='utf-8') as dst:
+                    dst.write(src.read())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.flushing_path)
+
+        answers: Dict[int, Dict[str, Any]] = {}
+        state = None
+        for record in self._read(self.flushing_path):
+            if record['t'] == 'answer':
+                answers[record['q']] = record
+            elif record['t'] == 'state':
+                state = record['questions']
+
+        with transaction.atomic():
+            if answers:
+                rows = list(TestQuestion.objects.filter(id__in=answers, session_id=self.test_session_id))
+                for row in rows:
+                    record = answers[row.id]
+                    row.student_response = record['r']
+                    row.is_correct = record['c']
+                    row.answered_at = datetime.fromisoformat(record['at'])
+                TestQuestion.objects.bulk_update(rows, ['student_response', 'is_correct', 'answered_at'])
+            if state is not None:
+                TestRun.objects.filter(test_session_id=self.test_session_id).update(
+                    questions=json.dumps(state, ensure_ascii=False, separators=(',', ':'))
+                )
+            if complete:
+                TestSession.objects.filter(id=self.test_session_id).update(completed=True, completed_at=timezone.now())
+                refresh_students(TestSession.objects.filter(id=self.test_session_id).values_list('student_id', flat=True))
+                refresh_session_day(self.test_session_id)
+
+        if os.path.exists(self.flushing_path):
+            os.remove(self.flushing_path)
+        return len(answers)
+
+    def complete(self) -> int:
+        return self.flush(complete=True)
+
+    # ------------------------------------------------------------------
+    def _append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        # تحت القفل: سطر يُكتب بعد نقل الملف لـ .flushing وقراءته كان سيُحذف معه
+        with self._locked(), open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @contextmanager
+    def _locked(self):
+        """قفل حصري لسجل الجلسة بين العمليات والخيوط على هذا الخادم"""
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _records(self) -> Iterator[Dict[str, Any]]:
+        yield from self._read(self.flushing_path)
+        yield from self._read(self.path)
+
+    @staticmethod
+    def _read(path: str) -> Iterator[Dict[str, Any]]:
+        try:
+            f = open(path, encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # سطر أخير مقطوع بانهيار أثناء الكتابة
+                    continue
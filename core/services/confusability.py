@@ -0,0 +1,163 @@
+"""
+درجة التباس العبارة (Phrase.confusability) من بيانات الآيات المتشابهة
+
+data/matching-ayah.json: لكل آية قائمة الآيات المشابهة لها، ولكل مشابهة
+score وcoverage (0..100) وmatch_words: مدى الكلمات المطابقة (1-based، [أول،
+آخر] أو [كلمة]) داخل الآية المشابهة نفسها. لذلك يُفهرس الملف عكسياً: لكل
+آية المطابقات الواقعة عليها ومدى كلماتها، ثم تُقارن بمدى كل موضع للعبارة.
+
+الدرجة (0..1) لكل عبارة:
+- match: متوسط أفضل score × نسبة تداخل المطابقة مع الموضع، على مواضعها
+- coverage: مثلها بـ coverage بدل score
+- spread: انتشار المواضع في السور، (عدد السور - 1) / (عدد المواضع - 1)
+
+العبارة التي تتكرر في سور مختلفة داخل آيات متطابقة تقريباً هي الأكثر التباساً.
+"""
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+W_MATCH = 0.5
+W_COVERAGE = 0.2
+W_SPREAD = 0.3
+
+# مستويات الصعوبة كمدى [من، إلى) على الدرجة (على المصحف كاملاً: 27% / 54% / 19%)
+BANDS = {'easy': (0.0, 0.3), 'medium': (0.3, 0.45), 'hard': (0.45, 1.01)}
+
+# حجم دفعة القراءة من matching-ayah.json (بالحروف)
+CHUNK_SIZE = 64 * 1024
+
+AyahKey = Tuple[int, int]
+# (score, coverage, [(from_word, to_word), ...]) واقعة على آية
+Match = Tuple[int, int, List[Tuple[int, int]]]
+
+
+def parse_key(key: str) -> AyahKey:
+    surah, number = key.split(':')
+    return int(surah), int(number)
+
+
+def iter_matching_ayah(path, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, list]]:
+    """
+    (مفتاح الآية، مطابقاتها) مدخلاً مدخلاً: يُقرأ الملف على دفعات بحجم
+    chunk_size حرفاً ولا يبقى في الذاكرة منه إلا الدفعة الجارية
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        text, pos, started, eof = '', 0, False, False
+        while True:
+            try:
+                if not started:
+                    pos = text.index('{', pos) + 1
+                    started = True
+                entry = _next_entry(decoder, text, pos)
+            except ValueError:
+                # المدخل لم يكتمل في الدفعة: دفعة أخرى، وخطأ لو انتهى الملف
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                text, pos = text[pos:] + chunk, 0
+                continue
+            if entry is None:
+                return
+            key, value, pos = entry
+            yield key, value
+
+
+def _next_entry(decoder: json.JSONDecoder, text: str, pos: int) -> Optional[Tuple[str, list, int]]:
+    """(المفتاح، القيمة، الموضع بعدها)، أو None عند نهاية الكائن؛ ValueError لو المدخل ناقص"""
+    pos = _skip(text, pos, ' \t\r\n,')
+    if pos >= len(text):
+        raise ValueError('incomplete entry')
+    if text[pos] == '}':
+        return None
+    key, pos = decoder.raw_decode(text, pos)
+    pos = _skip(text, pos, ' \t\r\n')
+    if text[pos:pos + 1] != ':':
+        raise ValueError('incomplete entry')
+    value, pos = decoder.raw_decode(text, _skip(text, pos + 1, ' \t\r\n'))
+    return key, value, pos
+
+
+def _skip(text: str, pos: int, chars: str) -> int:
+    while pos < len(text) and text[pos] in chars:
+        pos += 1
+    return pos
+
+
+def incoming_matches(entries: Iterable[Tuple[str, list]]) -> Dict[AyahKey, List[Match]]:
+    """
+    فهرس عكسي: الآية ← المطابقات الواقعة على كلماتها. يُبنى كاملاً في الذاكرة
+    (مواضع العبارات تُقرأ بترتيب العبارة وقد تقع على أي آية)، ولا يُحفظ منه
+    إلا الدرجة والتغطية ومدى الكلمات لكل مطابقة
+    """
+    index: Dict[AyahKey, List[Match]] = {}
+    for _, matches in entries:
+        for m in matches:
+            # المدى [أول، آخر] أو [كلمة] لكلمة واحدة
+            ranges = [(int(r[0]), int(r[-1])) for r in m.get('match_words') or () if r]
+            if ranges:
+                index.setdefault(parse_key(m['matched_ayah_key']), []).append(
+                    (int(m.get('score') or 0), int(m.get('coverage') or 0), ranges))
+    return index
+
+
+def occurrence_scores(matches: Sequence[Match], start_word: int, end_word: int) -> Tuple[float, float]:
+    """أفضل (score، coverage) بين 0 و1 لموضع، موزونين بنسبة تداخل المطابقة معه"""
+    length = end_word - start_word + 1
+    best_score = best_coverage = 0.0
+    for score, coverage, ranges in matches:
+        overlap = max(min(end_word, b) - max(start_word, a) + 1 for a, b in ranges)
+        if overlap <= 0:
+            continue
+        share = min(overlap, length) / length
+        best_score = max(best_score, score / 100 * share)
+        best_coverage = max(best_coverage, coverage / 100 * share)
+    return best_score, best_coverage
+
+
+def phrase_confusability(
+    occurrences: Sequence[Tuple[AyahKey, int, int]], index: Dict[AyahKey, List[Match]]
+) -> float:
+    """occurrences: ((سورة، آية)، أول كلمة، آخر كلمة) لكل موضع"""
+    if not occurrences:
+        return 0.0
+    match = coverage = 0.0
+    for key, start_word, end_word in occurrences:
+        s, c = occurrence_scores(index.get(key, ()), start_word, end_word)
+        match += s
+        coverage += c
+    n = len(occurrences)
+    surahs = len({key[0] for key, _, _ in occurrences})
+    spread = (surahs - 1) / (n - 1) if n > 1 else 0.0
+    return round(W_MATCH * match / n + W_COVERAGE * coverage / n + W_SPREAD * spread, 4)
+
+
+def score_phrases(
+    occurrence_rows: Iterable[Tuple[int, int, int, int]],
+    ayah_keys: Dict[int, AyahKey],
+    index: Dict[AyahKey, List[Match]],
+) -> Iterator[Tuple[int, float]]:
+    """
+    occurrence_rows: (phrase_id, ayah_id, start_word, end_word) مرتبة حسب
+    phrase_id؛ تُستهلك كتدفق وتُرجع (phrase_id، الدرجة) عبارةً عبارة
+    """
+    current: Optional[int] = None
+    occs: List[Tuple[AyahKey, int, int]] = []
+    for pid, ayah_id, start_word, end_word in occurrence_rows:
+        if pid != current:
+            if current is not None:
+                yield current, phrase_confusability(occs, index)
+            current, occs = pid, []
+        key = ayah_keys.get(ayah_id)
+        if key is not None:
+            occs.append((key, start_word, end_word))
+    if current is not None:
+        yield current, phrase_confusability(occs, index)
+
+
+def confusability_bucket(value: float) -> str:
+    for name, (lo, hi) in BANDS.items():
+        if lo <= value < hi:
+            return name
+    return 'hard'
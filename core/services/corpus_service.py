@@ -0,0 +1,369 @@
+"""
+لقطة ثابتة (immutable) من بيانات المصحف في الذاكرة
+
+تُحمَّل مرة واحدة لكل عملية (worker) من جداول Ayah وQuarter وJuz وPhrase
+وPhraseOccurrence، وتُخزَّن الأعمدة في مصفوفات ``array`` مرتبة بترتيب المصحف.
+توليد الأسئلة يقرأ من هذه اللقطة فقط بدون أي استعلام لقاعدة البيانات.
+
+ختم الإصدار (version stamp) ملف صغير يُعاد كتابته بعد كل استيراد عبر
+``bump_corpus_version()``؛ أي عملية تلاحظ تغيّره تعيد تحميل اللقطة.
+"""
+import os
+import threading
+import uuid
+from array import array
+from collections import namedtuple
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+from core.normalization import normalize as _default_normalize, words_by_offset
+from core.services.confusability import BANDS as CONFUSABILITY_BANDS, confusability_bucket
+from core.services.quarter_boundaries import EMPTY_BOUNDS, QuarterBounds, compute_quarter_bounds
+
+AyahInfo = namedtuple('AyahInfo', 'id surah number quarter_id juz page line text')
+QuarterInfo = namedtuple(
+    'QuarterInfo', 'id juz index_in_juz label first_ayah_id last_ayah_id first_page last_page page_count',
+    defaults=EMPTY_BOUNDS,
+)
+PhraseInfo = namedtuple('PhraseInfo', 'id text normalized length_words global_freq confusability')
+
+INITIAL_VERSION = 'initial'
+
+
+class QuranCorpus:
+    """لقطة للقراءة فقط من نصوص الآيات وفهرس العبارات المتشابهة"""
+
+    def __init__(
+        self,
+        *,
+        version: str,
+        ayah_rows: Iterable[Sequence],
+        quarter_rows: Iterable[Sequence],
+        phrase_rows: Iterable[Sequence],
+        occurrence_rows: Iterable[Sequence],
+        quarter_phrase_rows: Optional[Iterable[Sequence]] = None,
+        normalize=None,
+    ):
+        """
+        ayah_rows:           (id, surah, number, quarter_id, juz, page, line, text
+                              [, text_normalized, word_offsets])؛ العمودان الأخيران
+                             من Ayah لو كانا محفوظين، وإلا يُطبَّع النص هنا
+        quarter_rows:        (id, juz, index_in_juz, label[, first_ayah_id, last_ayah_id,
+                              first_page, last_page, page_count])؛ الحدود من Quarter
+                             لو كانت محفوظة، وإلا تُحسب من الآيات هنا
+        phrase_rows:         (id, text, normalized, length_words, global_freq, confusability)
+        occurrence_rows:     (phrase_id, ayah_id, start_word, end_word)
+        quarter_phrase_rows: (quarter_id, phrase_id, freq) من QuarterPhraseStat؛
+                             لو غير متوفرة تُشتق من المواضع
+        """
+        self.version = version
+
+        # -------- الآيات (بترتيب المصحف) --------
+        rows = sorted(ayah_rows, key=lambda r: (r[1], r[2]))
+        self.ayah_id = array('l', (r[0] for r in rows))
+        self.surah = array('h', (r[1] for r in rows))
+        self.number = array('h', (r[2] for r in rows))
+        # 0 تعني "غير معروف" في الأعمدة الرقمية الاختيارية
+        self.quarter_id = array('l', (r[3] or 0 for r in rows))
+        self.juz = array('b', (r[4] or 0 for r in rows))
+        self.page = array('h', (r[5] or 0 for r in rows))
+        self.line = array('h', (r[6] or 0 for r in rows))
+        self.texts: Tuple[str, ...] = tuple(r[7] or '' for r in rows)
+        if normalize is None:
+            normalize = _default_normalize
+        self.words_norm: Tuple[Tuple[str, ...], ...] = tuple(
+            words_by_offset(r[8], r[9], len(t.split())) if len(r) > 9 and r[9]
+            else tuple(normalize(w) for w in t.split())
+            for r, t in zip(rows, self.texts)
+        )
+        self._ayah_index: Dict[int, int] = {aid: i for i, aid in enumerate(self.ayah_id)}
+
+        # -------- الأرباع --------
+        quarter_rows = list(quarter_rows)
+        derived: Dict[int, QuarterBounds] = {}
+        if any(len(r) < 9 or r[4] is None for r in quarter_rows):
+            derived = compute_quarter_bounds(zip(self.ayah_id, self.surah, self.number, self.quarter_id, self.page))
+        self.quarters: Dict[int, QuarterInfo] = {
+            r[0]: QuarterInfo(r[0], r[1], r[2], r[3], *(
+                r[4:9] if len(r) >= 9 and r[4] is not None else derived.get(r[0], EMPTY_BOUNDS)
+            ))
+            for r in quarter_rows
+        }
+        quarters_by_juz: Dict[int, List[QuarterInfo]] = {}
+        for q in self.quarters.values():
+            quarters_by_juz.setdefault(q.juz, []).append(q)
+        self.quarters_by_juz: Dict[int, Tuple[QuarterInfo, ...]] = {
+            j: tuple(sorted(qs, key=lambda q: q.index_in_juz)) for j, qs in quarters_by_juz.items()
+        }
+        quarter_ayahs: Dict[int, List[int]] = {}
+        for i, qid in enumerate(self.quarter_id):
+            if qid:
+                quarter_ayahs.setdefault(qid, []).append(i)
+        self._quarter_ayahs: Dict[int, Tuple[int, ...]] = {q: tuple(v) for q, v in quarter_ayahs.items()}
+
+        # -------- العبارات --------
+        self.phrases: Dict[int, PhraseInfo] = {
+            r[0]: PhraseInfo(r[0], r[1], r[2], r[3], r[4], r[5]) for r in phrase_rows
+        }
+        # عبارات كل مستوى صعوبة بدرجة الالتباس (مرة لكل لقطة)؛ العبارة بدرجة 0 (لم
+        # تُحسب لها درجة أو بلا مطابقات) ليست في أي مستوى
+        band_phrases: Dict[str, Set[int]] = {band: set() for band in CONFUSABILITY_BANDS}
+        for p in self.phrases.values():
+            if p.confusability:
+                band_phrases[confusability_bucket(p.confusability)].add(p.id)
+        self._band_phrases: Dict[str, FrozenSet[int]] = {b: frozenset(ids) for b, ids in band_phrases.items()}
+
+        # -------- المواضع: مرتبة حسب الآية ثم أول كلمة (تخزين CSR) --------
+        occ = sorted(
+            ((self._ayah_index[a], p, s, e) for p, a, s, e in occurrence_rows if a in self._ayah_index),
+        )
+        self.occ_ayah = array('l', (o[0] for o in occ))
+        self.occ_phrase = array('l', (o[1] for o in occ))
+        self.occ_start = array('h', (o[2] for o in occ))
+        self.occ_end = array('h', (o[3] for o in occ))
+        # _ayah_occ_ptr[i] .. _ayah_occ_ptr[i+1] مدى مواضع الآية i
+        ptr = array('l', [0] * (len(self.ayah_id) + 1))
+        for a in self.occ_ayah:
+            ptr[a + 1] += 1
+        for i in range(len(self.ayah_id)):
+            ptr[i + 1] += ptr[i]
+        self._ayah_occ_ptr = ptr
+
+        # -------- مصفوفة quarter × phrase (CSR: صف لكل ربع) --------
+        qp_rows = sorted(quarter_phrase_rows or ())
+        if not qp_rows:
+            derived: Dict[Tuple[int, int], int] = {}
+            for a, pid in zip(self.occ_ayah, self.occ_phrase):
+                qid = self.quarter_id[a]
+                if qid:
+                    derived[(qid, pid)] = derived.get((qid, pid), 0) + 1
+            qp_rows = sorted((q, p, f) for (q, p), f in derived.items())
+        self._phrase_col: Dict[int, int] = {pid: i for i, pid in enumerate(sorted(self.phrases))}
+        self._col_phrase = array('l', sorted(self.phrases))
+        qp_rows = [r for r in qp_rows if r[1] in self._phrase_col]
+        self.qp_col = array('l', (self._phrase_col[r[1]] for r in qp_rows))
+        self.qp_freq = array('l', (r[2] for r in qp_rows))
+        self._qp_rows: Dict[int, Tuple[int, int]] = {}
+        for k, r in enumerate(qp_rows):
+            start, _ = self._qp_rows.get(r[0], (k, k))
+            self._qp_rows[r[0]] = (start, k + 1)
+        self._np = _numpy_views(self)
+
+    # ------------------------------------------------------------------
+    # الآيات والنطاق
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.ayah_id)
+
+    def ayah(self, idx: int) -> AyahInfo:
+        return AyahInfo(
+            self.ayah_id[idx], self.surah[idx], self.number[idx],
+            self.quarter_id[idx] or None, self.juz[idx] or None,
+            self.page[idx] or None, self.line[idx] or None, self.texts[idx],
+        )
+
+    def index_of(self, ayah_id: int) -> Optional[int]:
+        return self._ayah_index.get(ayah_id)
+
+    def quarter_ayah_indices(self, quarter_id: int) -> Tuple[int, ...]:
+        return self._quarter_ayahs.get(quarter_id, ())
+
+    def quarter_first_ayah_index(self, quarter_id: int) -> Optional[int]:
+        idxs = self._quarter_ayahs.get(quarter_id)
+        return idxs[0] if idxs else None
+
+    def quarter_first_ayah(self, quarter_id: int) -> Optional[AyahInfo]:
+        q = self.quarters.get(quarter_id)
+        idx = self._ayah_index.get(q.first_ayah_id) if q else None
+        return self.ayah(idx) if idx is not None else None
+
+    def juz_first_ayah(self, juz_number: int) -> Optional[AyahInfo]:
+        quarters = self.quarters_by_juz.get(juz_number)
+        return self.quarter_first_ayah(quarters[0].id) if quarters else None
+
+    def scope_quarter_ids(self, juz_numbers: Iterable[int] = (), quarter_ids: Iterable[int] = ()) -> List[int]:
+        """الأرباع المكوّنة للنطاق: الأرباع المختارة إن وُجدت وإلا أرباع الأجزاء المختارة"""
+        quarter_ids = list(dict.fromkeys(int(q) for q in quarter_ids or ()))
+        if quarter_ids:
+            return [q for q in quarter_ids if q in self.quarters]
+        out = []
+        for j in sorted({int(j) for j in juz_numbers or ()}):
+            out.extend(q.id for q in self.quarters_by_juz.get(j, ()))
+        return out
+
+    def scope_ayah_indices(self, juz_numbers: Iterable[int] = (), quarter_ids: Iterable[int] = ()) -> List[int]:
+        """فهارس آيات النطاق بترتيب المصحف"""
+        idxs: List[int] = []
+        for qid in self.scope_quarter_ids(juz_numbers, quarter_ids):
+            idxs.extend(self._quarter_ayahs.get(qid, ()))
+        idxs.sort()
+        return idxs
+
+    # ------------------------------------------------------------------
+    # العبارات والمواضع
+    # ------------------------------------------------------------------
+    def phrase(self, phrase_id: int) -> Optional[PhraseInfo]:
+        return self.phrases.get(phrase_id)
+
+    @property
+    def has_confusability(self) -> bool:
+        """هل حُسبت درجات الالتباس (build_phrase_confusability)"""
+        return any(self._band_phrases.values())
+
+    def confusability_band_ids(self, band: str) -> FrozenSet[int]:
+        """العبارات التي تقع درجة التباسها في مستوى الصعوبة band (confusability.BANDS)"""
+        return self._band_phrases.get(band, frozenset())
+
+    def phrase_frequencies(self, ayah_indices: Iterable[int]) -> Dict[int, int]:
+        """عدد مواضع كل عبارة داخل النطاق (بديل GROUP BY phrase_id)"""
+        freq: Dict[int, int] = {}
+        ptr, occ_phrase = self._ayah_occ_ptr, self.occ_phrase
+        for a in ayah_indices:
+            for k in range(ptr[a], ptr[a + 1]):
+                pid = occ_phrase[k]
+                freq[pid] = freq.get(pid, 0) + 1
+        return freq
+
+    def quarter_phrase_frequencies(self, quarter_ids: Iterable[int]) -> Dict[int, int]:
+        """مجموع صفوف مصفوفة quarter × phrase للأرباع المعطاة (بدون المرور على الآيات)"""
+        spans = [self._qp_rows[q] for q in quarter_ids if q in self._qp_rows]
+        if self._np is not None and spans:
+            np, cols, freqs, col_phrase = self._np
+            idx = np.concatenate([np.arange(s, e) for s, e in spans])
+            sums = np.bincount(cols[idx], weights=freqs[idx], minlength=len(col_phrase))
+            nz = np.flatnonzero(sums)
+            return dict(zip(col_phrase[nz].tolist(), sums[nz].astype(np.int64).tolist()))
+        freq: Dict[int, int] = {}
+        col_phrase, qp_col, qp_freq = self._col_phrase, self.qp_col, self.qp_freq
+        for s, e in spans:
+            for k in range(s, e):
+                pid = col_phrase[qp_col[k]]
+                freq[pid] = freq.get(pid, 0) + qp_freq[k]
+        return freq
+
+    def scope_phrase_frequencies(self, juz_numbers: Iterable[int] = (), quarter_ids: Iterable[int] = ()) -> Dict[int, int]:
+        """تكرار كل عبارة داخل نطاق الأجزاء/الأرباع المختار"""
+        return self.quarter_phrase_frequencies(self.scope_quarter_ids(juz_numbers, quarter_ids))
+
+    def phrase_ids_in(self, ayah_indices: Iterable[int]) -> Set[int]:
+        ptr, occ_phrase = self._ayah_occ_ptr, self.occ_phrase
+        return {occ_phrase[k] for a in ayah_indices for k in range(ptr[a], ptr[a + 1])}
+
+    def phrase_ayah_sets(self, ayah_indices: Iterable[int], phrase_ids: Iterable[int]) -> Dict[int, Set[int]]:
+        """phrase_id -> مجموعة معرفات الآيات التي تظهر فيها العبارة داخل النطاق"""
+        wanted = set(phrase_ids)
+        out: Dict[int, Set[int]] = {}
+        ptr, occ_phrase, ayah_id = self._ayah_occ_ptr, self.occ_phrase, self.ayah_id
+        for a in ayah_indices:
+            for k in range(ptr[a], ptr[a + 1]):
+                pid = occ_phrase[k]
+                if pid in wanted:
+                    out.setdefault(pid, set()).add(ayah_id[a])
+        return out
+
+    def phrase_occurrences(self, phrase_id: int, ayah_indices: Iterable[int]) -> List[Tuple[int, int, int]]:
+        """مواضع العبارة داخل النطاق: (ayah_index, start_word, end_word) بترتيب المصحف"""
+        return self.phrase_occurrences_many([phrase_id], ayah_indices)[phrase_id]
+
+    def phrase_occurrences_many(
+        self, phrase_ids: Iterable[int], ayah_indices: Iterable[int]
+    ) -> Dict[int, List[Tuple[int, int, int]]]:
+        """مواضع عدة عبارات في مرور واحد على النطاق بدل مرور لكل عبارة"""
+        out: Dict[int, List[Tuple[int, int, int]]] = {pid: [] for pid in phrase_ids}
+        ptr, occ_phrase = self._ayah_occ_ptr, self.occ_phrase
+        for a in sorted(ayah_indices):
+            for k in range(ptr[a], ptr[a + 1]):
+                bucket = out.get(occ_phrase[k])
+                if bucket is not None:
+                    bucket.append((a, self.occ_start[k], self.occ_end[k]))
+        return out
+
+
+def _numpy_views(corpus: QuranCorpus):
+    """نسخ NumPy من أعمدة المصفوفة للجمع السريع؛ None لو numpy غير مثبتة"""
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    return (np, np.asarray(corpus.qp_col, dtype=np.intp), np.asarray(corpus.qp_freq, dtype=np.float64),
+            np.asarray(corpus._col_phrase, dtype=np.int64))
+
+
+# ----------------------------------------------------------------------
+# ختم الإصدار والتحميل لكل عملية
+# ----------------------------------------------------------------------
+_lock = threading.Lock()
+_corpus: Optional[QuranCorpus] = None
+_stamp_cache = {'mtime': None, 'version': INITIAL_VERSION}
+
+
+def _version_file() -> str:
+    from django.conf import settings
+    return str(getattr(settings, 'QURAN_CORPUS_VERSION_FILE',
+                       os.path.join(settings.BASE_DIR, 'data', 'corpus.version')))
+
+
+def current_corpus_version() -> str:
+    """الإصدار الحالي كما في ملف الختم (stat واحد في الحالة العادية)"""
+    path = _version_file()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return INITIAL_VERSION
+    if _stamp_cache['mtime'] != mtime:
+        try:
+            with open(path, encoding='utf-8') as f:
+                _stamp_cache['version'] = f.read().strip() or INITIAL_VERSION
+        except FileNotFoundError:
+            return INITIAL_VERSION
+        _stamp_cache['mtime'] = mtime
+    return _stamp_cache['version']
+
+
+def bump_corpus_version() -> str:
+    """يُستدعى بعد أي استيراد/إعادة بناء للفهرس لإبطال اللقطات في كل العمليات"""
+    global _corpus
+    version = uuid.uuid4().hex[:12]
+    path = _version_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp, path)
+    with _lock:
+        _corpus = None
+    return version
+
+
+def load_corpus(version: str = INITIAL_VERSION) -> QuranCorpus:
+    """تحميل اللقطة من قاعدة البيانات (خمسة استعلامات)"""
+    from core.models import Ayah, Quarter, Phrase, PhraseOccurrence, QuarterPhraseStat
+
+    return QuranCorpus(
+        version=version,
+        ayah_rows=Ayah.objects.values_list(
+            'id', 'surah', 'number', 'quarter_id', 'quarter__juz__number',
+            'page__number', 'line', 'text', 'text_normalized', 'word_offsets',
+        ),
+        quarter_rows=Quarter.objects.values_list(
+            'id', 'juz__number', 'index_in_juz', 'label',
+            'first_ayah_id', 'last_ayah_id', 'first_page', 'last_page', 'page_count',
+        ),
+        phrase_rows=Phrase.objects.values_list(
+            'id', 'text', 'normalized', 'length_words', 'global_freq', 'confusability',
+        ),
+        occurrence_rows=PhraseOccurrence.objects.values_list('phrase_id', 'ayah_id', 'start_word', 'end_word'),
+        quarter_phrase_rows=QuarterPhraseStat.objects.values_list('quarter_id', 'phrase_id', 'freq'),
+    )
+
+
+def get_corpus() -> QuranCorpus:
+    """اللقطة الحالية لهذه العملية؛ تُعاد قراءتها فقط عند تغيّر الإصدار"""
+    global _corpus
+    version = current_corpus_version()
+    corpus = _corpus
+    if corpus is not None and corpus.version == version:
+        return corpus
+    with _lock:
+        if _corpus is None or _corpus.version != version:
+            _corpus = load_corpus(version)
+        return _corpus
@@ -0,0 +1,106 @@
+"""
+تجميع يومي لإحصائيات الطالب حسب نوع الاختبار (StudentDailyStats)
+
+صفحات الإحصائيات كانت تعدّ من صفوف TestQuestion في كل طلب. هنا صف لكل
+(طالب، نوع اختبار، يوم) بعدد الجلسات والأسئلة والصحيح والخطأ وغير المجاب،
+يُعاد حسابه لأيام الطالب المعنية في معاملة إكمال الجلسة أو حذفها؛ فالإحصائيات
+ومنحنى الأيام تُقرأ من بضع عشرات من الصفوف الصغيرة. أي تغيير يُبطل عدّادات
+المنصة (global_counters) المحسوبة منه.
+
+اليوم هو تاريخ انتهاء الجلسة بتوقيت الموقع (أو تاريخ إنشائها للجلسات القديمة
+بلا completed_at). التعريفات مثل StatsService.get_student_stats.
+"""
+from datetime import date
+from typing import Dict, Iterable, Iterator, Optional
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce, TruncDate
+
+from core.services import global_counters
+
+BATCH_SIZE = 1000
+
+
+def aggregate_days(sessions) -> Iterator[Dict]:
+    """
+    صفوف (student_id، test_type، day، العدّادات) لجلسات مكتملة، مجمّعة في
+    استعلام واحد ومقروءة كتدفق
+    """
+    rows = (
+        sessions.filter(completed=True)
+        .annotate(day=TruncDate(Coalesce('completed_at', 'created_at')))
+        .values('student_id', 'test_type', 'day')
+        .annotate(
+            sessions=Count('id', distinct=True),
+            questions_count=Count('questions'),
+            correct=Count('questions', filter=Q(questions__is_correct=True)),
+            wrong=Count('questions', filter=Q(questions__is_correct=False)
+                        & Q(questions__student_response__isnull=False)
+                        & ~Q(questions__student_response='')),
+            unanswered=Count('questions', filter=Q(questions__student_response__isnull=True)
+                             | Q(questions__student_response='')),
+        )
+        .order_by('student_id', 'day', 'test_type')
+    )
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        row['questions'] = row.pop('questions_count')
+        yield row
+
+
+def refresh_student_days(student_id: int, days: Optional[Iterable[date]] = None) -> None:
+    """
+    إعادة حساب صفوف الطالب للأيام المحددة (أو كل أيامه)؛ يُستدعى داخل معاملة
+    التغيير نفسها
+    """
+    from core.models import StudentDailyStats, TestSession
+
+    sessions = TestSession.objects.filter(student_id=student_id)
+    rows = StudentDailyStats.objects.filter(student_id=student_id)
+    if days is not None:
+        days = set(days)
+        if not days:
+            return
+        sessions = sessions.annotate(day=TruncDate(Coalesce('completed_at', 'created_at'))).filter(day__in=days)
+        rows = rows.filter(day__in=days)
+    with transaction.atomic():
+        rows.delete()
+        StudentDailyStats.objects.bulk_create(
+            [StudentDailyStats(**row) for row in aggregate_days(sessions)], batch_size=BATCH_SIZE)
+    global_counters.invalidate()
+
+
+def refresh_session_day(test_session_id: int) -> None:
+    """إعادة حساب يوم جلسة (بعد إكمالها) لطالبها"""
+    from core.models import TestSession
+
+    session = (
+        TestSession.objects.filter(id=test_session_id)
+        .annotate(day=TruncDate(Coalesce('completed_at', 'created_at')))
+        .values('student_id', 'day').first()
+    )
+    if session is not None:
+        refresh_student_days(session['student_id'], [session['day']])
+
+
+def rebuild_daily_stats() -> int:
+    """
+    بناء الجدول كاملاً (أمر build_daily_stats): الصفوف تُقرأ بـ iterator
+    وتُكتب على دفعات فلا تُحمَّل الجلسات كلها في الذاكرة
+    """
+    from core.models import StudentDailyStats, TestSession
+
+    count = 0
+    batch = []
+    with transaction.atomic():
+        StudentDailyStats.objects.all().delete()
+        for row in aggregate_days(TestSession.objects.all()):
+            batch.append(StudentDailyStats(**row))
+            if len(batch) >= BATCH_SIZE:
+                StudentDailyStats.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        StudentDailyStats.objects.bulk_create(batch)
+        count += len(batch)
+    global_counters.invalidate()
+    return count
@@ -0,0 +1,84 @@
+"""
+عدّادات المنصة العامة (صفحة الهبوط وتشخيص الليدر بورد)
+
+get_global_stats كانت تمر على كل جلسة مكتملة وتعدّ أسئلتها جلسةً جلسة،
+وتشخيص الليدر بورد يطلق نحو 15 استعلام count() على الجداول كاملة. هنا:
+
+- عدّادات الجلسات المكتملة من التجميع اليومي (StudentDailyStats)، فلا تكبر
+  تكلفتها مع جدول الأسئلة
+- العدّادات الخام (كل الجلسات والأسئلة) باستعلامين بعدّ شرطي، للتشخيص فقط
+
+وكلاهما في الكاش المشترك بعمر محدد؛ إكمال جلسة أو حذف جلسات يُبطلهما معاً
+في كل العمليات.
+"""
+from typing import Dict
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from core.services.shared_cache import get_shared_cache
+
+CACHE_KEY = 'global_counters'
+RAW_CACHE_KEY = 'global_counters:raw'
+TTL_SECONDS = 5 * 60
+RAW_TTL_SECONDS = 30 * 60
+
+
+def completed_counters() -> Dict[str, int]:
+    """الطلاب، والجلسات المكتملة وأسئلتها (استعلامان صغيران)"""
+    from core.models import Student, StudentDailyStats
+
+    totals = StudentDailyStats.objects.aggregate(
+        sessions=Sum('sessions'), questions=Sum('questions'), correct=Sum('correct'),
+        wrong=Sum('wrong'), unanswered=Sum('unanswered'), students=Count('student', distinct=True),
+    )
+    return {
+        'total_students': Student.objects.count(),
+        'completed_sessions': totals['sessions'] or 0,
+        'completed_session_questions': totals['questions'] or 0,
+        'completed_session_answered': (totals['correct'] or 0) + (totals['wrong'] or 0),
+        'completed_session_correct': totals['correct'] or 0,
+        'completed_session_wrong': totals['wrong'] or 0,
+        'completed_session_unanswered': totals['unanswered'] or 0,
+        'students_with_completed_sessions': totals['students'],
+    }
+
+
+def raw_counters() -> Dict[str, int]:
+    """عدّادات كل الجلسات والأسئلة (مكتملة أو لا) من الجداول نفسها"""
+    from core.models import TestQuestion, TestSession
+
+    answered = Q(student_response__isnull=False) & ~Q(student_response='')
+    sessions = TestSession.objects.aggregate(
+        total_sessions=Count('id'),
+        incomplete_sessions=Count('id', filter=Q(completed=False)),
+        students_with_sessions=Count('student', distinct=True),
+    )
+    questions = TestQuestion.objects.aggregate(
+        total_questions=Count('id'),
+        answered_questions=Count('id', filter=answered),
+        correct_questions=Count('id', filter=Q(is_correct=True)),
+        wrong_questions=Count('id', filter=Q(is_correct=False)),
+    )
+    return {**sessions, **questions}
+
+
+def get_global_counters(include_raw: bool = False) -> Dict[str, int]:
+    """العدّادات من الكاش أو تُحسب وتُحفظ؛ include_raw يضيف العدّادات الخام"""
+    cache = get_shared_cache()
+    counters = cache.get(CACHE_KEY)
+    if counters is None:
+        counters = completed_counters()
+        cache.set(CACHE_KEY, counters, TTL_SECONDS)
+    if not include_raw:
+        return dict(counters)
+    raw = cache.get(RAW_CACHE_KEY)
+    if raw is None:
+        raw = raw_counters()
+        cache.set(RAW_CACHE_KEY, raw, RAW_TTL_SECONDS)
+    return {**counters, **raw}
+
+
+def invalidate() -> None:
+    """إبطال العدّادات (المكتملة والخام) بعد نجاح المعاملة الجارية"""
+    transaction.on_commit(lambda: get_shared_cache().delete_many([CACHE_KEY, RAW_CACHE_KEY]))
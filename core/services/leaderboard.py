@@ -0,0 +1,142 @@
+"""
+جدول لوحة المنافسة (LeaderboardEntry) محدَّثاً مع كل جلسة
+
+كانت اللوحة تحسب إحصائيات كل طالب باستعلاماته في كل عرض للصفحة. هنا صف
+لكل طالب له أسئلة في جلسات مكتملة، يُعاد حسابه (استعلام تجميع واحد على
+جلساته) في نفس معاملة إكمال الجلسة أو حذف جلساته، فقراءة اللوحة استعلام
+واحد مرتب على فهرس (accuracy، correct). كل تغيير يسجل وقته في الكاش المشترك
+(CHANGED_KEY) فتُعاد صفحات اللوحة المخزنة (stats_app leaderboard_cache).
+
+العدّادات بنفس تعريف StatsService.get_student_stats: الخطأ ما أُجيب عليه
+إجابة خاطئة، وغير المجاب ما لا إجابة له، والدقة من المجاب فقط.
+"""
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from core.services.shared_cache import get_shared_cache
+
+# ترتيب اللوحة: الدقة ثم الإجابات الصحيحة، والأقدم تسجيلاً عند التعادل
+ORDERING = ('-accuracy', '-correct', 'student_id')
+REVERSE_ORDERING = ('accuracy', 'correct', '-student_id')
+
+# وقت آخر تغيير في الجدول (في الكاش المشترك)؛ صفحات اللوحة المحسوبة قبله قديمة
+CHANGED_KEY = 'leaderboard:changed_at'
+
+# مفتاح موضع الصف في الترتيب: (accuracy، correct، student_id)
+SortKey = Tuple[float, int, int]
+
+
+def sort_key(entry) -> SortKey:
+    return entry.accuracy, entry.correct, entry.student_id
+
+
+def ahead_of(key: SortKey) -> Q:
+    """الصفوف التي تسبق المفتاح في الترتيب (تطابق فهرس leaderboard_rank_idx)"""
+    accuracy, correct, student_id = key
+    return (Q(accuracy__gt=accuracy)
+            | Q(accuracy=accuracy, correct__gt=correct)
+            | Q(accuracy=accuracy, correct=correct, student_id__lt=student_id))
+
+
+def behind(key: SortKey) -> Q:
+    """الصفوف التي تلي المفتاح في الترتيب"""
+    accuracy, correct, student_id = key
+    return (Q(accuracy__lt=accuracy)
+            | Q(accuracy=accuracy, correct__lt=correct)
+            | Q(accuracy=accuracy, correct=correct, student_id__gt=student_id))
+
+
+def encode_cursor(rank: int, key: SortKey) -> str:
+    """مؤشر صفحة (keyset): ترتيب آخر صف ومفتاحه، فالصفحات العميقة لا تحتاج OFFSET"""
+    accuracy, correct, student_id = key
+    return f"{rank}_{accuracy!r}_{correct}_{student_id}"
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[int, SortKey]]:
+    try:
+        rank, accuracy, correct, student_id = cursor.split('_')
+        return int(rank), (float(accuracy), int(correct), int(student_id))
+    except (AttributeError, ValueError):
+        return None
+
+
+def aggregate_students(TestSession, student_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, int]]:
+    """عدّادات الجلسات المكتملة لكل طالب (أو للطلاب المحددين) في استعلام واحد"""
+    sessions = TestSession.objects.filter(completed=True)
+    if student_ids is not None:
+        sessions = sessions.filter(student_id__in=list(student_ids))
+    rows = (
+        sessions.values('student_id')
+        .annotate(
+            exams=Count('id', distinct=True),
+            questions_count=Count('questions'),
+            correct=Count('questions', filter=Q(questions__is_correct=True)),
+            wrong=Count('questions', filter=Q(questions__is_correct=False)
+                        & Q(questions__student_response__isnull=False)
+                        & ~Q(questions__student_response='')),
+            unanswered=Count('questions', filter=Q(questions__student_response__isnull=True)
+                             | Q(questions__student_response='')),
+        )
+        .order_by()
+    )
+    return {
+        row['student_id']: {
+            'exams': row['exams'], 'questions': row['questions_count'], 'correct': row['correct'],
+            'wrong': row['wrong'], 'unanswered': row['unanswered'],
+        }
+        for row in rows
+    }
+
+
+def entry_values(counters: Dict[str, int]) -> Dict[str, float]:
+    """العدّادات مع الدقة (نسبة مئوية بمنزلة عشرية) والنقاط"""
+    answered = counters['correct'] + counters['wrong']
+    accuracy = counters['correct'] / answered * 100 if answered else 0
+    # النقاط: الدقة 80% + الإجابات الصحيحة + عدد الامتحانات
+    score = accuracy * 0.8 + counters['correct'] + counters['exams']
+    return dict(counters, accuracy=round(accuracy, 1), score=round(score, 1))
+
+
+def refresh_students(student_ids: Iterable[int]) -> None:
+    """
+    إعادة حساب صفوف الطلاب المحددين؛ من ليس له أسئلة في جلسات مكتملة يُحذف
+    صفه. يُستدعى داخل معاملة التغيير نفسها حتى لا تخالف اللوحة الجلسات
+    """
+    from core.models import LeaderboardEntry, TestSession
+
+    student_ids = {int(sid) for sid in student_ids if sid}
+    if not student_ids:
+        return
+    with transaction.atomic():
+        counters = aggregate_students(TestSession, student_ids)
+        ranked = {sid: c for sid, c in counters.items() if c['questions'] > 0}
+        LeaderboardEntry.objects.filter(student_id__in=student_ids - set(ranked)).delete()
+        for sid, c in ranked.items():
+            LeaderboardEntry.objects.update_or_create(student_id=sid, defaults=entry_values(c))
+        transaction.on_commit(mark_changed)
+
+
+def refresh_student(student_id: int) -> None:
+    refresh_students([student_id])
+
+
+def rebuild_leaderboard() -> int:
+    """بناء الجدول كاملاً من الجلسات (أمر rebuild_leaderboard)؛ يرجع عدد الصفوف"""
+    from core.models import LeaderboardEntry, TestSession
+
+    counters = aggregate_students(TestSession)
+    entries = [
+        LeaderboardEntry(student_id=sid, **entry_values(c)) for sid, c in counters.items() if c['questions'] > 0
+    ]
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=500)
+        transaction.on_commit(mark_changed)
+    return len(entries)
+
+
+def mark_changed() -> None:
+    get_shared_cache().set(CHANGED_KEY, time.time(), None)
@@ -0,0 +1,54 @@
+"""
+إزالة العبارات التي تقع مجموعة آياتها داخل مجموعة عبارة أُبقيت قبلها
+
+بديل مطابق في النتيجة للحلقة الأصلية:
+
+    for pid in ordered:
+        if any(aset.issubset(S) for S in kept_sets): continue
+        kept.append(pid); kept_sets.append(aset)
+
+كل مجموعة آيات تُمثَّل كـ bitset (int) على فهرس آيات النطاق، ومع كل آية
+قائمة بالعبارات المحفوظة التي تحتويها (inverted index). أي مجموعة تحتوي A
+لا بد أن تحتوي أندر آية في A، فنفحص قائمة تلك الآية فقط، ونتجاوز بالحجم
+(popcount) قبل اختبار الاحتواء بعملية AND واحدة.
+"""
+from typing import Dict, Hashable, Iterable, List, Mapping, Set
+
+
+def dedup_contained(ordered_ids: Iterable[Hashable], ayah_sets: Mapping[Hashable, Set[int]]) -> List[Hashable]:
+    """المعرفات المحفوظة بنفس ترتيب ordered_ids"""
+    bit_of: Dict[int, int] = {}
+    postings: Dict[int, List[int]] = {}   # bit -> فهارس في kept
+    kept: List[Hashable] = []
+    kept_masks: List[int] = []
+    kept_sizes: List[int] = []
+
+    for pid in ordered_ids:
+        aset = ayah_sets[pid]
+        if not aset:
+            # المجموعة الفارغة داخل أي مجموعة محفوظة
+            if kept:
+                continue
+            kept.append(pid); kept_masks.append(0); kept_sizes.append(0)
+            continue
+
+        bits = [bit_of.setdefault(a, len(bit_of)) for a in aset]
+        mask = 0
+        for b in bits:
+            mask |= 1 << b
+        size = len(bits)
+
+        rarest = min((postings.get(b, ()) for b in bits), key=len)
+        contained = False
+        for k in rarest:
+            if kept_sizes[k] >= size and kept_masks[k] & mask == mask:
+                contained = True
+                break
+        if contained:
+            continue
+
+        k = len(kept)
+        kept.append(pid); kept_masks.append(mask); kept_sizes.append(size)
+        for b in bits:
+            postings.setdefault(b, []).append(k)
+    return kept
@@ -0,0 +1,305 @@
+"""
+بناء فهرس العبارات المتكررة (n-grams) من نصوص الآيات
+
+محركان بنفس المخرجات بالضبط:
+- python: الحلقات الأصلية (مرجع للمقارنة)
+- numpy: كل كلمة تُطبَّع مرة واحدة وتتحول لأرقام، ثم تُبنى مفاتيح صحيحة
+  (int64) لكل n-gram وتُحسب التكرارات دفعة واحدة بـ np.unique
+
+ومحرك ثالث مختلف في التعريف:
+- suffix: مصفوفة لاحقات + LCP على تيار الكلمات المطبَّعة للنطاق كله، ويُخرج
+  "التكرارات العظمى" (maximal repeats) بأي طول بدون حد أعلى لعدد الكلمات
+
+المفتاح مبني على "أجزاء" الكلمة بعد التطبيع وليس على الكلمة نفسها، لأن
+التطبيع قد يقسم الكلمة لأكثر من جزء أو يحذفها كلها (مثل ۞)؛ وبهذا يتطابق
+مفتاحان فقط إذا تطابق النص المطبَّع، تماماً كما في المحرك الأصلي.
+"""
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# norm -> [(ayah_id, start_word, end_word, raw_text)]
+Occurrences = Dict[str, List[Tuple[int, int, int, str]]]
+
+ENGINES = ('python', 'numpy', 'suffix')
+
+
+def ngram_occurrences_python(
+    ayat: Iterable[Tuple[int, str]], min_n: int, max_n: int, normalize: Callable[[str], str],
+) -> Occurrences:
+    """الخوارزمية الأصلية: تطبيع كل شريحة n-gram على حدة"""
+    occs = defaultdict(list)
+    for ayah_id, text in ayat:
+        words = text.split()
+        L = len(words)
+        for n in range(min_n, max_n + 1):
+            if n > L: break
+            for i in range(0, L - n + 1):
+                raw = " ".join(words[i:i + n]).strip()
+                norm = normalize(raw)
+                if len(norm.split()) < min_n:  # أمان إضافي
+                    continue
+                occs[norm].append((ayah_id, i + 1, i + n, raw))
+    return occs
+
+
+def ngram_occurrences_numpy(
+    ayat: Iterable[Tuple[int, str]], min_n: int, max_n: int, normalize: Callable[[str], str],
+    min_freq: int = 1, max_freq: int = None,
+) -> Occurrences:
+    """نفس مخرجات المحرك الأصلي (بعد فلترة التكرار) باستخدام مفاتيح صحيحة في NumPy"""
+    import numpy as np
+
+    # ---- 1) تحويل الكلمات لأرقام: كل كلمة مميزة تُطبَّع مرة واحدة ----
+    ayah_ids: List[int] = []
+    ayah_words: List[List[str]] = []
+    part_vocab: Dict[str, int] = {}
+    word_parts_cache: Dict[str, Tuple[int, ...]] = {}
+    parts: List[int] = []
+    word_start: List[int] = []   # أول جزء للكلمة في تيار الأجزاء
+    word_count: List[int] = []   # عدد أجزاء الكلمة
+    word_ayah: List[int] = []    # ترتيب الآية
+    word_pos: List[int] = []     # موضع الكلمة داخل الآية (من 0)
+    for a_ord, (ayah_id, text) in enumerate(ayat):
+        words = text.split()
+        ayah_ids.append(ayah_id)
+        ayah_words.append(words)
+        for i, w in enumerate(words):
+            ids = word_parts_cache.get(w)
+            if ids is None:
+                ids = tuple(part_vocab.setdefault(p, len(part_vocab)) for p in normalize(w).split())
+                word_parts_cache[w] = ids
+            word_start.append(len(parts))
+            word_count.append(len(ids))
+            word_ayah.append(a_ord)
+            word_pos.append(i)
+            parts.extend(ids)
+
+    if not parts:
+        return {}
+    part_arr = np.asarray(parts, dtype=np.int64)
+    w_start = np.asarray(word_start, dtype=np.int64)
+    w_count = np.asarray(word_count, dtype=np.int64)
+    w_ayah = np.asarray(word_ayah, dtype=np.int64)
+    w_pos = np.asarray(word_pos, dtype=np.int64)
+    total_words = len(w_start)
+    total_parts = len(part_arr)
+    vocab = max(len(part_vocab), 1)
+
+    # ---- 2) النوافذ: (كلمة البداية، n) داخل نفس الآية فقط ----
+    win_word, win_n, win_p, win_L = [], [], [], []
+    for n in range(min_n, max_n + 1):
+        if n > total_words:
+            break
+        w = np.arange(total_words - n + 1)
+        last = w + n - 1
+        valid = w_ayah[w] == w_ayah[last]
+        w, last = w[valid], last[valid]
+        p = w_start[w]
+        L = w_start[last] + w_count[last] - p
+        keep = L >= min_n   # نفس "الأمان الإضافي" في المحرك الأصلي
+        win_word.append(w[keep]); win_n.append(np.full(int(keep.sum()), n, dtype=np.int64))
+        win_p.append(p[keep]); win_L.append(L[keep])
+    if not win_word:
+        return {}
+    win_word = np.concatenate(win_word); win_n = np.concatenate(win_n)
+    win_p = np.concatenate(win_p); win_L = np.concatenate(win_L)
+    if not len(win_word):
+        return {}
+
+    # ---- 3) مفتاح صحيح لكل تسلسل أجزاء بطول L (تكرار مضاعفة البادئة) ----
+    # key_L[p] = ترتيب (key_{L-1}[p], part[p+L-1]) بين كل المواضع
+    max_L = int(win_L.max())
+    win_key = np.empty(len(win_word), dtype=np.int64)
+    key = part_arr.copy()
+    for L in range(1, max_L + 1):
+        if L > 1:
+            span = total_parts - L + 1
+            _, key = np.unique(key[:span] * vocab + part_arr[L - 1:], return_inverse=True)
+            key = key.astype(np.int64).reshape(-1)
+        sel = win_L == L
+        if sel.any():
+            # المفاتيح لكل طول مستقلة: نميزها بإزاحة L * (total_parts + 1)
+            win_key[sel] = L * (total_parts + 1) + key[win_p[sel]]
+    # المفاتيح المحسوبة عبر حدود الآيات لا تُقرأ أبداً: النافذة الصحيحة
+    # كل بادئاتها داخل نفس الآية
+
+    # ---- 4) عدّ التكرارات دفعة واحدة ثم الفلترة ----
+    uniq, inverse, counts = np.unique(win_key, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    freq = counts[inverse]
+    keep = freq >= min_freq
+    if max_freq is not None:
+        keep &= freq <= max_freq
+    if not keep.any():
+        return {}
+    k_idx = inverse[keep]
+    k_word = win_word[keep]; k_n = win_n[keep]
+
+    # ترتيب المحرك الأصلي: (الآية، n، موضع البداية) والمفاتيح بترتيب أول ظهور
+    max_pos = int(w_pos.max()) + 1
+    rank = (w_ayah[k_word] * (max_n + 1) + k_n) * max_pos + w_pos[k_word]
+    order = np.lexsort((rank, k_idx))
+    k_idx, k_word, k_n, rank = k_idx[order], k_word[order], k_n[order], rank[order]
+    starts = np.flatnonzero(np.r_[True, k_idx[1:] != k_idx[:-1]])
+    ends = np.r_[starts[1:], len(k_idx)]
+    first_rank = rank[starts]
+
+    rev_vocab = [None] * len(part_vocab)
+    for p, i in part_vocab.items():
+        rev_vocab[i] = p
+
+    out: Occurrences = {}
+    for g in np.argsort(first_rank, kind='stable'):
+        s, e = int(starts[g]), int(ends[g])
+        w0 = int(k_word[s])
+        p0 = int(w_start[w0])
+        L = int(uniq[k_idx[s]] // (total_parts + 1))
+        norm = " ".join(rev_vocab[x] for x in parts[p0:p0 + L])
+        lst = []
+        for w, n in zip(k_word[s:e].tolist(), k_n[s:e].tolist()):
+            a_ord, i = word_ayah[w], word_pos[w]
+            lst.append((ayah_ids[a_ord], i + 1, i + n, " ".join(ayah_words[a_ord][i:i + n]).strip()))
+        out[norm] = lst
+    return out
+
+
+def suffix_array(tokens: Sequence[int], ends: Sequence[int]) -> List[int]:
+    """
+    مصفوفة اللاحقات لتيار فيه فاصل فريد (رقم سالب) في نهاية كل آية.
+    لأن الفاصل فريد، مقارنة لاحقتين تُحسم عند أول فاصل، فيكفي مفتاح
+    الترتيب حتى نهاية الآية بدل اللاحقة كاملة.
+    """
+    return sorted(range(len(tokens)), key=lambda i: tuple(tokens[i:ends[i] + 1]))
+
+
+def lcp_array(tokens: Sequence[int], sa: Sequence[int]) -> List[int]:
+    """خوارزمية Kasai: lcp[i] = طول البادئة المشتركة بين sa[i-1] و sa[i]"""
+    n = len(sa)
+    rank = [0] * n
+    for i, p in enumerate(sa):
+        rank[p] = i
+    lcp = [0] * n
+    h = 0
+    for p in range(n):
+        r = rank[p]
+        if r > 0:
+            q = sa[r - 1]
+            while p + h < n and q + h < n and tokens[p + h] == tokens[q + h] and tokens[p + h] >= 0:
+                h += 1
+            lcp[r] = h
+            if h > 0:
+                h -= 1
+        else:
+            h = 0
+    return lcp
+
+
+def maximal_repeats(
+    ayat: Iterable[Tuple[int, str]], min_n: int, normalize: Callable[[str], str],
+    min_freq: int = 2, max_freq: int = None,
+) -> Occurrences:
+    """
+    كل عبارة متكررة عظمى (لا يمكن مدها يميناً أو يساراً بنفس المواضع)
+    بطول >= min_n كلمة وتكرار بين min_freq و max_freq.
+    الكلمة التي يختفي نصها بعد التطبيع (مثل ۞) تعمل كفاصل.
+    """
+    ayah_ids: List[int] = []
+    ayah_words: List[List[str]] = []
+    vocab: Dict[str, int] = {}
+    norm_cache: Dict[str, str] = {}
+    tokens: List[int] = []
+    pos_ayah: List[int] = []   # ترتيب الآية لكل موضع
+    pos_word: List[int] = []   # رقم الكلمة داخل الآية (من 0)
+    ends: List[int] = []       # موضع فاصل نهاية الآية لكل موضع
+    sentinel = -1
+    for a_ord, (ayah_id, text) in enumerate(ayat):
+        words = text.split()
+        ayah_ids.append(ayah_id)
+        ayah_words.append(words)
+        start = len(tokens)
+        for i, w in enumerate(words):
+            norm = norm_cache.get(w)
+            if norm is None:
+                norm = norm_cache[w] = normalize(w)
+            if norm:
+                tokens.append(vocab.setdefault(norm, len(vocab)))
+            else:
+                tokens.append(sentinel); sentinel -= 1
+            pos_ayah.append(a_ord); pos_word.append(i)
+        tokens.append(sentinel); sentinel -= 1
+        pos_ayah.append(a_ord); pos_word.append(len(words))
+        ends.extend([len(tokens) - 1] * (len(tokens) - start))
+    if not tokens:
+        return {}
+
+    sa = suffix_array(tokens, ends)
+    lcp = lcp_array(tokens, sa)
+    rev_vocab = [None] * len(vocab)
+    for w, i in vocab.items():
+        rev_vocab[i] = w
+
+    found = []   # (first_rank, norm, occurrences)
+    n = len(sa)
+
+    def report(length, lb, rb):
+        count = rb - lb + 1
+        if length < min_n or count < min_freq or (max_freq is not None and count > max_freq):
+            return
+        starts = sorted(sa[lb:rb + 1])
+        # أقصى يسار: لو كل المواضع مسبوقة بنفس الكلمة فالعبارة تمتد يساراً
+        prev = {tokens[p - 1] if p > 0 else None for p in starts}
+        if len(prev) == 1 and None not in prev and next(iter(prev)) >= 0:
+            return
+        occs = []
+        for p in starts:
+            a_ord, i = pos_ayah[p], pos_word[p]
+            raw = " ".join(ayah_words[a_ord][i:i + length]).strip()
+            occs.append((ayah_ids[a_ord], i + 1, i + length, raw))
+        norm = " ".join(rev_vocab[t] for t in tokens[starts[0]:starts[0] + length])
+        found.append((starts[0], norm, occs))
+
+    # فترات LCP بمكدس (كل فترة = عقدة داخلية في شجرة اللاحقات = تكرار أقصى يميناً)
+    stack = [(0, 0)]   # (lcp, left bound)
+    for i in range(1, n + 1):
+        cur = lcp[i] if i < n else 0
+        lb = i - 1
+        while cur < stack[-1][0]:
+            length, lb = stack.pop()
+            report(length, lb, i - 1)
+        if cur > stack[-1][0]:
+            stack.append((cur, lb))
+
+    found.sort(key=lambda x: x[0])
+    out: Occurrences = {}
+    for _, norm, occs in found:
+        out.setdefault(norm, occs)
+    return out
+
+
+def ngram_occurrences(
+    ayat: Sequence[Tuple[int, str]], min_n: int, max_n: int, min_freq: int, max_freq: int,
+    normalize: Callable[[str], str], engine: str = 'python',
+) -> Occurrences:
+    """كل n-gram تكراره بين min_freq و max_freq مع مواضعه (max_n يُتجاهل مع suffix)"""
+    if engine == 'numpy':
+        return ngram_occurrences_numpy(ayat, min_n, max_n, normalize, min_freq, max_freq)
+    if engine == 'suffix':
+        return maximal_repeats(ayat, min_n, normalize, min_freq, max_freq)
+    occs = ngram_occurrences_python(ayat, min_n, max_n, normalize)
+    return {k: v for k, v in occs.items() if min_freq <= len(v) <= max_freq}
+
+
+def select_longest_per_ayah_set(kept: Occurrences) -> List[Tuple[str, List[Tuple[int, int, int, str]]]]:
+    """
+    تجميع حسب مجموعة الآيات المتطابقة ثم اختيار "الأطول"
+    (بعدد الكلمات) ثم الأكثر تكراراً كبديل
+    """
+    groups = defaultdict(list)  # frozenset(ayah_ids) -> [ (norm, occ_list) ]
+    for norm, v in kept.items():
+        ayids = frozenset(o[0] for o in v)
+        groups[ayids].append((norm, v))
+    selected = []
+    for items in groups.values():
+        items.sort(key=lambda x: (-len(x[0].split()), -len(x[1])))
+        selected.append(items[0])
+    return selected
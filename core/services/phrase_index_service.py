@@ -0,0 +1,175 @@
+"""
+خدمة كتابة فهرس العبارات (Phrase / PhraseOccurrence) بشكل تزايدي
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Count
+
+from core.models import Ayah, Phrase, PhraseOccurrence, QuarterPhraseStat
+from core.services.corpus_service import bump_corpus_version
+
+# (normalized, display_text, [(ayah_id, start_word, end_word), ...])
+PhraseEntry = Tuple[str, str, Sequence[Tuple[int, int, int]]]
+
+# أقل من حد متغيرات SQLite في الإصدارات القديمة
+IN_CHUNK = 900
+
+
+def _chunks(seq: Sequence, size: int = IN_CHUNK):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+class PhraseIndexService:
+    """
+    مقارنة الفهرس المطلوب لنطاق آيات مع الموجود فعلاً، ثم إضافة/حذف
+    المواضع المختلفة فقط وتحديث global_freq في مكانه، كل ذلك في معاملة
+    واحدة؛ القارئ يرى إما الفهرس القديم كاملاً أو الجديد كاملاً.
+
+    العبارات تُطابَق بالحقل normalized فتحتفظ بمعرفاتها عبر إعادة البناء
+    (وبالتالي تبقى روابط TestQuestion.phrase سليمة).
+    """
+
+    def __init__(self, batch_size: int = 2000):
+        self.batch_size = batch_size
+
+    def apply(self, entries: Iterable[PhraseEntry], scope_ayah_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+        """
+        entries: الحالة المطلوبة للعبارات ومواضعها داخل النطاق
+        scope_ayah_ids: الآيات التي يُعاد فهرستها؛ None = كل الآيات (استبدال كامل)
+        """
+        entries = list(entries)
+        with transaction.atomic():
+            stats = self._apply(entries, scope_ayah_ids)
+            # إبطال لقطة المصحف في كل العمليات بعد نجاح الحفظ
+            transaction.on_commit(bump_corpus_version)
+        return stats
+
+    def rebuild_quarter_stats(self, quarter_ids: Optional[Sequence[int]] = None) -> int:
+        """
+        إعادة حساب صفوف QuarterPhraseStat (كل الأرباع لو quarter_ids = None).
+        هذا هو GROUP BY الثقيل، ويُنفَّذ هنا مرة واحدة بدل كل بداية اختبار.
+        """
+        with transaction.atomic():
+            occ = PhraseOccurrence.objects.filter(ayah__quarter__isnull=False)
+            if quarter_ids is None:
+                QuarterPhraseStat.objects.all().delete()
+                chunks = [None]
+            else:
+                chunks = list(_chunks(list(quarter_ids)))
+            total = 0
+            for ids in chunks:
+                qs = occ
+                if ids is not None:
+                    QuarterPhraseStat.objects.filter(quarter_id__in=ids).delete()
+                    qs = occ.filter(ayah__quarter_id__in=ids)
+                rows = (qs.values('ayah__quarter_id', 'phrase_id')
+                        .annotate(freq=Count('id'))
+                        .values_list('ayah__quarter_id', 'phrase_id', 'freq'))
+                objs = [QuarterPhraseStat(quarter_id=q, phrase_id=p, freq=f) for q, p, f in rows]
+                QuarterPhraseStat.objects.bulk_create(objs, batch_size=self.batch_size)
+                total += len(objs)
+            transaction.on_commit(bump_corpus_version)
+        return total
+
+    # ------------------------------------------------------------------
+    def _apply(self, entries: List[PhraseEntry], scope_ayah_ids) -> Dict[str, int]:
+        full = scope_ayah_ids is None
+        if full:
+            scope = list(Ayah.objects.values_list('id', flat=True))
+        else:
+            scope = sorted(set(scope_ayah_ids))
+
+        # ---- العبارات: الموجود حسب normalized (أقدم صف هو المعتمد) ----
+        phrase_ids: Dict[str, int] = {}
+        for pid, norm in Phrase.objects.order_by('-id').values_list('id', 'normalized'):
+            phrase_ids[norm] = pid
+
+        new_phrases = []
+        seen = set()
+        for norm, text, _ in entries:
+            if norm not in phrase_ids and norm not in seen:
+                seen.add(norm)
+                new_phrases.append(Phrase(text=text, normalized=norm,
+                                          length_words=len(norm.split()), global_freq=0))
+        if new_phrases:
+            created = Phrase.objects.bulk_create(new_phrases, batch_size=self.batch_size)
+            if any(ph.pk is None for ph in created):
+                # قواعد بيانات لا تُرجع المفاتيح من bulk_create
+                fresh = Phrase.objects.filter(normalized__in=[p.normalized for p in created])
+                created = list(fresh.order_by('-id'))
+            for ph in created:
+                phrase_ids.setdefault(ph.normalized, ph.pk)
+
+        desired: Set[Tuple[int, int, int, int]] = set()
+        desired_phrases: Set[int] = set()
+        for norm, _, occs in entries:
+            pid = phrase_ids[norm]
+            desired_phrases.add(pid)
+            for ayah_id, s, e in occs:
+                desired.add((pid, ayah_id, s, e))
+
+        # ---- المواضع الحالية داخل النطاق ----
+        current: Dict[Tuple[int, int, int, int], int] = {}
+        for ids in _chunks(scope):
+            for oid, pid, aid, s, e in (PhraseOccurrence.objects.filter(ayah_id__in=ids)
+                                        .values_list('id', 'phrase_id', 'ayah_id', 'start_word', 'end_word')):
+                current[(pid, aid, s, e)] = oid
+
+        to_delete = [oid for key, oid in current.items() if key not in desired]
+        to_add = [key for key in desired if key not in current]
+        touched = {key[0] for key, oid in current.items() if key not in desired}
+        touched.update(key[0] for key in to_add)
+        touched.update(desired_phrases)
+
+        for ids in _chunks(to_delete):
+            PhraseOccurrence.objects.filter(id__in=ids).delete()
+        PhraseOccurrence.objects.bulk_create(
+            [PhraseOccurrence(phrase_id=pid, ayah_id=aid, start_word=s, end_word=e)
+             for pid, aid, s, e in sorted(to_add)],
+            batch_size=self.batch_size, ignore_conflicts=True,
+        )
+
+        # ---- global_freq في مكانه للعبارات المتأثرة فقط ----
+        if full:
+            touched.update(Phrase.objects.values_list('id', flat=True))
+        touched = sorted(touched)
+        freq: Dict[int, int] = {}
+        for ids in _chunks(touched):
+            freq.update(PhraseOccurrence.objects.filter(phrase_id__in=ids)
+                        .values_list('phrase_id').annotate(c=Count('id')).values_list('phrase_id', 'c'))
+
+        orphans = [pid for pid in touched if not freq.get(pid) and pid not in desired_phrases]
+        for ids in _chunks(orphans):
+            Phrase.objects.filter(id__in=ids).delete()
+
+        orphan_set = set(orphans)
+        changed = []
+        for ids in _chunks([pid for pid in touched if pid not in orphan_set]):
+            for ph in Phrase.objects.filter(id__in=ids).only('id', 'global_freq'):
+                cnt = freq.get(ph.id, 0)
+                if ph.global_freq != cnt:
+                    ph.global_freq = cnt
+                    changed.append(ph)
+        Phrase.objects.bulk_update(changed, ['global_freq'], batch_size=self.batch_size)
+
+        # ---- مصفوفة quarter × phrase للأرباع المتأثرة ----
+        if full:
+            self.rebuild_quarter_stats()
+        else:
+            quarter_ids = set()
+            for ids in _chunks(scope):
+                quarter_ids.update(Ayah.objects.filter(id__in=ids, quarter__isnull=False)
+                                   .values_list('quarter_id', flat=True))
+            self.rebuild_quarter_stats(sorted(quarter_ids))
+
+        return {
+            'phrases_created': len(new_phrases),
+            'phrases_deleted': len(orphans),
+            'phrases_freq_updated': len(changed),
+            'occurrences_added': len(to_add),
+            'occurrences_deleted': len(to_delete),
+            'phrases': len(desired_phrases),
+            'occurrences': len(desired),
+        }
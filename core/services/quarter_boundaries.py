@@ -0,0 +1,60 @@
+"""
+جدول حدود الأرباع: أول وآخر آية وأول وآخر صفحة وعدد الصفحات لكل ربع
+
+يُحسب عند الاستيراد وربط الصفحات ويُحفظ على Quarter، ثم تحمله لقطة المصحف
+(QuarterInfo) في الذاكرة، فسؤال "أين يبدأ هذا الربع" لا يحتاج استعلاماً.
+"""
+from collections import namedtuple
+from typing import Dict, Iterable, Sequence
+
+QuarterBounds = namedtuple('QuarterBounds', 'first_ayah_id last_ayah_id first_page last_page page_count')
+
+EMPTY_BOUNDS = QuarterBounds(None, None, None, None, 0)
+
+FIELDS = ('first_ayah', 'last_ayah', 'first_page', 'last_page', 'page_count')
+
+
+def compute_quarter_bounds(ayah_rows: Iterable[Sequence]) -> Dict[int, QuarterBounds]:
+    """
+    ayah_rows: (ayah_id, surah, number, quarter_id, page)؛ الآيات بلا ربع تُتجاهل
+    والصفحات الفارغة لا تدخل في حدود الصفحات
+    """
+    first: Dict[int, tuple] = {}
+    last: Dict[int, tuple] = {}
+    pages: Dict[int, set] = {}
+    for ayah_id, surah, number, quarter_id, page in ayah_rows:
+        if not quarter_id:
+            continue
+        key = (surah, number, ayah_id)
+        if quarter_id not in first or key < first[quarter_id]:
+            first[quarter_id] = key
+        if quarter_id not in last or key > last[quarter_id]:
+            last[quarter_id] = key
+        qpages = pages.setdefault(quarter_id, set())
+        if page:
+            qpages.add(page)
+    return {
+        qid: QuarterBounds(
+            first[qid][2], last[qid][2],
+            min(pages[qid]) if pages[qid] else None,
+            max(pages[qid]) if pages[qid] else None,
+            len(pages[qid]),
+        )
+        for qid in first
+    }
+
+
+def rebuild_quarter_bounds() -> int:
+    """إعادة حساب الحدود وحفظها على كل الأرباع (استعلام قراءة واحد وتحديث مجمّع)"""
+    from core.models import Ayah, Quarter
+
+    bounds = compute_quarter_bounds(
+        Ayah.objects.values_list('id', 'surah', 'number', 'quarter_id', 'page__number')
+    )
+    quarters = list(Quarter.objects.only('id', *FIELDS))
+    for q in quarters:
+        b = bounds.get(q.id, EMPTY_BOUNDS)
+        q.first_ayah_id, q.last_ayah_id = b.first_ayah_id, b.last_ayah_id
+        q.first_page, q.last_page, q.page_count = b.first_page, b.last_page, b.page_count
+    Quarter.objects.bulk_update(quarters, list(FIELDS), batch_size=500)
+    return len(quarters)
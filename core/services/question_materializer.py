@@ -0,0 +1,82 @@
+"""
+تحويل العبارات المختارة إلى أسئلة جاهزة للحفظ في السيشن
+
+كانت الواجهات تبني ``literal_ayahs`` لكل مرشح (قبل الاختيار) بمرور كامل على
+النطاق لكل عبارة. هنا تُبنى للمختار فقط، وفي مرور واحد على النطاق لكل
+العبارات معاً، من لقطة المصحف بدون أي استعلام.
+"""
+from typing import Any, Dict, Iterable, List
+
+from core.services.corpus_service import QuranCorpus
+
+SURAH_NAMES = [
+    "", "الفاتحة", "البقرة", "آل عمران", "النساء", "المائدة", "الأنعام", "الأعراف", "الأنفال", "التوبة",
+    "يونس", "هود", "يوسف", "الرعد", "إبراهيم", "الحجر", "النحل", "الإسراء", "الكهف", "مريم", "طه",
+    "الأنبياء", "الحج", "المؤمنون", "النور", "الفرقان", "الشعراء", "النمل", "القصص", "العنكبوت", "الروم",
+    "لقمان", "السجدة", "الأحزاب", "سبأ", "فاطر", "يس", "الصافات", "ص", "الزمر", "غافر",
+    "فصلت", "الشورى", "الزخرف", "الدخان", "الجاثية", "الأحقاف", "محمد", "الفتح", "الحجرات", "ق",
+    "الذاريات", "الطور", "النجم", "القمر", "الرحمن", "الواقعة", "الحديد", "المجادلة", "الحشر", "الممتحنة",
+    "الصف", "الجمعة", "المنافقون", "التغابن", "الطلاق", "التحريم", "الملك", "القلم", "الحاقة", "المعارج",
+    "نوح", "الجن", "المزمل", "المدثر", "القيامة", "الإنسان", "المرسلات", "النبأ", "النازعات", "عبس",
+    "التكوير", "الانفطار", "المطففين", "الانشقاق", "البروج", "الطارق", "الأعلى", "الغاشية", "الفجر", "البلد",
+    "الشمس", "الليل", "الضحى", "الشرح", "التين", "العلق", "القدر", "البينة", "الزلزلة", "العاديات",
+    "القارعة", "التكاثر", "العصر", "الهمزة", "الفيل", "قريش", "الماعون", "الكوثر", "الكافرون", "النصر",
+    "المسد", "الإخلاص", "الفلق", "الناس",
+]
+
+
+def surah_name(number: int) -> str:
+    if 1 <= number < len(SURAH_NAMES):
+        return SURAH_NAMES[number]
+    return f"سورة {number}"
+
+
+class QuestionMaterializer:
+    """يبني مواضع العبارات وأسئلة المتشابهات لنطاق واحد"""
+
+    def __init__(self, corpus: QuranCorpus, scope_idx: Iterable[int]):
+        self.corpus = corpus
+        self.scope_idx = list(scope_idx)
+
+    def literal_ayahs(self, phrase_ids: Iterable[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """مواضع كل عبارة مجمعة حسب الآية بترتيب المصحف"""
+        corpus = self.corpus
+        out: Dict[int, List[Dict[str, Any]]] = {}
+        for pid, occs in corpus.phrase_occurrences_many(phrase_ids, self.scope_idx).items():
+            by_ayah: Dict[int, List[Dict[str, int]]] = {}
+            for idx, start_word, end_word in occs:
+                by_ayah.setdefault(idx, []).append({'start_word': start_word, 'end_word': end_word})
+            literal = []
+            for idx, positions in by_ayah.items():
+                ayah = corpus.ayah(idx)
+                quarter = corpus.quarters.get(ayah.quarter_id)
+                literal.append({
+                    'surah': ayah.surah,
+                    'surah_name': surah_name(ayah.surah),
+                    'number': ayah.number,
+                    'juz_number': ayah.juz,
+                    'quarter_label': quarter.label if quarter else None,
+                    'text': ayah.text,
+                    'positions': positions,        # مواضع التكرار داخل الآية
+                    'count': len(positions),
+                    'ayah_id': ayah.id,
+                    'quarter_id': ayah.quarter_id,
+                    'page_number': ayah.page,
+                })
+            out[pid] = literal
+        return out
+
+    def similar_questions(self, selected: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        selected: مرشحون بالمفاتيح phrase_id, phrase_text, correct_count, occurrence_ayah_ids
+        يرجع أسئلة السيشن بنفس ترتيب selected
+        """
+        literal = self.literal_ayahs(c['phrase_id'] for c in selected)
+        return [{
+            'phrase_id': c['phrase_id'],
+            'phrase_text': c['phrase_text'],
+            'correct_count': c['correct_count'],
+            'occurrence_ayah_ids': c['occurrence_ayah_ids'],
+            'literal_ayahs': literal[c['phrase_id']],
+            'given_answer': None,
+        } for c in selected]
@@ -0,0 +1,142 @@
+"""
+مجمّع مرشحي أسئلة المتشابهات (question pool) لنطاق من الأرباع
+
+``build_pool`` هو نفس منطق بداية الاختبار في similar_count وsimilar_on_pages
+(فلتر التكرار، استبعاد العبارات القصيرة وبدايات الأرباع، إزالة المحتوى،
+تصنيف الصعوبة) لكنه يرجع المرشحين مصنفين حسب الصعوبة ومرتبين بالـ score،
+بصيغة مضغوطة قابلة للتخزين كـ JSON:
+
+    {'easy': [[phrase_id, freq, [ayah_id, ...]], ...], 'medium': [...], 'hard': [...]}
+
+النتيجة تعتمد على مجموعة الأرباع كاملة (التكرار مجموع على النطاق، والتصنيف
+والاحتواء يتبعانه)، لذلك لا يُدمج مجمّع ربعين لنحصل على مجمّع نطاقهما.
+
+الصعوبة من درجة الالتباس (Phrase.confusability) إن حُسبت للعبارة، وإلا من
+طول العبارة وتكرارها في النطاق (``bucket``).
+
+``sample_pool`` يختار الأسئلة من المجمّع بنفس توزيع الاختيار السابق.
+"""
+import math
+import random
+from typing import Any, Dict, Iterable, List, Optional
+
+from core.services.corpus_service import QuranCorpus
+from core.services.phrase_dedup import dedup_contained
+
+BUCKETS = ('easy', 'medium', 'hard')
+
+MIN_FREQ = 2
+MAX_OCC_SCOPE = 60
+MIN_PHRASE_WORDS = 3
+
+# نسب الاختيار في المستوى المختلط
+MIXED_SHARE = {'easy': 0.40, 'medium': 0.45}
+
+Pool = Dict[str, List[list]]
+
+
+def bucket(ph_len: int, freq: int) -> str:
+    if ph_len >= 5 and 2 <= freq <= 3:
+        return 'easy'
+    if ph_len >= 4 and 2 <= freq <= 6:
+        return 'medium'
+    if ph_len >= 3 and 7 <= freq <= 60:
+        return 'hard'
+    return 'other'
+
+
+def phrase_score(corpus: QuranCorpus, phrase_id: int, freq: int) -> float:
+    return freq * math.log(1 + corpus.phrase(phrase_id).length_words)
+
+
+def build_pool(corpus: QuranCorpus, quarter_ids: Iterable[int]) -> Pool:
+    """المجمّع لنطاق مجموعة أرباع؛ كل القوائم فارغة لو لا توجد عبارات متشابهة"""
+    quarter_ids = list(quarter_ids)
+    pool: Pool = {b: [] for b in BUCKETS}
+    scope_idx = corpus.scope_ayah_indices(quarter_ids=quarter_ids)
+    if not scope_idx:
+        return pool
+
+    scope_freq = corpus.scope_phrase_frequencies(quarter_ids=quarter_ids)
+    freq_map = {pid: f for pid, f in scope_freq.items() if MIN_FREQ <= f <= MAX_OCC_SCOPE}
+
+    # استبعاد العبارات القصيرة جداً (غالباً كلمات شائعة وليست متشابهات حقيقية)
+    valid = {pid for pid in freq_map if corpus.phrase(pid).length_words >= MIN_PHRASE_WORDS}
+    if valid:
+        freq_map = {pid: f for pid, f in freq_map.items() if pid in valid}
+
+    # استبعاد العبارات التي لا تظهر إلا في آيات بداية الأرباع
+    starts = {corpus.quarter_first_ayah_index(q) for q in corpus.scope_quarter_ids(quarter_ids=quarter_ids)}
+    starts.discard(None)
+    if starts:
+        excluded = corpus.phrase_ids_in(starts) - corpus.phrase_ids_in(i for i in scope_idx if i not in starts)
+        if excluded:
+            freq_map = {pid: f for pid, f in freq_map.items() if pid not in excluded}
+
+    if not freq_map:
+        # معايير أقل صرامة
+        freq_map = {pid: f for pid, f in scope_freq.items() if f >= MIN_FREQ}
+        if not freq_map:
+            return pool
+
+    occ_by_phrase = corpus.phrase_ayah_sets(scope_idx, freq_map)
+    phrases = {pid: corpus.phrase(pid) for pid in freq_map}
+    ordered = sorted(freq_map, key=lambda pid: (-phrases[pid].length_words, -freq_map[pid], phrases[pid].text))
+    kept = dedup_contained(ordered, occ_by_phrase)
+
+    # مستويات الالتباس من اللقطة؛ العبارة بلا مستوى تُصنف بطولها وتكرارها
+    bands = {b: corpus.confusability_band_ids(b) for b in BUCKETS} if corpus.has_confusability else {}
+    for pid in kept:
+        b = next((b for b in BUCKETS if pid in bands.get(b, ())), None)
+        if b is None:
+            b = bucket(phrases[pid].length_words, freq_map[pid])
+        if b != 'other':
+            pool[b].append(pid)
+    if not any(pool.values()):
+        # قبول كل العبارات كمستوى سهل
+        pool['easy'] = list(kept)
+
+    for b in BUCKETS:
+        pids = sorted(pool[b], key=lambda pid: (-phrase_score(corpus, pid, freq_map[pid]), phrases[pid].text))
+        pool[b] = [[pid, freq_map[pid], sorted(occ_by_phrase[pid])] for pid in pids]
+    return pool
+
+
+def _candidate(corpus: QuranCorpus, entry: list, b: str) -> Dict[str, Any]:
+    pid, freq, ayah_ids = entry
+    return {
+        'phrase_id': pid,
+        'phrase_text': corpus.phrase(pid).text,
+        'correct_count': freq,
+        'occurrence_ayah_ids': list(ayah_ids),
+        'bucket': b,
+        'score': phrase_score(corpus, pid, freq),
+    }
+
+
+def sample_pool(
+    corpus: QuranCorpus, pool: Pool, desired: int, difficulty: str, rng: Optional[random.Random] = None
+) -> List[Dict[str, Any]]:
+    """
+    mixed: 40% سهل و45% متوسط والباقي صعب عشوائياً، ويُكمل النقص من المتوسط ثم
+    السهل ثم الصعب. غير ذلك: الأعلى score من المستوى المطلوب (لا شيء لو فارغ).
+    التكلفة O(desired) لأن القوائم مرتبة مسبقاً ونأخذ عينة بدل خلط القائمة كاملة.
+    """
+    rng = rng or random
+    if difficulty == 'mixed':
+        # أول desired عنصراً من خلط كامل = عينة عشوائية بحجم desired
+        drawn = {b: rng.sample(pool[b], min(len(pool[b]), desired)) for b in BUCKETS}
+        E, M, H = ([_candidate(corpus, e, b) for e in drawn[b]] for b in BUCKETS)
+        ne = max(0, round(desired * MIXED_SHARE['easy']))
+        nm = max(0, round(desired * MIXED_SHARE['medium']))
+        nh = max(0, desired - ne - nm)
+        take = E[:ne] + M[:nm] + H[:nh]
+        for rest in (M[nm:], E[ne:], H[nh:]):
+            if len(take) >= desired:
+                break
+            take += rest[:desired - len(take)]
+        selected = take[:desired]
+        rng.shuffle(selected)
+        return selected
+
+    return [_candidate(corpus, e, difficulty) for e in pool.get(difficulty, [])[:desired]]
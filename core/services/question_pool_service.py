@@ -0,0 +1,90 @@
+"""
+تخزين مجمّعات مرشحي الأسئلة (QuestionPool) واسترجاعها عند بداية الاختبار
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Sequence
+
+from django.db import IntegrityError, transaction
+
+from core.models import QuestionPool
+from core.services.corpus_service import QuranCorpus, get_corpus
+from core.services.question_pool import Pool, build_pool
+
+# أقصى عدد مجمّعات في ذاكرة كل عملية
+MEMO_SIZE = 512
+
+_memo: 'OrderedDict[tuple, Pool]' = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def scope_key(quarter_ids: Sequence[int]) -> str:
+    return hashlib.sha1(','.join(map(str, quarter_ids)).encode()).hexdigest()
+
+
+class QuestionPoolService:
+    """
+    ترتيب البحث: ذاكرة العملية ← جدول QuestionPool بنفس إصدار اللقطة ← حساب
+    مباشر ثم حفظه. النطاق يُختزل لمجموعة أرباعه مرتبة، فاختيار جزء كامل
+    واختيار أرباعه الثمانية يشتركان في نفس الصف.
+    """
+
+    def __init__(self, corpus: Optional[QuranCorpus] = None):
+        self.corpus = corpus or get_corpus()
+
+    def scope_quarters(self, juz_ids: Iterable[int] = (), quarter_ids: Iterable[int] = ()) -> List[int]:
+        return sorted(set(self.corpus.scope_quarter_ids(juz_ids, quarter_ids)))
+
+    def get(self, juz_ids: Iterable[int] = (), quarter_ids: Iterable[int] = ()) -> Pool:
+        quarters = self.scope_quarters(juz_ids, quarter_ids)
+        key = scope_key(quarters)
+        memo_key = (self.corpus.version, key)
+        with _memo_lock:
+            pool = _memo.get(memo_key)
+            if pool is not None:
+                _memo.move_to_end(memo_key)
+                return pool
+
+        row = QuestionPool.objects.filter(scope_key=key, corpus_version=self.corpus.version).only('pool').first()
+        if row is not None:
+            pool = json.loads(row.pool)
+        else:
+            pool = build_pool(self.corpus, quarters)
+            self._save(quarters, pool)
+        self._remember(memo_key, pool)
+        return pool
+
+    def precompute(self, scopes: Iterable[Sequence[int]]) -> int:
+        """حساب وحفظ مجمّعات نطاقات محددة (وحذف صفوف الإصدارات القديمة)"""
+        QuestionPool.objects.exclude(corpus_version=self.corpus.version).delete()
+        count = 0
+        for quarters in scopes:
+            quarters = sorted(set(quarters))
+            self._save(quarters, build_pool(self.corpus, quarters))
+            count += 1
+        return count
+
+    def _save(self, quarters: Sequence[int], pool: Pool) -> None:
+        try:
+            with transaction.atomic():
+                QuestionPool.objects.update_or_create(
+                    scope_key=scope_key(quarters),
+                    defaults={
+                        'quarter_ids': ','.join(map(str, quarters)),
+                        'corpus_version': self.corpus.version,
+                        'pool': json.dumps(pool, separators=(',', ':')),
+                    },
+                )
+        except IntegrityError:
+            # طالب آخر بدأ نفس النطاق في نفس اللحظة وحفظ نفس المحتوى
+            pass
+
+    @staticmethod
+    def _remember(memo_key: tuple, pool: Pool) -> None:
+        with _memo_lock:
+            _memo[memo_key] = pool
+            _memo.move_to_end(memo_key)
+            while len(_memo) > MEMO_SIZE:
+                _memo.popitem(last=False)
@@ -0,0 +1,67 @@
+"""
+بيانات النطاق لصفحات الاختيار: الأجزاء وأرباعها وعناوينها، وأيها له صفحات
+
+كانت صفحات الاختيار تستعلم عن أرباع كل جزء على حدة (30 استعلاماً)، و
+_allowed_juz_numbers_for_scope تبني استعلام Exists على Quarter/Ayah في كل
+طلب. هنا تُحسب مرة واحدة من لقطة المصحف لكل إصدار وتُحفظ في ذاكرة العملية،
+فلا تحتاج الصفحات لأي استعلام.
+"""
+import threading
+from collections import namedtuple
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from core.services.corpus_service import QuranCorpus, QuarterInfo, get_corpus
+
+# يكفي القالب j.number (بدل كائن Juz)
+JuzEntry = namedtuple('JuzEntry', 'number')
+
+_lock = threading.Lock()
+_cached: Dict[str, 'ScopeMetadata'] = {}
+
+
+class ScopeMetadata:
+    """بيانات نطاق لإصدار واحد من لقطة المصحف؛ للقراءة فقط"""
+
+    def __init__(self, corpus: QuranCorpus):
+        self.version = corpus.version
+        self.juz_quarters_map: Dict[JuzEntry, Dict[str, object]] = {}
+        for juz, quarters in sorted(corpus.quarters_by_juz.items()):
+            quarters = sorted(quarters, key=lambda q: q.index_in_juz)
+            self.juz_quarters_map[JuzEntry(juz)] = {
+                'quarters': quarters,
+                'first_label': quarters[0].label if quarters else '',
+            }
+        page = corpus.page
+        self.quarters_with_pages: FrozenSet[int] = frozenset(
+            qid for qid in corpus.quarters if any(page[i] for i in corpus.quarter_ayah_indices(qid))
+        )
+        self.quarter_juz: Dict[int, int] = {qid: q.juz for qid, q in corpus.quarters.items()}
+        self.juz_with_pages: Tuple[int, ...] = tuple(sorted({self.quarter_juz[q] for q in self.quarters_with_pages}))
+
+    def quarters(self, juz_number: int) -> List[QuarterInfo]:
+        return self.juz_quarters_map.get(JuzEntry(juz_number), {}).get('quarters', [])
+
+    def allowed_juz_numbers(self, juz_ids: Iterable = (), quarter_ids: Iterable = ()) -> List[int]:
+        """
+        أجزاء النطاق التي لها صفحات: من الأرباع المختارة إن وُجدت وإلا من
+        الأجزاء المختارة؛ وكل الأجزاء ذات الصفحات لو النطاق فارغ أو بلا صفحات
+        """
+        quarter_ids = [int(q) for q in quarter_ids or () if str(q).isdigit()]
+        if quarter_ids:
+            allowed = {self.quarter_juz[q] for q in quarter_ids if q in self.quarters_with_pages}
+        else:
+            juz_ids = {int(j) for j in juz_ids or () if str(j).isdigit()}
+            allowed = {j for j in self.juz_with_pages if j in juz_ids} if juz_ids else set(self.juz_with_pages)
+        return sorted(allowed) or list(self.juz_with_pages)
+
+
+def get_scope_metadata(corpus: Optional[QuranCorpus] = None) -> ScopeMetadata:
+    """بيانات النطاق للإصدار الحالي؛ تُحسب مرة لكل إصدار في كل عملية"""
+    corpus = corpus or get_corpus()
+    meta = _cached.get(corpus.version)
+    if meta is None:
+        meta = ScopeMetadata(corpus)
+        with _lock:
+            _cached.clear()
+            _cached[corpus.version] = meta
+    return meta
@@ -0,0 +1,14 @@
+"""
+الكاش المشترك بين عمليات الخادم (alias "shared" في CACHES)
+
+جدول في قاعدة البيانات (DatabaseCache) فلا يحتاج خدمة خارجية، و add() فيه
+ذري فيصلح قفلاً بين العمليات. لو لم يُعرَّف الـ alias يُستخدم الكاش الافتراضي.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+ALIAS = 'shared'
+
+
+def get_shared_cache():
+    return caches[ALIAS] if ALIAS in getattr(settings, 'CACHES', {}) else caches['default']
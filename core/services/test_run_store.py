@@ -0,0 +1,210 @@
+"""
+مخزن TestRun: أسئلة الاختبار الجاري على الخادم بدل السيشن
+
+كانت الواجهات تضع قائمة الأسئلة كاملة (مع literal_ayahs ونصوص الآيات) في
+request.session فتُكتب عشرات الكيلوبايتات في django_session مع كل إجابة.
+هنا يُحفظ لكل سؤال المعرّفات والإجابات فقط في صف TestRun، ويحمل السيشن
+test_run_id، وتُعاد حقول العرض من لقطة المصحف عند القراءة.
+
+أثناء الاختبار تُلحق الحالة بسجل الإجابات (AnswerJournal) ولا تُكتب في صف
+TestRun إلا عند نقاط الحفظ أو نهاية الاختبار.
+
+الجلسة التي لها بذرة توليد (generation_seed) لا تُخزن أسئلتها أصلاً: يُحفظ
+لكل سؤال ما تغيّر فيه عن السؤال المولَّد فقط ({'deltas': [...]})، والأسئلة
+تُعاد توليدها من البذرة عند الحاجة وتُحفظ في ذاكرة العملية. لو تغيّر إصدار
+لقطة المصحف أثناء الاختبار (ولم تكن الأسئلة في ذاكرة هذه العملية) تُبنى من
+صفوف TestQuestion للجلسة على اللقطة الجديدة.
+"""
+import copy
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from core.services.corpus_service import QuranCorpus, get_corpus
+from core.services.question_materializer import QuestionMaterializer
+
+SESSION_KEY = 'test_run_id'
+
+# حقول عرض تُشتق من اللقطة ولا تُخزن
+DISPLAY_KEYS = ('phrase_text', 'literal_ayahs', 'ayah_text')
+
+
+# أقصى عدد اختبارات جارية تُحفظ أسئلتها المولَّدة في ذاكرة كل عملية
+BASE_MEMO_SIZE = 256
+
+_bases: 'OrderedDict[int, List[Dict[str, Any]]]' = OrderedDict()
+_bases_lock = threading.Lock()
+
+
+def compact(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{k: v for k, v in q.items() if k not in DISPLAY_KEYS} for q in questions]
+
+
+def rehydrate(corpus: QuranCorpus, questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    عكس compact: نص العبارة ومواضعها لأسئلة المتشابهات، ونص الآية لأسئلة
+    الموقع. مواضع العبارة في النطاق هي مواضعها في آيات occurrence_ayah_ids،
+    فتكفي هذه الآيات نطاقاً لـ QuestionMaterializer.
+    """
+    phrase_ids = [q['phrase_id'] for q in questions if 'phrase_id' in q]
+    literal: Dict[int, list] = {}
+    if phrase_ids:
+        idxs = {corpus.index_of(a) for q in questions for a in q.get('occurrence_ayah_ids') or ()}
+        idxs.discard(None)
+        literal = QuestionMaterializer(corpus, sorted(idxs)).literal_ayahs(phrase_ids)
+    out = []
+    for q in questions:
+        q = dict(q)
+        if 'phrase_id' in q:
+            phrase = corpus.phrase(q['phrase_id'])
+            q['phrase_text'] = phrase.text if phrase else ''
+            q['literal_ayahs'] = literal.get(q['phrase_id'], [])
+        elif 'ayah_id' in q:
+            idx = corpus.index_of(q['ayah_id'])
+            q['ayah_text'] = corpus.texts[idx] if idx is not None else ''
+        out.append(q)
+    return out
+
+
+def deltas(base: List[Dict[str, Any]], questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """ما أُضيف أو تغيّر في كل سؤال عن نسخته المولَّدة"""
+    return [{k: v for k, v in q.items() if k not in b or b[k] != v} for b, q in zip(base, questions)]
+
+
+def apply_deltas(base: List[Dict[str, Any]], changes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """عكس deltas على نسخة مستقلة من الأسئلة المولَّدة (الواجهات تعدّل الأسئلة في مكانها)"""
+    out = copy.deepcopy(base)
+    for q, change in zip(out, changes):
+        q.update(change)
+    return out
+
+
+class TestRunStore:
+    """واجهة الواجهات لأسئلة الاختبار الجاري: start / questions / save"""
+
+    def __init__(self, request, corpus: Optional[QuranCorpus] = None):
+        self.session = request.session
+        self._corpus = corpus
+        self._questions: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def corpus(self) -> QuranCorpus:
+        if self._corpus is None:
+            self._corpus = get_corpus()
+        return self._corpus
+
+    def start(self, questions: List[Dict[str, Any]], test_session=None):
+        """
+        الأسئلة المولَّدة للتو؛ لو للجلسة بذرة تُحفظ كأساس في الذاكرة والصف
+        يحمل تغييرات فارغة
+        """
+        from core.models import TestRun
+
+        previous = self._journal()
+        if previous and (test_session is None or previous.test_session_id != test_session.id):
+            # اختبار سابق متروك في هذا السيشن: إجاباته بعد آخر نقطة حفظ تُكتب الآن
+            previous.flush()
+        seeded = test_session is not None and test_session.generation_seed is not None
+        payload = self._dump_deltas([{} for _ in questions]) if seeded else self._dump(questions)
+        run = TestRun.objects.create(test_session=test_session, questions=payload)
+        if seeded:
+            self._remember(run.id, copy.deepcopy(questions))
+        self.session[SESSION_KEY] = run.id
+        self.session.pop('questions', None)
+        self._questions = questions
+        return run
+
+    def questions(self) -> List[Dict[str, Any]]:
+        if self._questions is None:
+            from core.models import TestRun
+
+            run_id = self.session.get(SESSION_KEY)
+            if run_id is None:
+                # اختبار بدأ قبل المخزن: الأسئلة ما زالت في السيشن
+                return self.session.get('questions', [])
+            journal = self._journal()
+            state = journal.latest_state() if journal else None
+            if state is None:
+                raw = TestRun.objects.filter(id=run_id).values_list('questions', flat=True).first()
+                state = json.loads(raw) if raw else []
+            if isinstance(state, dict):
+                base = self._base(run_id)
+                if base is None:
+                    # لا بذرة ولا نسخة محفوظة (لا يحدث لاختبار بدأ بـ start)
+                    raise ValueError(f"TestRun {run_id} questions cannot be rebuilt")
+                self._questions = apply_deltas(base, state['deltas'])
+            else:
+                self._questions = rehydrate(self.corpus, state)
+        return self._questions
+
+    def save(self, questions: List[Dict[str, Any]]) -> None:
+        from core.models import TestRun
+
+        run_id = self.session.get(SESSION_KEY)
+        if run_id is None:
+            self.start(questions)
+            return
+        base = self._base(run_id)
+        if base is not None:
+            state = {'deltas': deltas(base, questions)}
+        else:
+            state = compact(questions)
+        journal = self._journal()
+        if journal:
+            journal.record_state(state)
+        else:
+            TestRun.objects.filter(id=run_id).update(questions=self._dumps(state))
+        self._questions = questions
+
+    def _base(self, run_id: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        أسئلة اختبار ذي بذرة كما وُلِّدت: من ذاكرة العملية، أو بإعادة التوليد
+        من جلسته، أو من صفوف أسئلتها لو تغيّر إصدار اللقطة. None لو
+        الاختبار بلا بذرة.
+        """
+        with _bases_lock:
+            base = _bases.get(run_id)
+            if base is not None:
+                _bases.move_to_end(run_id)
+                return base
+
+        from core.models import TestSession
+        from tests_app.services.test_service import questions_from_rows, regenerate_questions
+
+        session = TestSession.objects.filter(run__id=run_id, generation_seed__isnull=False).first()
+        if session is None:
+            return None
+        base = regenerate_questions(session, self.corpus)
+        if base is None:
+            base = questions_from_rows(session, self.corpus)
+            if base is None:
+                return None
+        self._remember(run_id, base)
+        return base
+
+    @staticmethod
+    def _remember(run_id: int, base: List[Dict[str, Any]]) -> None:
+        with _bases_lock:
+            _bases[run_id] = base
+            _bases.move_to_end(run_id)
+            while len(_bases) > BASE_MEMO_SIZE:
+                _bases.popitem(last=False)
+
+    def _journal(self):
+        from core.services.answer_journal import AnswerJournal
+
+        db_session_id = self.session.get('db_session_id')
+        return AnswerJournal(db_session_id) if db_session_id else None
+
+    @classmethod
+    def _dump(cls, questions: List[Dict[str, Any]]) -> str:
+        return cls._dumps(compact(questions))
+
+    @classmethod
+    def _dump_deltas(cls, changes: List[Dict[str, Any]]) -> str:
+        return cls._dumps({'deltas': changes})
+
+    @staticmethod
+    def _dumps(state) -> str:
+        return json.dumps(state, ensure_ascii=False, separators=(',', ':'))
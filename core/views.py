@@ -4,7 +4,7 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.db import IntegrityError
-from django.db.models import Count, Sum, Q, Exists, OuterRef
+from django.db.models import Count, Sum, Q
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.password_validation import validate_password
@@ -13,12 +13,21 @@ from django.urls import reverse
 from django.http import JsonResponse, FileResponse, Http404
 from django.conf import settings
 import sys
-import os, math, random, re, unicodedata
+import os, math, random, re
 from django.views.decorators.http import require_POST
 from .forms import ProfileUpdateForm, PasswordChangeForm
 from .models import Student, Complaint, Juz, Quarter, SimilarityGroup, Ayah, Phrase, PhraseOccurrence, TestSession, TestQuestion, Page
 from django.contrib.auth import get_user_model
 from django.test import TestCase
+from core.normalization import normalize as norm
+from core.services.answer_journal import AnswerJournal
+from core.services.corpus_service import get_corpus
+from core.services.global_counters import get_global_counters
+from core.services.scope_metadata import get_scope_metadata
+from core.services.test_run_store import TestRunStore
+from tests_app.similar_count import views as similar_count_views
+from tests_app.similar_positions_on_pages import views as similar_positions_on_pages_views
+from tests_app.verse_location_quarters import views as verse_location_quarters_views
 from core.services.grading_service import (
     GradingService,
     PAGES_BONUS_ORDER,
@@ -54,6 +63,15 @@ def print(*args, sep=" ", end="\n", file=None, flush=False):
 
 
 
+# واجهة بدء كل نوع اختبار (start_test يحوّل لها)؛ مسار similar-on-pages/ هو
+# تطبيق similar_positions_on_pages
+START_VIEWS={
+    'similar_count':similar_count_views.start,
+    'similar_on_pages':similar_positions_on_pages_views.start,
+    'similar_positions_on_pages':similar_positions_on_pages_views.start,
+    'verse_location_quarters':verse_location_quarters_views.start,
+}
+
 AR_ORD={1:"الأول",2:"الثاني",3:"الثالث",4:"الرابع",5:"الخامس",6:"السادس",7:"السابع",8:"الثامن",9:"التاسع",10:"العاشر"}
 def ar_ordinal(n:int)->str: return f"{AR_ORD.get(n,n)}"
 
@@ -71,26 +89,16 @@ def _grade_mark_order(request):
     return GradingService(request).mark_order()
 
 def _current_question_and_flow(request):
-    qs=request.session.get('questions') or []; flow=request.session.get('pages_flow') or {}; q_index=flow.get('q_index')
+    qs=TestRunStore(request).questions(); flow=request.session.get('pages_flow') or {}; q_index=flow.get('q_index')
     if q_index is None or not (0<=q_index<len(qs)): return None,flow
     return qs[q_index],flow
 
 def _feedback(kind:str,text:str): return {"kind":kind,"level":kind,"text":text,"message":text}
 
 def _allowed_juz_numbers_for_scope(request):
-    sel_quarters=request.session.get('selected_quarters') or []; sel_juz=request.session.get('selected_juz') or []
-    quarters_with_pages=Quarter.objects.filter(id=OuterRef('id'),ayah__page__isnull=False)
-    qs=Quarter.objects.all().annotate(has_pages=Exists(quarters_with_pages)).filter(has_pages=True)
-    if sel_quarters: qs=qs.filter(id__in=sel_quarters)
-    elif sel_juz:
-        try: sel_juz=[int(j) for j in sel_juz]
-        except Exception: sel_juz=[]
-        if sel_juz: qs=qs.filter(juz__number__in=sel_juz)
-    allowed=sorted(set(qs.values_list('juz__number',flat=True)))
-    if not allowed:
-        qs_any=Quarter.objects.annotate(has_pages=Exists(Quarter.objects.filter(id=OuterRef('id'),ayah__page__isnull=False))).filter(has_pages=True)
-        allowed=sorted(set(qs_any.values_list('juz__number',flat=True)))
-    return allowed
+    return get_scope_metadata().allowed_juz_numbers(
+        request.session.get('selected_juz') or [], request.session.get('selected_quarters') or []
+    )
 
 def _ctx_common(request, extra=None, feedback=None, delta=None):
     extra = extra or {}
@@ -125,16 +133,6 @@ def _ctx_common(request, extra=None, feedback=None, delta=None):
 
 
 
-DIAC=re.compile(r'[\u064B-\u0652\u0670\u06DF-\u06ED]')
-def norm(txt:str)->str:
-    txt=unicodedata.normalize('NFKD',txt)
-    # حافظ على الألف الخنجرية بتحويلها إلى ألف عادية قبل إزالة التشكيل
-    # U+0670 ARABIC LETTER SUPERSCRIPT ALEF (dagger alef)
-    txt=txt.replace('\u0670','ا')
-    txt=DIAC.sub('',txt)
-    txt=txt.replace('إ','ا').replace('أ','ا').replace('آ','ا'); txt=txt.replace('ة','ه').replace('ى','ي')
-    txt=re.sub(r'[^\w\s]','',txt); return txt
-
 WORD_ALIASES={'تكن':r'تكون(?:ن|نَّ)?','قول':r'قول(?:وا)?','تلبسون':r'تلبسون?|تلبسوا(?:ن)?'}
 def flex_regex(word_list):
     parts=[];
@@ -187,53 +185,18 @@ def _score_formula(exams,correct,wrong,unanswered):
 
 def _debug_leaderboard_data():
     """
-    دالة تشخيص لفحص بيانات الليدر بورد
+    دالة تشخيص لفحص بيانات الليدر بورد (من عدّادات المنصة المخزنة في الكاش)
     """
     try:
-        # فحص جلسات الاختبار
-        total_sessions = TestSession.objects.count()
-        completed_sessions = TestSession.objects.filter(completed=True).count()
-        incomplete_sessions = TestSession.objects.filter(completed=False).count()
-        
-        # فحص الأسئلة
-        total_questions = TestQuestion.objects.count()
-        answered_questions = TestQuestion.objects.exclude(student_response='').exclude(student_response__isnull=True).count()
-        correct_questions = TestQuestion.objects.filter(is_correct=True).count()
-        wrong_questions = TestQuestion.objects.filter(is_correct=False).count()
-        
-        # فحص الأسئلة من الجلسات المكتملة فقط
-        completed_session_questions = TestQuestion.objects.filter(session__completed=True).count()
-        completed_session_answered = TestQuestion.objects.filter(
-            session__completed=True
-        ).exclude(student_response='').exclude(student_response__isnull=True).count()
-        completed_session_correct = TestQuestion.objects.filter(
-            session__completed=True, is_correct=True
-        ).exclude(student_response='').exclude(student_response__isnull=True).count()
-        completed_session_wrong = TestQuestion.objects.filter(
-            session__completed=True, is_correct=False
-        ).exclude(student_response='').exclude(student_response__isnull=True).count()
-        
-        # فحص الطلاب
-        total_students = Student.objects.count()
-        students_with_sessions = TestSession.objects.values('student').distinct().count()
-        students_with_completed_sessions = TestSession.objects.filter(completed=True).values('student').distinct().count()
-        
-        debug_info = {
-            'total_sessions': total_sessions,
-            'completed_sessions': completed_sessions,
-            'incomplete_sessions': incomplete_sessions,
-            'total_questions': total_questions,
-            'answered_questions': answered_questions,
-            'correct_questions': correct_questions,
-            'wrong_questions': wrong_questions,
-            'completed_session_questions': completed_session_questions,
-            'completed_session_answered': completed_session_answered,
-            'completed_session_correct': completed_session_correct,
-            'completed_session_wrong': completed_session_wrong,
-            'total_students': total_students,
-            'students_with_sessions': students_with_sessions,
-            'students_with_completed_sessions': students_with_completed_sessions,
-        }
+        counters = get_global_counters(include_raw=True)
+        keys = (
+            'total_sessions', 'completed_sessions', 'incomplete_sessions',
+            'total_questions', 'answered_questions', 'correct_questions', 'wrong_questions',
+            'completed_session_questions', 'completed_session_answered',
+            'completed_session_correct', 'completed_session_wrong',
+            'total_students', 'students_with_sessions', 'students_with_completed_sessions',
+        )
+        debug_info = {key: counters[key] for key in keys}
         
         print("=== معلومات تشخيص الليدر بورد ===")
         for key, value in debug_info.items():
@@ -246,205 +209,6 @@ def _debug_leaderboard_data():
         print(f"خطأ في التشخيص: {e}")
         return {}
 
-def _leaderboard():
-    """
-    دالة حساب الليدر بورد - تحسب إحصائيات الطلاب وترتبهم
-    """
-    try:
-        # تشخيص البيانات أولاً
-        debug_info = _debug_leaderboard_data()
-        
-        # تشخيص إضافي للطلاب الفرديين
-        print("\n=== تشخيص الطلاب الفرديين ===")
-        for student in Student.objects.all():
-            sessions = TestSession.objects.filter(student=student, completed=True)
-            questions = TestQuestion.objects.filter(session__in=sessions)
-            answered_questions = questions.exclude(student_response='').exclude(student_response__isnull=True)
-            correct_questions = answered_questions.filter(is_correct=True)
-            wrong_questions = answered_questions.filter(is_correct=False)
-            
-            print(f"طالب {student.display_name} (ID: {student.id}):")
-            print(f"  - جلسات مكتملة: {sessions.count()}")
-            print(f"  - أسئلة إجمالي: {questions.count()}")
-            print(f"  - أسئلة مجاب عليها: {answered_questions.count()}")
-            print(f"  - أسئلة صحيحة: {correct_questions.count()}")
-            print(f"  - أسئلة خاطئة: {wrong_questions.count()}")
-        print("================================\n")
-        
-        # الحصول على جميع جلسات الاختبار المكتملة
-        # نستخدم distinct=True لتجنب تكرار العد
-        sess = TestSession.objects.filter(completed=True).values('student').annotate(
-            exams=Count('id', distinct=True),
-            total_q=Sum('num_questions')
-        )
-        
-        print(f"عدد الطلاب الذين لديهم جلسات مكتملة: {len(sess)}")
-        
-        # الحصول على جميع الأسئلة المجاب عليها من الجلسات المكتملة
-        # نستخدم distinct=True لتجنب تكرار العد
-        # نأخذ فقط الأسئلة التي لها إجابة فعلية
-        ans = TestQuestion.objects.filter(
-            session__completed=True
-        ).exclude(
-            student_response=''
-        ).exclude(
-            student_response__isnull=True
-        ).values('session__student').annotate(
-            answered=Count('id', distinct=True),
-            correct=Count('id', filter=Q(is_correct=True), distinct=True),
-            wrong=Count('id', filter=Q(is_correct=False), distinct=True)
-        )
-        
-        print(f"عدد الطلاب الذين لديهم أسئلة مجاب عليها: {len(ans)}")
-        
-        by_student = {}
-        
-        # تهيئة البيانات لكل طالب
-        for r in sess:
-            sid = r['student']
-            exams_count = r.get('exams', 0) or 0
-            total_questions = r.get('total_q', 0) or 0
-            
-            # تأكد من أن القيم صحيحة
-            if exams_count < 0:
-                exams_count = 0
-            if total_questions < 0:
-                total_questions = 0
-            
-            print(f"طالب {sid}: امتحانات={exams_count}, أسئلة={total_questions}")
-                
-            by_student[sid] = {
-                'student_id': sid,
-                'exams': exams_count,
-                'total_q': total_questions,
-                'answered': 0,
-                'correct': 0,
-                'wrong': 0
-            }
-        
-        # إضافة بيانات الإجابات
-        for r in ans:
-            sid = r['session__student']
-            row = by_student.setdefault(sid, {
-                'student_id': sid,
-                'exams': 0,
-                'total_q': 0,
-                'answered': 0,
-                'correct': 0,
-                'wrong': 0
-            })
-            
-            answered_count = r.get('answered', 0) or 0
-            correct_count = r.get('correct', 0) or 0
-            wrong_count = r.get('wrong', 0) or 0
-            
-            # تأكد من أن القيم صحيحة
-            if answered_count < 0:
-                answered_count = 0
-            if correct_count < 0:
-                correct_count = 0
-            if wrong_count < 0:
-                wrong_count = 0
-            
-            print(f"طالب {sid}: إجابات={answered_count}, صحيح={correct_count}, خطأ={wrong_count}")
-                
-            row['answered'] = (row['answered'] or 0) + answered_count
-            row['correct'] = (row['correct'] or 0) + correct_count
-            row['wrong'] = (row['wrong'] or 0) + wrong_count
-        
-        if not by_student:
-            return []
-        
-        # الحصول على بيانات الطلاب
-        sids = list(by_student.keys())
-        students = Student.objects.select_related('user').filter(id__in=sids)
-        stu_map = {s.id: s for s in students}
-        
-        rows = []
-        for sid, r in by_student.items():
-            s = stu_map.get(sid)
-            if not s:
-                continue
-                
-            exams = r['exams'] or 0
-            # إزالة هذا الشرط للسماح بعرض جميع الطلاب حتى لو كان لديهم 0 امتحانات
-            # if exams <= 0:
-            #     continue
-                
-            correct = r['correct'] or 0
-            wrong = r['wrong'] or 0
-            answered = r['answered'] or 0
-            total_q = r['total_q'] or 0
-            unanswered = max(0, total_q - answered)
-            
-            print(f"إضافة طالب {s.display_name}: امتحانات={exams}, صحيح={correct}, خطأ={wrong}, إجابات={answered}")
-            
-            # حساب الدقة - فقط من الأسئلة المجاب عليها
-            answered_questions = correct + wrong
-            if answered_questions > 0:
-                accuracy = correct / answered_questions
-            else:
-                accuracy = None
-            
-            # حساب النقاط
-            if accuracy is not None:
-                score = (800.0 * accuracy) + (200.0 * math.log10(1 + correct)) + (100.0 * math.log10(1 + exams)) - (5.0 * unanswered)
-                score = int(round(max(0, score)))
-            else:
-                score = 0
-            
-            # استخراج الاسم الأول فقط
-            full_name = s.display_name or s.user.username
-            first_name = full_name.split()[0] if full_name else s.user.username
-            
-            rows.append({
-                'student_id': sid,
-                'display_name': first_name,
-                'avatar': s.avatar.url if getattr(s, 'avatar', None) else '',
-                'skin': s.skin or 'default',
-                'exams': exams,
-                'correct': correct,
-                'wrong': wrong,
-                'unanswered': unanswered,
-                'accuracy': accuracy,
-                'accuracy_pct': (round(accuracy * 100, 2) if accuracy is not None else None),
-                'score': score
-            })
-        
-        # ترتيب بناءً على الدقة أولاً، ثم عدد الإجابات الصحيحة
-        rows.sort(key=lambda x: (
-            -(x['accuracy'] or 0),  # الدقة الأعلى أولاً
-            -x['correct'],          # ثم عدد الإجابات الصحيحة
-            -x['score'],            # ثم النقاط
-            x['display_name']       # وأخيراً الاسم
-        ))
-        
-        # حساب الترتيب مع معالجة التعادل
-        current_rank = 1
-        for i, r in enumerate(rows):
-            if i == 0:
-                r['rank'] = current_rank
-            else:
-                prev_row = rows[i-1]
-                # تغيير الترتيب فقط إذا تغيرت الدقة أو عدد الإجابات الصحيحة
-                if (r['accuracy'] != prev_row['accuracy'] or 
-                    r['correct'] != prev_row['correct']):
-                    current_rank = i + 1
-                r['rank'] = current_rank
-        
-        print(f"عدد الصفوف النهائية في الليدر بورد: {len(rows)}")
-        if rows:
-            print(f"أول طالب: {rows[0]['display_name']} - امتحانات: {rows[0]['exams']}")
-            print(f"آخر طالب: {rows[-1]['display_name']} - امتحانات: {rows[-1]['exams']}")
-        
-        return rows
-        
-    except Exception as e:
-        # في حالة حدوث خطأ، نعيد قائمة فارغة
-        print(f"خطأ في حساب الليدر بورد: {e}")
-        return []
-
-
 def test_catalog(request):
     tests=[
         {"key":"similar_count","title":" عدد مواضع المتشابهات","desc":"يعرض عبارة ويطلب عدد مواضعها الصحيحة في نطاقك.","available":True,"url":reverse("tests:similar_count:selection")},
@@ -483,520 +247,23 @@ def test_selection(request):
         
         request.session.update(session_data)
         request.session.pop('scope_label',None); return redirect('core:start_test')
-    juz_list=Juz.objects.all().order_by('number'); juz_quarters_map={}
-    for j in juz_list:
-        qs=list(Quarter.objects.filter(juz=j).order_by('index_in_juz')); first_label=qs[0].label if qs else ''
-        juz_quarters_map[j]={'quarters':qs,'first_label':first_label}
+    juz_quarters_map=get_scope_metadata().juz_quarters_map
     return render(request,'core/test_selection.html',{'student':student,'juz_quarters_map':juz_quarters_map,'num_questions_options':[5,10,15,20],'show_splash':True,'hide_footer':False,'selected_test_type':request.session.get('selected_test_type','similar_count')})
 
-def create_verse_location_questions(ayat_qs, desired_count, difficulty):
-    """
-    إنشاء أسئلة موقع الآية في الربع والصفحة
-    """
-    import random
-    import math
-    
-    # الحصول على الآيات مع معلومات الربع والصفحة
-    print(f"🔍 بداية إنشاء أسئلة موقع الآية...")
-    print(f"   - عدد الآيات المتاحة: {ayat_qs.count()}")
-    
-    # الحصول على الآيات مع معلومات الربع والصفحة
-    ayat_with_info = ayat_qs.select_related('quarter', 'page').values(
-        'id', 'text', 'surah', 'number', 'quarter__index_in_juz', 
-        'quarter__juz__number', 'page__number'
-    )
-    
-    # حساب رقم الربع الإجمالي في القرآن كله
-    for ayah in ayat_with_info:
-        juz_number = ayah['quarter__juz__number']
-        quarter_in_juz = ayah['quarter__index_in_juz']
-        # الربع الإجمالي = (رقم الجزء - 1) * 4 + رقم الربع في الجزء
-        total_quarter_number = (juz_number - 1) * 4 + quarter_in_juz
-        ayah['total_quarter_number'] = total_quarter_number
-        # إضافة معلومات إضافية للتصحيح
-        ayah['juz_number'] = juz_number
-        ayah['quarter_in_juz'] = quarter_in_juz
-    
-    # عرض عينة من الآيات للتحقق
-    sample_ayat = list(ayat_with_info[:3])
-    print(f"   - عينة من الآيات:")
-    for ayah in sample_ayat:
-        print(f"     * ID: {ayah['id']}, سورة: {ayah['surah']}, آية: {ayah['number']}")
-        print(f"       الربع في الجزء: {ayah['quarter__index_in_juz']}, الجزء: {ayah['quarter__juz__number']}")
-        print(f"       الربع الإجمالي: {ayah['total_quarter_number']}")
-        print(f"       النص: {ayah['text'][:30]}...")
-        # إضافة معلومات تشخيصية إضافية
-        juz_num = ayah['quarter__juz__number']
-        quarter_in_juz = ayah['quarter__index_in_juz']
-        calculated_total = (juz_num - 1) * 8 + quarter_in_juz
-        print(f"       التحقق: (الجزء {juz_num} - 1) × 8 + الربع {quarter_in_juz} = {calculated_total}")
-        if calculated_total != ayah['total_quarter_number']:
-            print(f"       ⚠️ خطأ في الحساب! المتوقع: {calculated_total}, المحسوب: {ayah['total_quarter_number']}")
-        print()
-    
-    # تصفية الآيات - استبعاد آيات بداية الأرباع وسورة الفاتحة كاملة
-    filtered_ayat = []
-    for ayah in ayat_with_info:
-        # استبعاد الآية الأولى من كل ربع (آية بداية الربع)
-        if ayah['quarter__index_in_juz'] == 1 and ayah['number'] == 1:
-            continue
-        # استبعاد سورة الفاتحة كاملة
-        if ayah['surah'] == 1:
-            continue
-        filtered_ayat.append(ayah)
-    
-    if len(filtered_ayat) < desired_count:
-        return []
-    
-    # تصنيف الآيات حسب الصعوبة (طول الآية)
-    def get_difficulty(ayah_text):
-        word_count = len(ayah_text.split())
-        if word_count <= 3:
-            return 'hard'
-        elif word_count <= 6:
-            return 'medium'
-        else:
-            return 'easy'
-    
-    # تصنيف الآيات
-    easy_ayat = []
-    medium_ayat = []
-    hard_ayat = []
-    
-    for ayah in filtered_ayat:
-        diff = get_difficulty(ayah['text'])
-        if diff == 'easy':
-            easy_ayat.append(ayah)
-        elif diff == 'medium':
-            medium_ayat.append(ayah)
-        else:
-            hard_ayat.append(ayah)
-    
-    # اختيار الآيات حسب مستوى الصعوبة
-    selected_ayat = []
-    
-    if difficulty == 'mixed':
-        # توزيع متوازن
-        ne = max(0, round(desired_count * 0.4))  # 40% سهل
-        nm = max(0, round(desired_count * 0.45))  # 45% متوسط
-        nh = max(0, desired_count - ne - nm)      # الباقي صعب
-        
-        selected_ayat.extend(random.sample(easy_ayat, min(ne, len(easy_ayat))))
-        selected_ayat.extend(random.sample(medium_ayat, min(nm, len(medium_ayat))))
-        selected_ayat.extend(random.sample(hard_ayat, min(nh, len(hard_ayat))))
-        
-        # إكمال العدد المطلوب من أي فئة متاحة
-        remaining = desired_count - len(selected_ayat)
-        if remaining > 0:
-            all_available = easy_ayat + medium_ayat + hard_ayat
-            additional = random.sample(all_available, min(remaining, len(all_available)))
-            selected_ayat.extend(additional)
-    
-    else:
-        # اختيار من مستوى واحد
-        if difficulty == 'easy':
-            pool = easy_ayat
-        elif difficulty == 'medium':
-            pool = medium_ayat
-        else:  # hard
-            pool = hard_ayat
-        
-        if len(pool) < desired_count:
-            return []
-        
-        selected_ayat = random.sample(pool, desired_count)
-    
-    # إنشاء الأسئلة
-    questions = []
-    for ayah in selected_ayat:
-        # حساب موقع الآية في الربع
-        current_quarter = ayah['total_quarter_number']  # استخدام الربع الإجمالي
-        current_page = ayah['page__number']
-        
-        # التأكد من أن الربع موجود
-        if current_quarter is None:
-            print(f"⚠️ تحذير: الآية {ayah['id']} (سورة {ayah['surah']}:{ayah['number']}) لا تحتوي على معلومات الربع")
-            continue
-        
-        print(f"🔍 الآية: {ayah['text'][:50]}...")
-        print(f"   - الربع الإجمالي: {current_quarter}")
-        print(f"   - الصفحة: {current_page}")
-        
-        # حساب الصفحة داخل الربع
-        # نحتاج للحصول على صفحة بداية الربع
-        current_juz = ayah['juz_number']
-        current_quarter_in_juz = ayah['quarter_in_juz']
-        
-        # البحث عن صفحة بداية الربع
-        quarter_start_page = None
-        try:
-            # البحث عن أول آية في الربع
-            quarter_start_ayah = Ayah.objects.filter(
-                quarter__juz__number=current_juz,
-                quarter__index_in_juz=current_quarter_in_juz
-            ).order_by('surah', 'number').first()
-            
-            if quarter_start_ayah and quarter_start_ayah.page:
-                quarter_start_page = quarter_start_ayah.page.number
-                print(f"   📖 صفحة بداية الربع: {quarter_start_page}")
-            else:
-                print(f"   ⚠️ تحذير: لا يمكن العثور على صفحة بداية الربع")
-                continue
-                
-        except Exception as e:
-            print(f"   ⚠️ خطأ في البحث عن صفحة بداية الربع: {e}")
-            continue
-        
-        # حساب الصفحة داخل الربع
-        if quarter_start_page and current_page:
-            page_difference = current_page - quarter_start_page
-            if page_difference == 0:
-                correct_page_in_quarter = 1  # الصفحة الأولى
-            elif page_difference == 1:
-                correct_page_in_quarter = 2  # الصفحة الثانية
-            elif page_difference == 2:
-                correct_page_in_quarter = 3  # الصفحة الثالثة
-            elif page_difference == 3:
-                correct_page_in_quarter = 4  # الصفحة الرابعة
-            elif page_difference > 3:
-                # إذا كانت الفجوة أكبر من 3 صفحات، نحسب الصفحة بناءً على الفجوة
-                # نعتبر أن كل 4 صفحات = ربع جديد
-                if page_difference <= 7:
-                    correct_page_in_quarter = 1  # الصفحة الأولى من الربع التالي
-                elif page_difference <= 11:
-                    correct_page_in_quarter = 2  # الصفحة الثانية من الربع التالي
-                elif page_difference <= 15:
-                    correct_page_in_quarter = 3  # الصفحة الثالثة من الربع التالي
-                else:
-                    correct_page_in_quarter = 4  # الصفحة الرابعة من الربع التالي
-                print(f"   📄 فجوة كبيرة ({page_difference} صفحات)، تم حساب الصفحة: {correct_page_in_quarter}")
-            else:
-                # إذا كانت الفجوة سالبة (الصفحة قبل بداية الربع)، نعتبرها الصفحة الأولى
-                correct_page_in_quarter = 1
-                print(f"   ⚠️ تحذير: الصفحة قبل بداية الربع ({page_difference})، تم تعيينها كصفحة أولى")
-        else:
-            # إذا لم نتمكن من الحساب، نستخدم الصفحة الأولى كافتراضي
-            correct_page_in_quarter = 1
-            print(f"   ⚠️ تحذير: تم استخدام الصفحة الأولى كافتراضي")
-        
-        print(f"   📄 الصفحة في الربع: {correct_page_in_quarter}")
-        
-        # إنشاء خيارات للأرباع المحيطة بالربع الصحيح
-        quarter_options = []
-        
-        # إضافة الربع الصحيح أولاً
-        quarter_options.append(current_quarter)
-        print(f"   ✅ الربع الصحيح: {current_quarter} (الجزء {ayah['juz_number']}, الربع {ayah['quarter_in_juz']})")
-        
-        # إضافة أرباع من نفس الجزء أولاً (أكثر منطقية)
-        current_juz = ayah['juz_number']
-        current_quarter_in_juz = ayah['quarter_in_juz']
-        
-        # إضافة ربع سابق من نفس الجزء
-        if current_quarter_in_juz > 1:
-            prev_quarter_in_juz = current_quarter_in_juz - 1
-            prev_total_quarter = (current_juz - 1) * 4 + prev_quarter_in_juz
-            quarter_options.append(prev_total_quarter)
-            print(f"   ➕ ربع سابق من نفس الجزء: {prev_total_quarter} (الجزء {current_juz}, الربع {prev_quarter_in_juz})")
-        
-        # إضافة ربع لاحق من نفس الجزء
-        if current_quarter_in_juz < 4:
-            next_quarter_in_juz = current_quarter_in_juz + 1
-            next_total_quarter = (current_juz - 1) * 4 + next_quarter_in_juz
-            quarter_options.append(next_total_quarter)
-            print(f"   ➕ ربع لاحق من نفس الجزء: {next_total_quarter} (الجزء {current_juz}, الربع {next_quarter_in_juz})")
-        
-        # إضافة أرباع إضافية إذا لم نصل لـ 4 خيارات
-        while len(quarter_options) < 4:
-            # محاولة إضافة ربع من جزء مجاور (أقرب)
-            if current_juz > 1 and len(quarter_options) < 4:
-                # ربع من الجزء السابق (نفس رقم الربع)
-                prev_juz_quarter = (current_juz - 2) * 4 + current_quarter_in_juz
-                if prev_juz_quarter > 0 and prev_juz_quarter not in quarter_options:
-                    quarter_options.append(prev_juz_quarter)
-                    print(f"   ➕ ربع من جزء سابق: {prev_juz_quarter} (الجزء {current_juz - 1}, الربع {current_quarter_in_juz})")
-                    continue
-            
-            if current_juz < 30 and len(quarter_options) < 4:
-                # ربع من الجزء التالي (نفس رقم الربع)
-                next_juz_quarter = current_juz * 4 + current_quarter_in_juz
-                if next_juz_quarter <= 120 and next_juz_quarter not in quarter_options:
-                    quarter_options.append(next_juz_quarter)
-                    print(f"   ➕ ربع من جزء تالي: {next_juz_quarter} (الجزء {current_juz + 1}, الربع {current_quarter_in_juz})")
-                    continue
-            
-            # محاولة إضافة أرباع من نفس الجزء مع فجوات صغيرة
-            if current_quarter_in_juz > 2 and len(quarter_options) < 4:
-                far_prev_quarter = (current_juz - 1) * 4 + (current_quarter_in_juz - 2)
-                if far_prev_quarter > 0 and far_prev_quarter not in quarter_options:
-                    quarter_options.append(far_prev_quarter)
-                    print(f"   ➕ ربع بعيد سابق من نفس الجزء: {far_prev_quarter} (الجزء {current_juz}, الربع {current_quarter_in_juz - 2})")
-                    continue
-            
-            if current_quarter_in_juz < 3 and len(quarter_options) < 4:
-                far_next_quarter = (current_juz - 1) * 4 + (current_quarter_in_juz + 2)
-                if far_next_quarter <= 120 and far_next_quarter not in quarter_options:
-                    quarter_options.append(far_next_quarter)
-                    print(f"   ➕ ربع بعيد لاحق من نفس الجزء: {far_next_quarter} (الجزء {current_juz}, الربع {current_quarter_in_juz + 2})")
-                    continue
-            
-            # إذا لم نتمكن من إضافة أرباع منطقية، نضيف أرباع قريبة
-            if len(quarter_options) < 4:
-                # إضافة ربع من جزء مجاور مع رقم ربع مختلف
-                if current_juz > 1:
-                    for offset in [-1, 1]:  # ربع سابق أو لاحق
-                        if current_quarter_in_juz + offset >= 1 and current_quarter_in_juz + offset <= 4:
-                            adj_quarter = (current_juz - 2) * 4 + (current_quarter_in_juz + offset)
-                            if adj_quarter > 0 and adj_quarter not in quarter_options:
-                                quarter_options.append(adj_quarter)
-                                print(f"   ➕ ربع مجاور: {adj_quarter} (الجزء {current_juz - 1}, الربع {current_quarter_in_juz + offset})")
-                                break
-                
-                if len(quarter_options) < 4 and current_juz < 30:
-                    for offset in [-1, 1]:  # ربع سابق أو لاحق
-                        if current_quarter_in_juz + offset >= 1 and current_quarter_in_juz + offset <= 4:
-                            adj_quarter = current_juz * 4 + (current_quarter_in_juz + offset)
-                            if adj_quarter <= 120 and adj_quarter not in quarter_options:
-                                quarter_options.append(adj_quarter)
-                                print(f"   ➕ ربع مجاور: {adj_quarter} (الجزء {current_juz + 1}, الربع {current_quarter_in_juz + offset})")
-                                break
-            
-            # إذا لم نتمكن من إضافة أرباع منطقية، نضيف أي ربع متاح
-            if len(quarter_options) < 4:
-                for i in range(1, 121):
-                    if i not in quarter_options:
-                        quarter_options.append(i)
-                        print(f"   ➕ ربع متاح: {i}")
-                        break
-        
-        print(f"   📋 الخيارات النهائية: {quarter_options}")
-        
-        # ترتيب عشوائي لخيارات الأرباع
-        random.shuffle(quarter_options)
-        
-        # إضافة معلومات تشخيصية إضافية
-        print(f"   🔍 تحليل الخيارات:")
-        for i, quarter_num in enumerate(quarter_options, 1):
-            juz_num = ((quarter_num - 1) // 4) + 1
-            quarter_in_juz = ((quarter_num - 1) % 4) + 1
-            print(f"      {i}. الربع {quarter_num} = الجزء {juz_num}, الربع {quarter_in_juz}")
-        
-        # إنشاء خيارات للصفحات داخل الربع (الأولى، الثانية، الثالثة، الرابعة)
-        page_in_quarter_options = [1, 2, 3, 4]  # الصفحة الأولى، الثانية، الثالثة، الرابعة
-        
-        question = {
-            'ayah_id': ayah['id'],
-            'ayah_text': ayah['text'],
-            'correct_quarter': current_quarter,
-            'quarter_options': quarter_options,
-            'correct_page_in_quarter': correct_page_in_quarter,
-            'page_in_quarter_options': page_in_quarter_options,
-            'given_answer': None,
-            'question_type': 'verse_location_quarters',
-            'stage': 'combined_selection',  # المرحلة المشتركة: اختيار الربع والصفحة
-            # إضافة معلومات إضافية للتصحيح
-            'juz_number': ayah['juz_number'],
-            'quarter_in_juz': ayah['quarter_in_juz'],
-            'quarter_start_page': quarter_start_page,  # إضافة صفحة بداية الربع للتصحيح
-            'current_page': current_page  # إضافة الصفحة الحالية للتصحيح
-        }
-        questions.append(question)
-        print(f"   ✅ تم إنشاء السؤال بنجاح")
-        print(f"      - الآية: {ayah['text'][:50]}...")
-        print(f"      - الربع الصحيح: {current_quarter} (الجزء {ayah['juz_number']}, الربع {ayah['quarter_in_juz']})")
-        print(f"      - صفحة بداية الربع: {quarter_start_page}")
-        print(f"      - الصفحة الحالية: {current_page}")
-        print(f"      - الصفحة في الربع: {correct_page_in_quarter}")
-        print(f"      - الخيارات: {quarter_options}")
-        print()
-    
-    return questions[:desired_count]
-
 @login_required
 def start_test(request):
-    import math
+    """
+    البدء القديم بعد test_selection: النطاق في السيشن، والاختبار يبدأ من واجهة
+    start لنوعه في tests_app (مجمّع الأسئلة وبذرة التوليد والاختبار المولَّد مسبقاً)
+    """
     sid=request.session.get('student_id')
     if not sid: messages.warning(request,"الرجاء إدخال اسمك أولاً."); return redirect('core:login')
-    student=get_object_or_404(Student,id=sid)
-    juz_ids=request.session.get('selected_juz',[]); q_ids=request.session.get('selected_quarters',[])
-    desired=int(request.session.get('num_questions',5)); difficulty=request.session.get('difficulty','mixed')
-    if q_ids: ayat_qs=Ayah.objects.filter(quarter_id__in=q_ids)
-    elif juz_ids: ayat_qs=Ayah.objects.filter(quarter__juz__number__in=juz_ids)
-    else: messages.error(request,"مفيش نطاق محدد."); return redirect('core:test_selection')
-    if not ayat_qs.exists(): messages.error(request,"النطاق لا يحتوى آيات."); return redirect('core:test_selection')
-
-    ayat_ids=list(ayat_qs.values_list('id',flat=True)); MAX_OCC_SCOPE=60
-    
-    # إضافة معلومات تشخيصية
-    print(f"🔍 البحث عن العبارات المتشابهة:")
-    print(f"   - عدد الآيات في النطاق: {len(ayat_ids)}")
-    print(f"   - النطاق: {juz_ids if juz_ids else q_ids}")
-    print(f"   - أول 5 معرفات آيات: {ayat_ids[:5]}")
-    
-    # فحص التكرارات قبل التجميع
-    all_occ = PhraseOccurrence.objects.filter(ayah_id__in=ayat_ids)
-    print(f"   - إجمالي التكرارات في النطاق: {all_occ.count()}")
-    
-    stats=(PhraseOccurrence.objects.filter(ayah_id__in=ayat_ids).values('phrase_id')
-           .annotate(freq=Count('id')).filter(freq__gte=2,freq__lte=MAX_OCC_SCOPE))
-    
-    print(f"   - عدد العبارات المتشابهة الموجودة: {len(stats)}")
-    print(f"   - MAX_OCC_SCOPE: {MAX_OCC_SCOPE}")
-    
-    if not stats: 
-        # محاولة البحث مع معايير أقل صرامة
-        print("   ⚠️ لم يتم العثور على عبارات، جاري البحث بمعايير أقل صرامة...")
-        stats_loose=(PhraseOccurrence.objects.filter(ayah_id__in=ayat_ids).values('phrase_id')
-                    .annotate(freq=Count('id')).filter(freq__gte=2))
-        print(f"   - عدد العبارات مع معايير أقل صرامة: {len(stats_loose)}")
-        
-        if not stats_loose:
-            messages.error(request,"مافيش عبارات متشابهة كافية فى النطاق المحدد. جرب نطاق أوسع أو أجزاء مختلفة.")
-            return redirect('core:test_selection')
-        else:
-            stats = stats_loose
-
-    phrase_ids=[s['phrase_id'] for s in stats]; freq_map={s['phrase_id']:s['freq'] for s in stats}
-    
-    print(f"   - العبارات المختارة: {len(phrase_ids)}")
-    
-    occ_rows=PhraseOccurrence.objects.filter(ayah_id__in=ayat_ids,phrase_id__in=phrase_ids).values('phrase_id','ayah_id')
-    occ_by_phrase={};
-    for r in occ_rows: occ_by_phrase.setdefault(r['phrase_id'],set()).add(r['ayah_id'])
-    
-    phrases={p.id:p for p in Phrase.objects.filter(id__in=phrase_ids)}
-    sorted_pids=sorted(phrase_ids,key=lambda pid:(-phrases[pid].length_words,-freq_map[pid],phrases[pid].text))
-    
-    print(f"   - العبارات بعد الترتيب: {len(sorted_pids)}")
-    
-    kept,kept_sets=[],[];
-    for pid in sorted_pids:
-        aset=occ_by_phrase[pid]
-        if any(aset.issubset(S) for S in kept_sets): continue
-        kept.append(pid); kept_sets.append(aset)
-    
-    print(f"   - العبارات النهائية بعد إزالة التكرار: {len(kept)}")
-
-    def bucket(ph_len,freq):
-        if ph_len>=5 and 2<=freq<=3: return 'easy'
-        if ph_len>=4 and 2<=freq<=6: return 'medium'
-        if ph_len>=3 and 7<=freq<=60: return 'hard'
-        return 'other'
-
-    candidates=[]
-    for pid in kept:
-        ph=phrases[pid]; freq=freq_map[pid]; b=bucket(ph.length_words,freq)
-        if b=='other': continue
-        ayahs=(Ayah.objects.filter(id__in=occ_by_phrase[pid]).select_related('quarter__juz').order_by('surah','number'))
-        literal=[{'surah':a.surah,'surah_name':a.surah,'number':a.number,'juz_number':a.quarter.juz.number if a.quarter else None,'quarter_label':a.quarter.label if a.quarter else None,'text':a.text} for a in ayahs]
-        candidates.append({'phrase_id':pid,'phrase_text':ph.text,'correct_count':freq,'occurrence_ayah_ids':list(occ_by_phrase[pid]),'literal_ayahs':literal,'bucket':b,'score':freq*math.log(1+ph.length_words)})
-
-    print(f"   - المرشحون للأسئلة: {len(candidates)}")
-    
-    if not candidates: 
-        print("   ⚠️ لا توجد مرشحين، جاري البحث بمعايير أقل صرامة...")
-        # محاولة البحث بمعايير أقل صرامة
-        for pid in kept:
-            ph = phrases[pid]; freq = freq_map[pid]
-            # قبول جميع العبارات بغض النظر عن مستوى الصعوبة
-            ayahs = (Ayah.objects
-                     .filter(id__in=occ_by_phrase[pid])
-                     .select_related('quarter__juz')
-                     .order_by('surah', 'number'))
-            literal = [{
-                'surah': a.surah, 'number': a.number,
-                'juz_number': a.quarter.juz.number if a.quarter else None,
-                'quarter_label': a.quarter.label if a.quarter else None,
-                'text': a.text,
-            } for a in ayahs]
-            candidates.append({
-                'phrase_id': pid,
-                'phrase_text': ph.text,
-                'correct_count': freq,
-                'occurrence_ayah_ids': list(occ_by_phrase[pid]),
-                'literal_ayahs': literal,
-                'bucket': 'easy',  # افتراضي
-                'score': freq * math.log(1 + ph.length_words),
-            })
-        
-        print(f"   - المرشحون بعد المعايير المخففة: {len(candidates)}")
-        
-        if not candidates:
-            messages.error(request,"لا توجد عبارات متشابهة في النطاق المحدد. جرب نطاق أوسع أو أجزاء مختلفة.")
-            return redirect('core:test_selection')
-
-    if difficulty=='mixed':
-        E=[c for c in candidates if c['bucket']=='easy']; M=[c for c in candidates if c['bucket']=='medium']; H=[c for c in candidates if c['bucket']=='hard']
-        random.shuffle(E); random.shuffle(M); random.shuffle(H)
-        ne=max(0,round(desired*0.40)); nm=max(0,round(desired*0.45)); nh=max(0,desired-ne-nm)
-        take=E[:ne]+M[:nm]+H[:nh]
-        for pool in [M[nm:],E[ne:],H[nh:]]:
-            if len(take)>=desired: break
-            need=desired-len(take); take+=pool[:need]
-        selected=take[:desired]; random.shuffle(selected)
-    else:
-        filtered=[c for c in candidates if c['bucket']==difficulty]
-        if not filtered: messages.error(request,"لا توجد أسئلة مناسبة لهذا المستوى في النطاق."); return redirect('core:test_selection')
-        filtered.sort(key=lambda x:(-x['score'],x['phrase_text'])); selected=filtered[:desired]
-
-    selected_type=request.session.get('selected_test_type','similar_count')
-    
-    # إنشاء أسئلة مختلفة حسب نوع الاختبار
-    if selected_type == 'verse_location_quarters':
-        # إنشاء أسئلة موقع الآية في الربع والصفحة
-        questions = create_verse_location_questions(ayat_qs, desired, difficulty)
-        if not questions:
-            messages.error(request, "لا يمكن إنشاء أسئلة مناسبة لهذا النوع من الاختبار في النطاق المحدد.")
-            return redirect('core:test_selection')
-    else:
-        # النوع التقليدي - أسئلة المتشابهات
-        questions = [{'phrase_id':c['phrase_id'],'phrase_text':c['phrase_text'],'correct_count':c['correct_count'],'occurrence_ayah_ids':c['occurrence_ayah_ids'],'literal_ayahs':c['literal_ayahs'],'given_answer':None} for c in selected]
-    
-    session_db=TestSession.objects.create(student=student,test_type=selected_type,num_questions=len(questions),difficulty=difficulty,completed=False)
-    if juz_ids: session_db.juzs.add(*Juz.objects.filter(number__in=juz_ids))
-    if q_ids: session_db.quarters.add(*Quarter.objects.filter(id__in=q_ids))
-
-    request.session['db_session_id']=session_db.id
-    db_qids=[TestQuestion.objects.create(session=session_db).id for _ in questions]
-    request.session['db_question_ids']=db_qids
-    request.session['scope_label']=_build_scope_label(juz_ids,q_ids)
-    request.session['questions']=questions
-    request.session['test_index']=0; request.session['score']=0
-
-    # تهيئة تدفّق هذا الاختبار (namespaced)
-    total=len(questions); ns=_ns(request,f'flow:{session_db.id}')
-    request.session[ns]={'current':1,'total':int(total)}; request.session.modified=True
-
-    # اختياري: تهيئة قديمة للحفاظ على التوافق لو عندك كود لسه بيقرأ pages_flow
-    request.session[_ns(request,'pages_flow')]={'current':1,'total':int(total)}; request.session.modified=True
-    
+    if not (request.session.get('selected_quarters') or request.session.get('selected_juz')):
+        messages.error(request,"مفيش نطاق محدد."); return redirect('core:test_selection')
     # مسح الأجزاء والأرباع المحظورة عند بداية اختبار جديد
-    if 'disabled_juz' in request.session:
-        del request.session['disabled_juz']
-    if 'disabled_quarters' in request.session:
-        del request.session['disabled_quarters']
-    
-    print("=== بداية اختبار جديد - مسح الأجزاء والأرباع المحظورة ===")
-
-    # إشعار بدء الاختبار
-    selected_type = request.session.get('selected_test_type', 'similar_count')
-    test_name = {
-        'similar_count': 'عدد مواضع المتشابهات',
-        'similar_on_pages': 'مواضع المتشابهات في الصفحات',
-        'verse_location_quarters': 'موقع الآية في الربع والصفحة'
-    }.get(selected_type, 'اختبار الحفظ')
-    
-    messages.success(request, f"🚀 تم بدء اختبار {test_name} بنجاح! ({len(questions)} أسئلة)")
-
-    # التحقق من نوع الاختبار وتوجيه للمسار المناسب
-    if selected_type == 'similar_count':
-        return redirect('tests:similar_count:question')
-    elif selected_type == 'similar_on_pages':
-        return redirect('tests:similar_on_pages:question')
-    elif selected_type == 'verse_location_quarters':
-        return redirect('tests:verse_location_quarters:question')
-    else:
-        return redirect('core:test_question')
+    request.session.pop('disabled_juz',None); request.session.pop('disabled_quarters',None)
+    start=START_VIEWS.get(request.session.get('selected_test_type'),similar_count_views.start)
+    return start(request)
 
 # helper صغير يجيب تدفّق الاختبار الحالي (current/total) من الـsession
 def _current_flow(request):
@@ -1008,7 +275,7 @@ def _current_flow(request):
 def test_question(request):
     sid=request.session.get('student_id')
     if not sid: messages.warning(request,"الرجاء إدخال اسمك أولاً."); return redirect('core:login')
-    student=get_object_or_404(Student,id=sid); idx=request.session.get('test_index',0); qs=request.session.get('questions',[]); total=len(qs)
+    student=get_object_or_404(Student,id=sid); idx=request.session.get('test_index',0); qs=TestRunStore(request).questions(); total=len(qs)
     
     # تسجيل للتشخيص
     print(f"🔍 DEBUG: test_question - idx: {idx}, total: {total}")
@@ -1053,11 +320,7 @@ def test_question(request):
         
         wrong=max(0,total-score); db_sid=request.session.get('db_session_id')
         if db_sid: 
-            from django.utils import timezone
-            TestSession.objects.filter(id=db_sid).update(
-                completed=True,
-                completed_at=timezone.now()
-            )
+            AnswerJournal(db_sid).complete()
         
         # إشعار إنهاء الاختبار
         percentage = round((score / total) * 100) if total > 0 else 0
@@ -1087,7 +350,7 @@ def test_question(request):
             'test_type': selected_type
         }
         
-        for k in ['questions','test_index','score','selected_juz','selected_quarters','num_questions','scope_label','difficulty','db_session_id','db_question_ids']: request.session.pop(k,None)
+        for k in ['questions','test_run_id','test_index','score','selected_juz','selected_quarters','num_questions','scope_label','difficulty','db_session_id','db_question_ids']: request.session.pop(k,None)
         
         # التحقق من نوع الاختبار وتوجيه لصفحة النتائج المناسبة
         if selected_type == 'similar_count':
@@ -1110,7 +373,7 @@ def test_question(request):
     question=qs[idx]; progress=round((idx+1)/total*100) if total else 0
     if request.method=='POST' and request.POST.get('action')=='end':
         db_sid=request.session.get('db_session_id')
-        if db_sid: TestSession.objects.filter(id=db_sid).update(completed=True)
+        if db_sid: AnswerJournal(db_sid).complete()
         request.session['test_index']=len(qs)
         # التحقق من نوع الاختبار وتوجيه للمسار المناسب
         selected_type = request.session.get('selected_test_type', 'similar_count')
@@ -1216,7 +479,7 @@ def test_question(request):
                 except (ValueError, TypeError):
                     qs[idx]['page_answer'] = None
                 
-                request.session['questions'] = qs
+                TestRunStore(request).save(qs)
                 
                 # التحقق من صحة إجابات الربع والصفحة
                 correct_quarter = question.get('correct_quarter')
@@ -1235,13 +498,16 @@ def test_question(request):
                 
                 # تحديث قاعدة البيانات
                 db_qids = request.session.get('db_question_ids') or []
-                if isinstance(db_qids, list) and idx < len(db_qids):
+                db_sid = request.session.get('db_session_id')
+                if db_sid and isinstance(db_qids, list) and idx < len(db_qids):
                     quarter_text = "صحيح" if quarter_is_correct else f"خطأ (الصحيح: {correct_quarter})"
                     page_text = "صحيح" if page_is_correct else f"خطأ (الصحيح: {correct_page_in_quarter})"
                     
-                    TestQuestion.objects.filter(id=db_qids[idx]).update(
-                        student_response=f"ربع: {quarter_answer} ({quarter_text}), صفحة: {page_answer} ({page_text})",
-                        is_correct=is_completely_correct
+                    AnswerJournal(db_sid).record_answer(
+                        db_qids[idx],
+                        f"ربع: {quarter_answer} ({quarter_text}), صفحة: {page_answer} ({page_text})",
+                        is_completely_correct,
+                        position=idx,
                     )
                 
                 # تحديث النتيجة
@@ -1253,7 +519,7 @@ def test_question(request):
                 qs[idx]['feedback_stage'] = 'combined'
                 qs[idx]['stage'] = 'combined_feedback'
                 
-                request.session['questions'] = qs
+                TestRunStore(request).save(qs)
                 # التحقق من نوع الاختبار وتوجيه للمسار المناسب
                 selected_type = request.session.get('selected_test_type', 'similar_count')
                 if selected_type == 'similar_count':
@@ -1265,7 +531,7 @@ def test_question(request):
                 # الانتقال للسؤال التالي
                 print(f"🔄 الانتقال من combined_feedback للسؤال التالي: {idx + 1}")
                 request.session['test_index'] = idx + 1
-                request.session['questions'] = qs
+                TestRunStore(request).save(qs)
                 # التحقق من نوع الاختبار وتوجيه للمسار المناسب
                 selected_type = request.session.get('selected_test_type', 'similar_count')
                 if selected_type == 'similar_count':
@@ -1277,7 +543,7 @@ def test_question(request):
                 # الانتقال للسؤال التالي
                 print(f"🔄 الانتقال من page_feedback للسؤال التالي: {idx + 1}")
                 request.session['test_index'] = idx + 1
-                request.session['questions'] = qs
+                TestRunStore(request).save(qs)
                 # التحقق من نوع الاختبار وتوجيه للمسار المناسب
                 selected_type = request.session.get('selected_test_type', 'similar_count')
                 if selected_type == 'similar_count':
@@ -1293,7 +559,7 @@ def test_question(request):
                 except (ValueError, TypeError):
                     qs[idx]['page_answer'] = None
                 
-                request.session['questions'] = qs
+                TestRunStore(request).save(qs)
                 
                 # التحقق من صحة إجابة الصفحة
                 correct_page_in_quarter = question.get('correct_page_in_quarter', 1)
@@ -1309,13 +575,16 @@ def test_question(request):
                 
                 # تحديث قاعدة البيانات
                 db_qids = request.session.get('db_question_ids') or []
-                if isinstance(db_qids, list) and idx < len(db_qids):
+                db_sid = request.session.get('db_session_id')
+                if db_sid and isinstance(db_qids, list) and idx < len(db_qids):
                     quarter_text = "صحيح" if quarter_is_correct else f"خطأ (الصحيح: {question.get('correct_quarter')})"
                     page_text = "صحيح" if page_is_correct else f"خطأ (الصحيح: {correct_page_in_quarter})"
                     
-                    TestQuestion.objects.filter(id=db_qids[idx]).update(
-                        student_response=f"ربع: {qs[idx].get('quarter_answer')} ({quarter_text}), صفحة: {page_answer} ({page_text})",
-                        is_correct=is_completely_correct
+                    AnswerJournal(db_sid).record_answer(
+                        db_qids[idx],
+                        f"ربع: {qs[idx].get('quarter_answer')} ({quarter_text}), صفحة: {page_answer} ({page_text})",
+                        is_completely_correct,
+                        position=idx,
                     )
                 
                 # تحديث النتيجة
@@ -1325,7 +594,7 @@ def test_question(request):
                 qs[idx]['show_feedback'] = True
                 qs[idx]['feedback_stage'] = 'page'
                 qs[idx]['stage'] = 'page_feedback'
-                request.session['questions'] = qs
+                TestRunStore(request).save(qs)
                 # التحقق من نوع الاختبار وتوجيه للمسار المناسب
                 selected_type = request.session.get('selected_test_type', 'similar_count')
                 if selected_type == 'similar_count':
@@ -1339,7 +608,7 @@ def test_question(request):
                 qs[idx]['stage'] = 'page_selection'
                 qs[idx]['correct_quarter'] = question.get('correct_quarter')
                 qs[idx]['show_feedback'] = False
-                request.session['questions'] = qs
+                TestRunStore(request).save(qs)
                 # التحقق من نوع الاختبار وتوجيه للمسار المناسب
                 selected_type = request.session.get('selected_test_type', 'similar_count')
                 if selected_type == 'similar_count':
@@ -1355,7 +624,7 @@ def test_question(request):
                 except (ValueError, TypeError):
                     qs[idx]['page_answer'] = None
                 
-                request.session['questions'] = qs
+                TestRunStore(request).save(qs)
                 
                 # التحقق من صحة إجابة الصفحة
                 correct_page_in_quarter = question.get('correct_page_in_quarter', 1)
@@ -1371,13 +640,16 @@ def test_question(request):
                 
                 # تحديث قاعدة البيانات
                 db_qids = request.session.get('db_question_ids') or []
-                if isinstance(db_qids, list) and idx < len(db_qids):
+                db_sid = request.session.get('db_session_id')
+                if db_sid and isinstance(db_qids, list) and idx < len(db_qids):
                     quarter_text = "صحيح" if quarter_is_correct else f"خطأ (الصحيح: {question.get('correct_quarter')})"
                     page_text = "صحيح" if page_is_correct else f"خطأ (الصحيح: {correct_page_in_quarter})"
                     
-                    TestQuestion.objects.filter(id=db_qids[idx]).update(
-                        student_response=f"ربع: {qs[idx].get('quarter_answer')} ({quarter_text}), صفحة: {page_answer} ({page_text})",
-                        is_correct=is_completely_correct
+                    AnswerJournal(db_sid).record_answer(
+                        db_qids[idx],
+                        f"ربع: {qs[idx].get('quarter_answer')} ({quarter_text}), صفحة: {page_answer} ({page_text})",
+                        is_completely_correct,
+                        position=idx,
                     )
                 
                 # تحديث النتيجة
@@ -1387,7 +659,7 @@ def test_question(request):
                 qs[idx]['show_feedback'] = True
                 qs[idx]['feedback_stage'] = 'page'
                 qs[idx]['stage'] = 'page_feedback'
-                request.session['questions'] = qs
+                TestRunStore(request).save(qs)
                 print(f"🔄 تم الانتقال لـ page_feedback")
                 # التحقق من نوع الاختبار وتوجيه للمسار المناسب
                 selected_type = request.session.get('selected_test_type', 'similar_count')
@@ -1404,7 +676,7 @@ def test_question(request):
             except (ValueError, TypeError):
                 qs[idx]['given_answer'] = None
             
-            request.session['questions'] = qs
+            TestRunStore(request).save(qs)
             
             try:
                 correct_count = int(question.get('correct_count'))
@@ -1412,12 +684,12 @@ def test_question(request):
                 correct_count = -1
             
             db_qids = request.session.get('db_question_ids') or []
-            if isinstance(db_qids, list) and idx < len(db_qids):
+            db_sid = request.session.get('db_session_id')
+            if db_sid and isinstance(db_qids, list) and idx < len(db_qids):
                 given = qs[idx]['given_answer']
                 is_corr = bool(given is not None and int(given) == correct_count)
-                TestQuestion.objects.filter(id=db_qids[idx]).update(
-                    student_response=str(given if given is not None else ''),
-                    is_correct=is_corr
+                AnswerJournal(db_sid).record_answer(
+                    db_qids[idx], str(given if given is not None else ''), is_corr, position=idx
                 )
             
             try:
@@ -1722,7 +994,7 @@ def pages_quarter_pick(request,qid:int):
     
     # الحصول على اسم الربع (أول آية)
     try:
-        first_ayah = Ayah.objects.filter(quarter=qobj).order_by('surah', 'number').first()
+        first_ayah = get_corpus().quarter_first_ayah(qobj.id)
         if first_ayah:
             quarter_info['quarter_name'] = first_ayah.text[:25] + "..." if len(first_ayah.text) > 25 else first_ayah.text
     except:
@@ -1807,7 +1079,7 @@ def pages_quarter_viewer(request,qid:int):
     
     # الحصول على اسم الربع (أول آية)
     try:
-        first_ayah = Ayah.objects.filter(quarter=qobj).order_by('surah', 'number').first()
+        first_ayah = get_corpus().quarter_first_ayah(qobj.id)
         if first_ayah:
             quarter_info['quarter_name'] = first_ayah.text[:25] + "..." if len(first_ayah.text) > 25 else first_ayah.text
     except:
@@ -1873,14 +1145,15 @@ def pages_choose_juz(request):
     
     allowed_juz_numbers=_allowed_juz_numbers_for_scope(request)
     
-    # الحصول على أسماء الأجزاء
+    # الحصول على أسماء الأجزاء (من جدول حدود الأرباع في لقطة المصحف)
+    corpus = get_corpus()
     juz_names = {}
     juz_with_positions = []
     
     for juz_no in allowed_juz_numbers:
         try:
             # البحث عن أول آية في الجزء
-            first_ayah = Ayah.objects.filter(quarter__juz__number=juz_no).order_by('surah', 'number').first()
+            first_ayah = corpus.juz_first_ayah(juz_no)
             if first_ayah:
                 juz_names[juz_no] = first_ayah.text[:30] + "..." if len(first_ayah.text) > 30 else first_ayah.text
             else:
@@ -2020,12 +1293,13 @@ def pages_choose_quarter(request,juz_no:int):
     # الحصول على الأرباع المحظورة
     disabled_quarters = request.session.get('disabled_quarters', [])
     
-    # الحصول على أسماء الأرباع
+    # الحصول على أسماء الأرباع (من جدول حدود الأرباع في لقطة المصحف)
+    corpus = get_corpus()
     quarter_names = {}
     for quarter in quarters:
         try:
             # البحث عن أول آية في الربع
-            first_ayah = Ayah.objects.filter(quarter=quarter).order_by('surah', 'number').first()
+            first_ayah = corpus.quarter_first_ayah(quarter.id)
             if first_ayah:
                 quarter_names[quarter.id] = first_ayah.text[:25] + "..." if len(first_ayah.text) > 25 else first_ayah.text
             else:
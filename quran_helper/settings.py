@@ -108,6 +108,16 @@ DATABASES = {
     }
 }
 
+# =========================
+# Cache
+# =========================
+# default: ذاكرة كل عملية. shared: جدول في قاعدة البيانات مشترك بين العمليات
+# (لوحة المنافسة وعدّادات المنصة)؛ الجدول يُنشأ في ترحيل core 0022
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "shared_cache"},
+}
+
 # =========================
 # Password validation
 # =========================
@@ -253,6 +263,13 @@ import os
 logs_dir = BASE_DIR / 'logs'
 os.makedirs(logs_dir, exist_ok=True)
 
+# =========================
+# Quran corpus snapshot
+# =========================
+# ملف ختم إصدار لقطة المصحف في الذاكرة؛ تعيد أوامر الاستيراد كتابته
+# فتعيد كل عملية (worker) تحميل اللقطة عند أول طلب بعده
+QURAN_CORPUS_VERSION_FILE = BASE_DIR / 'data' / 'corpus.version'
+
 # =========================
 # Messages / Misc
 # =========================
@@ -0,0 +1,112 @@
+"""
+كاش صفحات لوحة المنافسة المشترك بين العمليات (stale-while-revalidate)
+
+اللوحة تُطلب أكثر بكثير مما تتغير. كل صفحة (حسب المؤشر) تُحفظ في الكاش
+المشترك مع وقت حسابها، وتُعتبر قديمة بعد FRESH_SECONDS أو لو تغير الجدول
+بعد حسابها (leaderboard.CHANGED_KEY). الصفحة القديمة تُعرض فوراً، وعملية
+واحدة فقط تأخذ القفل (cache.add ذري في الكاش المشترك) وتعيد حسابها في
+الخلفية؛ فلو أنهى طلاب كثيرون اختباراتهم معاً لا تتزاحم العمليات على الحساب.
+وكذلك أول طلب لصفحة غير مخزنة: من يأخذ القفل يحسبها، والبقية تنتظر حتى
+COLD_WAIT_SECONDS ثم تقرأها من الكاش، أو تحسب صفحة مباشرة لا تُكتب فيه.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from core.services import leaderboard
+from core.services.shared_cache import get_shared_cache
+from stats_app.services.stats_service import StatsService
+
+logger = logging.getLogger(__name__)
+
+# عمر الصفحة الطازجة، وبقاؤها في الكاش لتُعرض قديمة، ومدة القفل القصوى
+FRESH_SECONDS = 30
+TTL_SECONDS = 24 * 60 * 60
+LOCK_SECONDS = 60
+# انتظار من لم يأخذ القفل لصفحة غير مخزنة، وفترة إعادة القراءة
+COLD_WAIT_SECONDS = 2
+COLD_POLL_SECONDS = 0.05
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def background_enabled() -> bool:
+    return getattr(settings, 'LEADERBOARD_CACHE_BACKGROUND', True)
+
+
+def page_key(cursor: Optional[str], limit: int) -> str:
+    # المؤشر من الطلب يُعاد ترميزه بعد التحقق، فلا تصل مفاتيح عشوائية للكاش
+    position = leaderboard.decode_cursor(cursor) if cursor else None
+    after = leaderboard.encode_cursor(*position) if position else ''
+    return f"leaderboard:page:{int(limit)}:{after}"
+
+
+def get_leaderboard_page(cursor: Optional[str] = None, limit: int = 50) -> Dict:
+    """مثل StatsService.get_leaderboard_page لكن من الكاش المشترك"""
+    cache = get_shared_cache()
+    key = page_key(cursor, limit)
+    found = cache.get_many([key, leaderboard.CHANGED_KEY])
+    entry = found.get(key)
+    if entry is None:
+        # أول طلب للصفحة: لا شيء قديم يُعرض
+        if cache.add(f"{key}:lock", 1, LOCK_SECONDS):
+            return _recompute(key, cursor, limit, locked=True)
+        return _wait_for(key, cursor, limit)
+
+    changed_at = found.get(leaderboard.CHANGED_KEY) or 0
+    stale = entry['computed_at'] < changed_at or entry['computed_at'] + FRESH_SECONDS < time.time()
+    if stale and cache.add(f"{key}:lock", 1, LOCK_SECONDS):
+        if background_enabled():
+            _submit(key, cursor, limit)
+        else:
+            return _recompute(key, cursor, limit, locked=True)
+    return entry['page']
+
+
+def _recompute(key: str, cursor: Optional[str], limit: int, locked: bool = False) -> Dict:
+    cache = get_shared_cache()
+    # وقت البداية: أي تغيير أثناء الحساب يجعل النتيجة قديمة
+    computed_at = time.time()
+    try:
+        page = StatsService().get_leaderboard_page(cursor, limit)
+        cache.set(key, {'computed_at': computed_at, 'page': page}, TTL_SECONDS)
+    finally:
+        if locked:
+            cache.delete(f"{key}:lock")
+    return page
+
+
+def _wait_for(key: str, cursor: Optional[str], limit: int) -> Dict:
+    """عملية أخرى تحسب الصفحة: ننتظرها قليلاً، وإلا صفحة مباشرة بلا كتابة في الكاش"""
+    cache = get_shared_cache()
+    deadline = time.monotonic() + COLD_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(COLD_POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['page']
+    return StatsService().get_leaderboard_page(cursor, limit)
+
+
+def _submit(key: str, cursor: Optional[str], limit: int) -> None:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='leaderboard')
+    _executor.submit(_recompute_in_background, key, cursor, limit)
+
+
+def _recompute_in_background(key: str, cursor: Optional[str], limit: int) -> None:
+    close_old_connections()
+    try:
+        _recompute(key, cursor, limit, locked=True)
+    except Exception:
+        logger.exception("leaderboard cache refresh failed for %s", key)
+    finally:
+        connection.close()
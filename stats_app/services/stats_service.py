@@ -1,11 +1,17 @@
 """
 خدمة الإحصائيات والليدر بورد
 """
+from datetime import timedelta
 from typing import Dict, List, Optional
+from django.db import transaction
 from django.db.models import Count, Sum, Avg, Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 
-from core.models import Student, TestSession, TestQuestion
+from core.models import LeaderboardEntry, Student, StudentDailyStats, TestSession, TestQuestion
+from core.services import global_counters, leaderboard
+from core.services.daily_stats import refresh_student_days
+from core.services.leaderboard import refresh_student
 
 
 class StatsService:
@@ -15,36 +21,30 @@ class StatsService:
         self.student = student
     
     def get_student_stats(self, student: Student) -> Dict:
-        """الحصول على إحصائيات الطالب"""
-        
-        # إحصائيات الاختبارات المكتملة
-        sessions = TestSession.objects.filter(student=student, completed=True)
-        
-        total_sessions = sessions.count()
-        
-        # حساب الإحصائيات من الأسئلة
-        total_questions = 0
-        correct_answers = 0
-        wrong_answers = 0
-        unanswered_questions = 0
-        
-        for session in sessions:
-            questions = session.questions.all()
-            total_questions += questions.count()
-            correct_answers += questions.filter(is_correct=True).count()
-            
-            # الإجابات الخاطئة: الأسئلة التي أُجيب عليها لكن الإجابة خاطئة
-            wrong_answers += questions.filter(
-                is_correct=False,
-                student_response__isnull=False
-            ).exclude(student_response='').count()
-            
-            # الإجابات غير المجابة: الأسئلة التي لم يُجب عليها إطلاقاً
-            unanswered_questions += questions.filter(
-                student_response__isnull=True
-            ).count() + questions.filter(
-                student_response=''
-            ).count()
+        """
+        الحصول على إحصائيات الطالب: مجموع صفوف التجميع اليومي
+        (StudentDailyStats) حسب نوع الاختبار في استعلام واحد
+        """
+        
+        rows = (
+            StudentDailyStats.objects.filter(student=student)
+            .values('test_type')
+            .annotate(
+                sessions=Sum('sessions'),
+                questions_count=Sum('questions'),
+                correct=Sum('correct'),
+                wrong=Sum('wrong'),
+                unanswered=Sum('unanswered'),
+            )
+            .order_by()
+        )
+        by_type = {row['test_type']: row for row in rows}
+        
+        total_sessions = sum(row['sessions'] for row in by_type.values())
+        total_questions = sum(row['questions_count'] for row in by_type.values())
+        correct_answers = sum(row['correct'] for row in by_type.values())
+        wrong_answers = sum(row['wrong'] for row in by_type.values())
+        unanswered_questions = sum(row['unanswered'] for row in by_type.values())
         
         # حساب الدقة بناءً على الأسئلة التي أُجيب عليها فعلاً
         answered_questions = correct_answers + wrong_answers
@@ -53,35 +53,16 @@ class StatsService:
         # إحصائيات حسب نوع الاختبار
         test_type_stats = {}
         for test_type in ['similar_count', 'similar_on_pages', 'verse_location_quarters']:
-            type_sessions = sessions.filter(test_type=test_type)
-            if type_sessions.exists():
-                type_questions = 0
-                type_correct = 0
-                type_wrong = 0
-                type_unanswered = 0
-                
-                for session in type_sessions:
-                    questions = session.questions.all()
-                    type_questions += questions.count()
-                    type_correct += questions.filter(is_correct=True).count()
-                    type_wrong += questions.filter(
-                        is_correct=False,
-                        student_response__isnull=False
-                    ).exclude(student_response='').count()
-                    type_unanswered += questions.filter(
-                        student_response__isnull=True
-                    ).count() + questions.filter(
-                        student_response=''
-                    ).count()
-                
-                type_answered = type_correct + type_wrong
+            row = by_type.get(test_type)
+            if row:
+                type_answered = row['correct'] + row['wrong']
                 test_type_stats[test_type] = {
-                    'sessions': type_sessions.count(),
-                    'questions': type_questions,
-                    'correct': type_correct,
-                    'wrong': type_wrong,
-                    'unanswered': type_unanswered,
-                    'accuracy': (type_correct / type_answered * 100) if type_answered > 0 else 0
+                    'sessions': row['sessions'],
+                    'questions': row['questions_count'],
+                    'correct': row['correct'],
+                    'wrong': row['wrong'],
+                    'unanswered': row['unanswered'],
+                    'accuracy': (row['correct'] / type_answered * 100) if type_answered > 0 else 0
                 }
         
         return {
@@ -94,58 +75,133 @@ class StatsService:
             'test_type_stats': test_type_stats
         }
     
-    def get_leaderboard(self, limit: int = 50) -> List[Dict]:
-        """الحصول على لوحة المنافسة"""
+    def get_daily_stats(self, student: Student, days: int = 30) -> List[Dict]:
+        """
+        عدّادات الطالب لكل يوم (كل أنواع الاختبارات) في آخر days يوماً، للمنحنيات
+        """
+        
+        since = timezone.localdate() - timedelta(days=days - 1)
+        rows = (
+            StudentDailyStats.objects.filter(student=student, day__gte=since)
+            .values('day')
+            .annotate(
+                sessions=Sum('sessions'),
+                questions=Sum('questions'),
+                correct=Sum('correct'),
+                wrong=Sum('wrong'),
+                unanswered=Sum('unanswered'),
+            )
+            .order_by('day')
+        )
+        
+        daily = []
+        for row in rows:
+            answered = row['correct'] + row['wrong']
+            row['accuracy'] = (row['correct'] / answered * 100) if answered > 0 else 0
+            daily.append(row)
+        
+        return daily
+    
+    def get_leaderboard(self, limit: Optional[int] = 50) -> List[Dict]:
+        """
+        الحصول على لوحة المنافسة: استعلام واحد على جدول LeaderboardEntry مرتب
+        بفهرسه (الدقة ثم الإجابات الصحيحة)؛ limit=None للوحة كاملة
+        """
         
-        # الحصول على جميع الطلاب مع إحصائياتهم
-        students = Student.objects.all()
-        leaderboard = []
+        entries = LeaderboardEntry.objects.select_related('student').order_by(*leaderboard.ORDERING)
+        if limit is not None:
+            entries = entries[:limit]
         
-        for student in students:
-            stats = self.get_student_stats(student)
-            
-            if stats['total_questions'] > 0:  # فقط الطلاب الذين لديهم اختبارات
-                # حساب النقاط (الدقة 80% + الإجابات الصحيحة + عدد الامتحانات)
-                score = (stats['accuracy'] * 0.8) + stats['correct_answers'] + stats['total_sessions']
-                
-                leaderboard.append({
-                    'student_id': student.id,
-                    'display_name': student.display_name,
-                    'avatar': student.avatar.url if student.avatar else None,
-                    'score': round(score, 1),
-                    'exams': stats['total_sessions'],
-                    'correct': stats['correct_answers'],
-                    'wrong': stats['wrong_answers'],
-                    'unanswered': stats['unanswered'],
-                    'accuracy_pct': round(stats['accuracy'], 1)
-                })
-        
-        # ترتيب حسب الدقة أولاً، ثم الإجابات الصحيحة
-        leaderboard.sort(key=lambda x: (x['accuracy_pct'], x['correct']), reverse=True)
-        
-        # إضافة الترتيب
-        for i, student in enumerate(leaderboard, 1):
-            student['rank'] = i
-        
-        return leaderboard[:limit]
+        return [self._leaderboard_row(entry, rank) for rank, entry in enumerate(entries, 1)]
     
-    def get_student_rank(self, student: Student) -> Optional[int]:
-        """الحصول على ترتيب الطالب في اللوحة"""
+    def get_leaderboard_page(self, cursor: Optional[str] = None, limit: int = 50) -> Dict:
+        """
+        صفحة من اللوحة بعد المؤشر (keyset على مفتاح الترتيب بدل OFFSET)، فتكلفة
+        الصفحة العميقة مثل الأولى؛ next_cursor هو None في آخر صفحة
+        """
+        
+        entries = LeaderboardEntry.objects.select_related('student').order_by(*leaderboard.ORDERING)
+        start_rank = 0
+        position = leaderboard.decode_cursor(cursor) if cursor else None
+        if position is not None:
+            start_rank, key = position
+            entries = entries.filter(leaderboard.behind(key))
+        
+        # صف زائد لمعرفة وجود صفحة تالية
+        entries = list(entries[:limit + 1])
+        rows = [self._leaderboard_row(entry, start_rank + i) for i, entry in enumerate(entries[:limit], 1)]
+        next_cursor = None
+        if len(entries) > limit:
+            last = entries[limit - 1]
+            next_cursor = leaderboard.encode_cursor(start_rank + limit, leaderboard.sort_key(last))
+        
+        return {'rows': rows, 'next_cursor': next_cursor}
+    
+    def get_student_rank(self, student: Student, limit: Optional[int] = 50) -> Optional[int]:
+        """
+        الحصول على ترتيب الطالب في اللوحة (None لو ليس ضمن أول limit):
+        عدّ الصفوف التي تسبقه على فهرس الترتيب
+        """
         
-        leaderboard = self.get_leaderboard()
+        entry = LeaderboardEntry.objects.filter(student=student).first()
+        if entry is None:
+            return None
         
-        for student_data in leaderboard:
-            if student_data['student_id'] == student.id:
-                return student_data['rank']
+        rank = LeaderboardEntry.objects.filter(leaderboard.ahead_of(leaderboard.sort_key(entry))).count() + 1
         
-        return None
+        return rank if limit is None or rank <= limit else None
+    
+    def get_student_neighbours(self, student: Student, count: int = 2) -> List[Dict]:
+        """
+        صف الطالب في اللوحة ومن حوله (count قبله وcount بعده) أياً كان ترتيبه؛
+        قائمة فارغة لو ليس في اللوحة
+        """
+        
+        entry = LeaderboardEntry.objects.select_related('student').filter(student=student).first()
+        if entry is None:
+            return []
+        
+        key = leaderboard.sort_key(entry)
+        rank = LeaderboardEntry.objects.filter(leaderboard.ahead_of(key)).count() + 1
+        before = list(
+            LeaderboardEntry.objects.select_related('student')
+            .filter(leaderboard.ahead_of(key)).order_by(*leaderboard.REVERSE_ORDERING)[:count]
+        )
+        after = list(
+            LeaderboardEntry.objects.select_related('student')
+            .filter(leaderboard.behind(key)).order_by(*leaderboard.ORDERING)[:count]
+        )
+        
+        entries = before[::-1] + [entry] + after
+        first_rank = rank - len(before)
+        return [self._leaderboard_row(e, first_rank + i) for i, e in enumerate(entries)]
+    
+    @staticmethod
+    def _leaderboard_row(entry: LeaderboardEntry, rank: int) -> Dict:
+        student = entry.student
+        return {
+            'rank': rank,
+            'student_id': student.id,
+            'display_name': student.display_name,
+            'avatar': student.avatar.url if student.avatar else None,
+            'skin': student.skin,
+            'score': entry.score,
+            'exams': entry.exams,
+            'correct': entry.correct,
+            'wrong': entry.wrong,
+            'unanswered': entry.unanswered,
+            'accuracy_pct': entry.accuracy
+        }
     
     def reset_student_stats(self, student: Student) -> bool:
         """إعادة تعيين إحصائيات الطالب"""
         
         try:
-            # حذف جميع جلسات الاختبار المكتملة
-            TestSession.objects.filter(student=student, completed=True).delete()
+            with transaction.atomic():
+                # حذف جميع جلسات الاختبار المكتملة، وإزالة الطالب من اللوحة والتجميع اليومي
+                TestSession.objects.filter(student=student, completed=True).delete()
+                refresh_student(student.id)
+                refresh_student_days(student.id)
             
             return True
             
@@ -179,26 +235,17 @@ class StatsService:
         return activity
     
     def get_global_stats(self) -> Dict:
-        """الحصول على الإحصائيات العامة للمنصة"""
+        """الحصول على الإحصائيات العامة للمنصة (من عدّادات المنصة المخزنة في الكاش)"""
         
-        total_students = Student.objects.count()
-        total_sessions = TestSession.objects.filter(completed=True).count()
-        
-        # حساب إجمالي الأسئلة من جميع الجلسات المكتملة
-        total_questions = 0
-        total_correct = 0
-        
-        for session in TestSession.objects.filter(completed=True):
-            questions = session.questions.all()
-            total_questions += questions.count()
-            total_correct += questions.filter(is_correct=True).count()
+        counters = global_counters.get_global_counters()
+        total_questions = counters['completed_session_questions']
         
         # متوسط الدقة
-        avg_accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
+        avg_accuracy = (counters['completed_session_correct'] / total_questions * 100) if total_questions > 0 else 0
         
         return {
-            'total_students': total_students,
-            'total_sessions': total_sessions,
+            'total_students': counters['total_students'],
+            'total_sessions': counters['completed_sessions'],
             'total_questions': total_questions,
             'average_accuracy': round(avg_accuracy, 1)
         }
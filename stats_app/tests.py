@@ -0,0 +1,208 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import LeaderboardEntry, Student, StudentDailyStats, TestQuestion, TestSession
+from core.services import global_counters
+from core.services.daily_stats import rebuild_daily_stats, refresh_session_day, refresh_student_days
+from core.services.global_counters import get_global_counters
+from core.services.leaderboard import rebuild_leaderboard, refresh_student
+from core.services.shared_cache import get_shared_cache
+from stats_app.services import leaderboard_cache
+from stats_app.services.stats_service import StatsService
+from stats_app.views import _user_stats
+
+# كاش الذاكرة بدل جدول الكاش المشترك، حتى لا تُحسب استعلامات الكاش
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared-tests'},
+}
+
+
+class StudentStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = Student.objects.create(user=User.objects.create(username='s1'), display_name='s1')
+        other = Student.objects.create(user=User.objects.create(username='s2'), display_name='s2')
+
+        def session(student, test_type, answers, completed=True):
+            s = TestSession.objects.create(student=student, test_type=test_type, completed=completed)
+            TestQuestion.objects.bulk_create([
+                TestQuestion(session=s, student_response=response, is_correct=correct) for response, correct in answers
+            ])
+
+        # (الإجابة، صحيحة؟): '' = بلا إجابة
+        session(cls.student, 'similar_count', [('3', True), ('2', False), ('', False)])
+        session(cls.student, 'similar_count', [('4', True), ('', False)])
+        session(cls.student, 'verse_location_quarters', [('5', False)])
+        session(cls.student, 'verse_location_quarters', [])
+        session(cls.student, 'similar_positions_on_pages', [('1', True)])
+        # لا تُحسب: جلسة غير مكتملة، وجلسة طالب آخر
+        session(cls.student, 'similar_count', [('3', True)], completed=False)
+        session(other, 'similar_count', [('3', True)])
+        rebuild_daily_stats()
+
+    def test_student_stats_in_one_query(self):
+        with self.assertNumQueries(1):
+            stats = StatsService().get_student_stats(self.student)
+
+        self.assertEqual(stats['total_sessions'], 5)
+        self.assertEqual(stats['total_questions'], 7)
+        self.assertEqual(stats['correct_answers'], 3)
+        self.assertEqual(stats['wrong_answers'], 2)
+        self.assertEqual(stats['unanswered'], 2)
+        self.assertAlmostEqual(stats['accuracy'], 60.0)
+        self.assertEqual(stats['test_type_stats'], {
+            'similar_count': {
+                'sessions': 2, 'questions': 5, 'correct': 2, 'wrong': 1, 'unanswered': 2,
+                'accuracy': 2 / 3 * 100,
+            },
+            'verse_location_quarters': {
+                'sessions': 2, 'questions': 1, 'correct': 0, 'wrong': 1, 'unanswered': 0, 'accuracy': 0.0,
+            },
+        })
+
+    def test_user_stats_count_unanswered_as_wrong(self):
+        self.assertEqual(_user_stats(self.student), {'exams': 5, 'correct': 3, 'wrong': 4, 'unanswered': 2})
+
+    def test_incremental_refresh_matches_full_rebuild(self):
+        # جلسة في يوم آخر حتى يُعاد حساب أكثر من يوم
+        s = TestSession.objects.create(student=self.student, test_type='similar_count', completed=True,
+                                       completed_at=timezone.now() - timedelta(days=3))
+        TestQuestion.objects.create(session=s, student_response='2', is_correct=True)
+        fields = ('student_id', 'test_type', 'day', 'sessions', 'questions', 'correct', 'wrong', 'unanswered')
+        rebuild_daily_stats()
+        full = list(StudentDailyStats.objects.values_list(*fields))
+
+        StudentDailyStats.objects.all().delete()
+        for session_id in TestSession.objects.filter(completed=True).values_list('id', flat=True):
+            refresh_session_day(session_id)
+        self.assertCountEqual(StudentDailyStats.objects.values_list(*fields), full)
+
+    def test_student_without_sessions(self):
+        stranger = Student.objects.create(user=User.objects.create(username='s3'), display_name='s3')
+        stats = StatsService().get_student_stats(stranger)
+        self.assertEqual(stats['total_sessions'], 0)
+        self.assertEqual(stats['accuracy'], 0)
+        self.assertEqual(stats['test_type_stats'], {})
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_global_stats_cached_until_invalidated(self):
+        with self.assertNumQueries(2):
+            stats = StatsService().get_global_stats()
+        self.assertEqual(stats, {'total_students': 2, 'total_sessions': 6, 'total_questions': 8, 'average_accuracy': 50.0})
+        with self.assertNumQueries(0):
+            StatsService().get_global_stats()
+
+        get_global_counters(include_raw=True)
+        self.assertIsNotNone(get_shared_cache().get(global_counters.RAW_CACHE_KEY))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_student_days(self.student.id)
+        self.assertIsNone(get_shared_cache().get(global_counters.RAW_CACHE_KEY))
+        with self.assertNumQueries(2):
+            StatsService().get_global_stats()
+
+
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = [
+            Student.objects.create(user=User.objects.create(username=f'l{i}'), display_name=f'l{i}') for i in range(4)
+        ]
+
+    def complete_session(self, student, answers):
+        s = TestSession.objects.create(student=student, test_type='similar_count', completed=True)
+        TestQuestion.objects.bulk_create([
+            TestQuestion(session=s, student_response=response, is_correct=correct) for response, correct in answers
+        ])
+        refresh_student(student.id)
+        refresh_session_day(s.id)
+
+    def test_entries_follow_completed_sessions(self):
+        a, b, c, d = self.students
+        self.complete_session(a, [('3', True), ('2', False)])
+        self.complete_session(b, [('3', True), ('4', True), ('', False)])
+        self.complete_session(c, [('3', True), ('1', False)])
+        self.complete_session(c, [('5', True)])
+        TestSession.objects.create(student=d, test_type='similar_count')  # غير مكتملة: ليس في اللوحة
+
+        with self.assertNumQueries(1):
+            rows = StatsService().get_leaderboard()
+        self.assertEqual([r['student_id'] for r in rows], [b.id, c.id, a.id])
+        self.assertEqual(rows[1], dict(rows[1], exams=2, correct=2, wrong=1, unanswered=0, accuracy_pct=66.7, score=57.3))
+        self.assertEqual(StatsService().get_student_rank(a), 3)
+        self.assertIsNone(StatsService().get_student_rank(d))
+
+        # إعادة التعيين تُخرج الطالب من اللوحة، وإعادة البناء تطابق التحديث التدريجي
+        StatsService().reset_student_stats(b)
+        self.assertEqual([r['student_id'] for r in StatsService().get_leaderboard()], [c.id, a.id])
+        before = list(LeaderboardEntry.objects.values_list('student_id', 'exams', 'correct', 'accuracy', 'score'))
+        self.assertEqual(rebuild_leaderboard(), 2)
+        self.assertCountEqual(
+            LeaderboardEntry.objects.values_list('student_id', 'exams', 'correct', 'accuracy', 'score'), before)
+
+    def test_pages_and_neighbours(self):
+        for i, student in enumerate(self.students):
+            self.complete_session(student, [('3', True)] * (i + 1) + [('2', False)])
+        full = StatsService().get_leaderboard(limit=None)
+        self.assertEqual([r['rank'] for r in full], [1, 2, 3, 4])
+
+        first = StatsService().get_leaderboard_page(limit=3)
+        with self.assertNumQueries(1):
+            second = StatsService().get_leaderboard_page(first['next_cursor'], limit=3)
+        self.assertEqual(first['rows'] + second['rows'], full)
+        self.assertIsNone(second['next_cursor'])
+
+        self.assertEqual(StatsService().get_student_neighbours(self.students[1], count=1), full[1:4])
+        self.assertEqual(StatsService().get_student_neighbours(self.students[3], count=1), full[:2])
+
+    @override_settings(LEADERBOARD_CACHE_BACKGROUND=False)
+    def test_cached_page_is_stale_while_another_worker_recomputes(self):
+        a, b = self.students[:2]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.complete_session(a, [('3', True)])
+        first = leaderboard_cache.get_leaderboard_page()
+        self.assertEqual([r['student_id'] for r in first['rows']], [a.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.complete_session(b, [('3', True), ('4', True)])
+        # عملية أخرى تحمل قفل إعادة الحساب: تُعرض الصفحة القديمة كما هي
+        lock = leaderboard_cache.page_key(None, 50) + ':lock'
+        get_shared_cache().add(lock, 1)
+        self.assertEqual(leaderboard_cache.get_leaderboard_page(), first)
+
+        get_shared_cache().delete(lock)
+        page = leaderboard_cache.get_leaderboard_page()
+        self.assertEqual([r['student_id'] for r in page['rows']], [b.id, a.id])
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_concurrent_cold_misses_recompute_once(self):
+        calls = []
+
+        class SlowStatsService:
+            def get_leaderboard_page(self, cursor=None, limit=50):
+                calls.append(cursor)
+                time.sleep(0.2)
+                return {'rows': [], 'next_cursor': None}
+
+        pages = []
+
+        def request_page():
+            pages.append(leaderboard_cache.get_leaderboard_page())
+
+        with mock.patch.object(leaderboard_cache, 'StatsService', SlowStatsService), \
+                mock.patch.object(leaderboard_cache, '_recompute', wraps=leaderboard_cache._recompute) as recompute:
+            threads = [threading.Thread(target=request_page) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+        self.assertEqual(recompute.call_count, 1)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(pages, [{'rows': [], 'next_cursor': None}] * 5)
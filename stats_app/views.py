@@ -1,7 +1,12 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from core.models import Student, TestSession, TestQuestion
+from django.db import transaction
+from django.db.models import Sum
+from core.models import Student, StudentDailyStats, TestSession, TestQuestion
+from core.services.daily_stats import refresh_student_days
+from core.services.leaderboard import refresh_student
+from stats_app.services.stats_service import StatsService
 
 
 def _score_formula(exams, correct, wrong, unanswered):
@@ -11,51 +16,19 @@ def _score_formula(exams, correct, wrong, unanswered):
 
 
 def _user_stats(student: Student):
-    """حساب إحصائيات الطالب"""
-    # نعتمد فقط على الجلسات المكتملة ونستبعد الأسئلة غير المُجابة من الصحيح/الخطأ
-    exams = TestSession.objects.filter(student=student, completed=True).count()
-    correct = TestQuestion.objects.filter(session__student=student, session__completed=True, is_correct=True).count()
-    wrong = TestQuestion.objects.filter(session__student=student, session__completed=True, is_correct=False).count()
-    unanswered = TestQuestion.objects.filter(session__student=student, session__completed=True, student_response__isnull=True).count() + TestQuestion.objects.filter(session__student=student, session__completed=True, student_response='').count()
-
-    return {'exams': exams, 'correct': correct, 'wrong': wrong, 'unanswered': unanswered}
+    """حساب إحصائيات الطالب من التجميع اليومي (StudentDailyStats)"""
+    # الجلسات المكتملة فقط؛ الخطأ كل ما ليس صحيحاً (ومنه غير المجاب) كما كان
+    totals = StudentDailyStats.objects.filter(student=student).aggregate(
+        exams=Sum('sessions'), correct=Sum('correct'), wrong=Sum('wrong'), unanswered=Sum('unanswered'),
+    )
+    stats = {name: value or 0 for name, value in totals.items()}
+    stats['wrong'] += stats['unanswered']
+    return stats
 
 
 def _leaderboard():
-    """حساب لوحة المنافسة"""
-    # الحصول على جميع الطلاب الذين لديهم جلسات مكتملة
-    students_with_sessions = Student.objects.filter(
-        testsession__completed=True
-    ).distinct()
-    
-    leaderboard_data = []
-    
-    for student in students_with_sessions:
-        stats = _user_stats(student)
-        score = _score_formula(stats['exams'], stats['correct'], stats['wrong'], stats['unanswered'])
-        
-        if stats['exams'] > 0:  # فقط الطلاب الذين لديهم امتحانات مكتملة
-            leaderboard_data.append({
-                'student_id': student.id,
-                'display_name': student.display_name,
-                'avatar': student.avatar.url if student.avatar else None,
-                'skin': student.skin,
-                'score': score,
-                'exams': stats['exams'],
-                'correct': stats['correct'],
-                'wrong': stats['wrong'],
-                'unanswered': stats['unanswered'],
-                'accuracy_pct': (stats['correct'] / (stats['correct'] + stats['wrong'])) * 100 if (stats['correct'] + stats['wrong']) > 0 else None
-            })
-    
-    # ترتيب حسب النقاط (تنازلي) ثم عدد الامتحانات (تنازلي)
-    leaderboard_data.sort(key=lambda x: (x['score'], x['exams']), reverse=True)
-    
-    # إضافة الترتيب
-    for i, student_data in enumerate(leaderboard_data):
-        student_data['rank'] = i + 1
-    
-    return leaderboard_data
+    """لوحة المنافسة من جدول LeaderboardEntry"""
+    return StatsService().get_leaderboard(limit=None)
 
 
 @login_required
@@ -125,14 +98,20 @@ def reset_stats(request):
         student = get_object_or_404(Student, user=request.user)
         
         try:
-            # حذف جميع جلسات الاختبار المكتملة
-            TestSession.objects.filter(student=student, completed=True).delete()
-            
-            # حذف جميع الأسئلة
-            TestQuestion.objects.filter(session__student=student).delete()
-            
-            # حذف جميع جلسات الاختبار غير المكتملة
-            TestSession.objects.filter(student=student, completed=False).delete()
+            # الحذف وتحديث اللوحة والتجميع اليومي معاً، أو لا شيء
+            with transaction.atomic():
+                # حذف جميع جلسات الاختبار المكتملة
+                TestSession.objects.filter(student=student, completed=True).delete()
+                
+                # حذف جميع الأسئلة
+                TestQuestion.objects.filter(session__student=student).delete()
+                
+                # حذف جميع جلسات الاختبار غير المكتملة
+                TestSession.objects.filter(student=student, completed=False).delete()
+                
+                # إزالة الطالب من لوحة المنافسة والتجميع اليومي
+                refresh_student(student.id)
+                refresh_student_days(student.id)
             
             messages.success(request, "تم إعادة تعيين إحصائياتك بنجاح! يمكنك الآن البدء من جديد.")
             return redirect('stats_app:stats')
@@ -9,6 +9,7 @@ from django.urls import reverse_lazy
 from django.http import JsonResponse
 
 from core.models import Student
+from stats_app.services import leaderboard_cache
 from stats_app.services.stats_service import StatsService
 
 
@@ -42,9 +43,11 @@ class LeaderboardView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # الحصول على اللوحة
+        # الحصول على اللوحة: صفحة بعد المؤشر ?after= (الأولى بدونه) من الكاش المشترك
         stats_service = StatsService()
-        context['rows'] = stats_service.get_leaderboard()
+        page = leaderboard_cache.get_leaderboard_page(self.request.GET.get('after'))
+        context['rows'] = page['rows']
+        context['next_cursor'] = page['next_cursor']
         
         # إضافة الطالب الحالي إذا كان مسجل دخول
         if self.request.user.is_authenticated:
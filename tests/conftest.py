@@ -0,0 +1,12 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+from tests.corpus_factory import make_corpus
+
+
+@pytest.fixture
+def corpus():
+    """لقطة مصحف صغيرة (tests/corpus_factory.py)"""
+    return make_corpus()
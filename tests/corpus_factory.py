@@ -0,0 +1,19 @@
+"""لقطة مصحف صغيرة مشتركة بين اختبارات pytest (tests/) واختبارات Django (tests_app)"""
+from core.services.corpus_service import QuranCorpus
+
+
+def make_corpus(version: str = 't') -> QuranCorpus:
+    """ربعان في الجزء الأول، والعبارة 10 تتكرر في آيتين"""
+    return QuranCorpus(
+        version=version,
+        ayah_rows=[
+            (3, 2, 3, 2, 1, 3, 1, 'الذين يؤمنون بالغيب'),
+            (1, 2, 1, 1, 1, 2, 1, 'الم'),
+            (2, 2, 2, 1, 1, 2, 2, 'ذلك الكتاب لا ريب فيه'),
+            (4, 2, 4, 2, 1, 3, 2, 'والذين يؤمنون بما انزل'),
+        ],
+        quarter_rows=[(1, 1, 1, 'الم'), (2, 1, 2, 'الذين')],
+        phrase_rows=[(10, 'يؤمنون', 'يؤمنون', 1, 2, 0.0), (11, 'ريب', 'ريب', 1, 1, 0.0)],
+        occurrence_rows=[(10, 3, 2, 2), (10, 4, 2, 2), (11, 2, 4, 4)],
+        normalize=lambda w: w,
+    )
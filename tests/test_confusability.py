@@ -0,0 +1,32 @@
+import json, os, sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.services.confusability import incoming_matches, iter_matching_ayah, score_phrases
+
+
+def test_streamed_entries_match_json_and_index_is_reversed(tmp_path):
+    data = {
+        '2:3': [{'matched_ayah_key': '2:4', 'score': 80, 'coverage': 50, 'match_words': [[2, 2]]}],
+        '2:4': [{'matched_ayah_key': '2:3', 'score': 60, 'coverage': 100, 'match_words': [[1], [2, 3]]}],
+    }
+    path = tmp_path / 'matching-ayah.json'
+    path.write_text(json.dumps(data, indent=1), encoding='utf-8')
+    entries = list(iter_matching_ayah(path))
+    assert dict(entries) == data
+    # مدخلات تعبر حدود الدفعات
+    for chunk_size in (1, 7, 64):
+        assert list(iter_matching_ayah(path, chunk_size)) == entries
+
+    index = incoming_matches(entries)
+    assert index[(2, 4)] == [(80, 50, [(2, 2)])]
+    assert index[(2, 3)] == [(60, 100, [(1, 1), (2, 3)])]
+
+
+def test_score_combines_match_coverage_and_surah_spread():
+    index = {(2, 3): [(100, 100, [(2, 2)])]}
+    ayah_keys = {3: (2, 3), 4: (2, 4), 9: (7, 1)}
+    # 10: موضع مطابق تماماً وآخر بلا مطابقة في نفس السورة؛ 11: سورتان بلا مطابقات
+    rows = [(10, 3, 2, 2), (10, 4, 2, 2), (11, 4, 1, 1), (11, 9, 1, 1)]
+    scores = dict(score_phrases(rows, ayah_keys, index))
+    assert scores[10] == round(0.5 * 0.5 + 0.2 * 0.5, 4)
+    assert scores[11] == 0.3
@@ -0,0 +1,53 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.services.corpus_service import QuranCorpus
+
+
+def test_scope_indices_follow_mushaf_order(corpus):
+    assert [corpus.ayah(i).id for i in corpus.scope_ayah_indices([1])] == [1, 2, 3, 4]
+    assert [corpus.ayah(i).id for i in corpus.scope_ayah_indices(quarter_ids=[2])] == [3, 4]
+    assert corpus.ayah(corpus.quarter_first_ayah_index(2)).page == 3
+
+
+def test_phrase_frequencies_and_ayah_sets_within_scope(corpus):
+    scope = corpus.scope_ayah_indices(quarter_ids=[2])
+    assert corpus.phrase_frequencies(scope) == {10: 2}
+    assert corpus.phrase_ayah_sets(scope, [10]) == {10: {3, 4}}
+    assert [(corpus.ayah(a).id, s) for a, s, _ in corpus.phrase_occurrences(10, scope)] == [(3, 2), (4, 2)]
+
+
+def test_quarter_matrix_row_sum_matches_ayah_scan(corpus):
+    for juz, quarters in (([1], []), ([], [2]), ([], [1, 2, 2])):
+        scope = corpus.scope_ayah_indices(juz, quarters)
+        assert corpus.scope_phrase_frequencies(juz, quarters) == corpus.phrase_frequencies(scope)
+
+
+def test_quarter_matrix_uses_persisted_rows_when_given():
+    corpus = QuranCorpus(
+        version='t', ayah_rows=[], quarter_rows=[(1, 1, 1, 'الم')],
+        phrase_rows=[(10, 'يؤمنون', 'يؤمنون', 1, 2, 0.0)], occurrence_rows=[],
+        quarter_phrase_rows=[(1, 10, 5)], normalize=lambda w: w,
+    )
+    assert corpus.scope_phrase_frequencies([1]) == {10: 5}
+
+
+def test_quarter_bounds_derived_from_ayat_when_not_persisted(corpus):
+    q1, q2 = corpus.quarters[1], corpus.quarters[2]
+    assert (q1.first_ayah_id, q1.last_ayah_id, q1.first_page, q1.last_page, q1.page_count) == (1, 2, 2, 2, 1)
+    assert (q2.first_ayah_id, q2.last_ayah_id, q2.first_page, q2.page_count) == (3, 4, 3, 1)
+    assert corpus.quarter_first_ayah(2).id == 3 and corpus.juz_first_ayah(1).id == 1
+    assert corpus.juz_first_ayah(2) is None
+
+
+def test_confusability_bands(corpus):
+    assert not corpus.has_confusability
+    corpus = QuranCorpus(
+        version='t', ayah_rows=[], quarter_rows=[],
+        phrase_rows=[(10, 'a', 'a', 1, 2, 0.2), (11, 'b', 'b', 1, 2, 0.5), (12, 'c', 'c', 1, 2, 0.3)],
+        occurrence_rows=[], normalize=lambda w: w,
+    )
+    assert corpus.has_confusability
+    assert corpus.confusability_band_ids('easy') == {10}
+    assert corpus.confusability_band_ids('medium') == {12}
+    assert corpus.confusability_band_ids('hard') == {11}
@@ -0,0 +1,27 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.normalization import normalize, normalize_with_map, normalize_words, words_by_offset
+
+
+def test_hamza_forms_stay_one_word():
+    # NFKD + حذف مدى التشكيل القديم كان يقسمها: "ا نزل" و"يو منون"
+    assert normalize('أَنزَلَ') == 'انزل'
+    assert normalize('يُؤۡمِنُونَ') == 'يومنون'
+    assert normalize('ٱلصَّلَوٰةَ') == 'الصلوه'
+    assert normalize('بِهِۦ، هُدٗى') == 'به هدي'
+
+
+def test_word_offsets_skip_removed_words_and_round_trip():
+    text = 'وَإِذۡ قَالَ ۞ رَبُّكَ'
+    tokens, offsets = normalize_words(text)
+    assert tokens == ['واذ', 'قال', 'ربك'] and offsets == [1, 2, 4]
+    assert words_by_offset(' '.join(tokens), ' '.join(map(str, offsets)), 4) == ('واذ', 'قال', '', 'ربك')
+
+
+def test_map_points_back_into_original_text():
+    text = 'ذَٰلِكَ ٱلۡكِتَٰبُ'
+    clean, index = normalize_with_map(text)
+    assert clean == normalize(text)
+    pos = clean.find('الكتب')
+    assert text[index[pos]:index[pos + 4] + 1].startswith('ٱلۡكِتَٰب')
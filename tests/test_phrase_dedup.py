@@ -0,0 +1,27 @@
+import os, sys, random
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.services.phrase_dedup import dedup_contained
+
+
+def naive_dedup(ordered, sets):
+    kept, kept_sets = [], []
+    for pid in ordered:
+        aset = sets[pid]
+        if any(aset.issubset(S) for S in kept_sets): continue
+        kept.append(pid); kept_sets.append(aset)
+    return kept
+
+
+def test_bitset_dedup_matches_naive_loop():
+    rng = random.Random(7)
+    for _ in range(50):
+        sets = {pid: set(rng.sample(range(40), rng.randint(0, 8))) for pid in range(120)}
+        ordered = list(sets)
+        rng.shuffle(ordered)
+        assert dedup_contained(ordered, sets) == naive_dedup(ordered, sets)
+
+
+def test_equal_sets_keep_first_only():
+    sets = {'a': {1, 2}, 'b': {2, 1}, 'c': {1, 2, 3}, 'd': {3}}
+    assert dedup_contained(['a', 'b', 'c', 'd'], sets) == ['a', 'c']
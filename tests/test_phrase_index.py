@@ -0,0 +1,68 @@
+import pytest
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.services.phrase_index import maximal_repeats, ngram_occurrences, select_longest_per_ayah_set
+
+
+def normalize(txt: str) -> str:
+    # نسخة مبسطة: "۞" تُحذف و"أ" تنقسم لجزأين مثل ما يحدث مع NFKD
+    return " ".join(txt.replace('۞', ' ').replace('أ', 'ا ء').split())
+
+
+AYAT = [
+    (1, 'قال رب أنى يكون لي غلام'),
+    (2, '۞ قال رب أنى يكون لي ولد'),
+    (3, 'قال رب اجعل لي ءاية قال رب أنى يكون'),
+    (4, 'وقال رب أنى يكون'),
+]
+
+
+def test_numpy_engine_matches_python_engine():
+    pytest.importorskip('numpy')
+    expected = ngram_occurrences(AYAT, 3, 7, 2, 60, normalize, engine='python')
+    actual = ngram_occurrences(AYAT, 3, 7, 2, 60, normalize, engine='numpy')
+    assert list(actual.items()) == list(expected.items())
+    assert select_longest_per_ayah_set(actual) == select_longest_per_ayah_set(expected)
+
+
+def test_longest_phrase_kept_per_ayah_set():
+    kept = ngram_occurrences(AYAT, 3, 7, 2, 60, normalize)
+    selected = dict(select_longest_per_ayah_set(kept))
+    # "قال رب أنى يكون" أطول من "قال رب أنى" وبنفس الآيات {1, 2, 3} فتغني عنها
+    assert [o[0] for o in selected['قال رب ا ءنى يكون']] == [1, 2, 2, 3]
+    assert 'قال رب ا ءنى' not in selected
+
+
+def brute_force_maximal_repeats(ayat, min_n):
+    # كل تسلسل كلمات متكرر لا تتبع/تسبق كل مواضعه نفس الكلمة
+    segments = []
+    for ayah_id, text in ayat:
+        seg = []
+        for i, w in enumerate(text.split()):
+            if normalize(w):
+                seg.append((normalize(w), ayah_id, i))
+            else:
+                segments.append(seg); seg = []
+        segments.append(seg)
+    occs = {}
+    for seg in segments:
+        for i in range(len(seg)):
+            for j in range(i + min_n, len(seg) + 1):
+                key = tuple(t[0] for t in seg[i:j])
+                prev = seg[i - 1][0] if i > 0 else object()
+                nxt = seg[j][0] if j < len(seg) else object()
+                occs.setdefault(key, []).append((seg[i][1], seg[i][2] + 1, prev, nxt))
+    out = {}
+    for key, v in occs.items():
+        if len(v) < 2 or len({o[2] for o in v}) == 1 or len({o[3] for o in v}) == 1:
+            continue
+        out[" ".join(key)] = sorted((a, s) for a, s, _, _ in v)
+    return out
+
+
+def test_suffix_engine_finds_exactly_the_maximal_repeats():
+    found = maximal_repeats(AYAT, 2, normalize)
+    assert {k: [(a, s) for a, s, _, _ in v] for k, v in found.items()} == brute_force_maximal_repeats(AYAT, 2)
+    # بدون حد أعلى للطول: التكرار الكامل "قال رب أنى يكون لي" يظهر كعبارة واحدة
+    assert 'قال رب ا ءنى يكون لي' in found
@@ -1,40 +1,50 @@
 import pytest
-import os, sys
+import os, sys, random
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from tests_app.question_generators.similar_count import SimilarCountQuestionGenerator
 from tests_app.question_generators.similar_on_pages import SimilarOnPagesQuestionGenerator
-from tests_app.question_generators.verse_location_quarters import VerseLocationQuestionGenerator
+from tests_app.question_generators.verse_location_quarters import VerseLocationQuestionGenerator, quarter_options
 from tests_app.services.question_generator_factory import QuestionGeneratorFactory
 
 
-class DummySession:
-    def __init__(self, test_type: str):
-        self.test_type = test_type
+def test_similar_count_strategy_generates_expected_questions(corpus):
+    gen = SimilarCountQuestionGenerator(pool_store=False)
+    questions = gen.generate(None, 3, 'easy', juz_ids=[1], corpus=corpus, rng=random.Random(1))
+    assert [q['phrase_id'] for q in questions] == [10]
+    assert questions[0]['question_type'] == 'similar_count'
+    assert questions[0]['correct_count'] == 2
+    assert [a['ayah_id'] for a in questions[0]['literal_ayahs']] == [3, 4]
 
 
-def test_similar_count_strategy_generates_expected_questions():
-    gen = SimilarCountQuestionGenerator()
-    session = DummySession('similar_count')
-    questions = gen.generate(session, 3, 'easy')
-    assert len(questions) == 3
-    assert all(q['question_type'] == 'similar_count' for q in questions)
-
-
-def test_similar_on_pages_strategy_generates_expected_questions():
-    gen = SimilarOnPagesQuestionGenerator()
-    session = DummySession('similar_on_pages')
-    questions = gen.generate(session, 2, 'medium')
-    assert len(questions) == 2
+def test_similar_on_pages_strategy_generates_expected_questions(corpus):
+    gen = SimilarOnPagesQuestionGenerator(pool_store=False)
+    questions = gen.generate(None, 2, 'easy', quarter_ids=[2], corpus=corpus, rng=random.Random(1))
+    assert len(questions) == 1
     assert all(q['question_type'] == 'similar_on_pages' for q in questions)
+    assert questions[0]['positions_answered'] == [] and questions[0]['positions_wrong'] == []
+    # لا عبارات متوسطة في الربع الثاني
+    assert gen.generate(None, 2, 'medium', quarter_ids=[2], corpus=corpus, rng=random.Random(1)) == []
 
 
-def test_verse_location_strategy_generates_expected_questions():
+def test_verse_location_strategy_generates_expected_questions(corpus):
     gen = VerseLocationQuestionGenerator()
-    session = DummySession('verse_location_quarters')
-    questions = gen.generate(session, 1, 'hard')
-    assert len(questions) == 1
-    assert questions[0]['question_type'] == 'verse_location_quarters'
+    questions = gen.generate(None, 2, 'medium', juz_ids=[1], corpus=corpus, rng=random.Random(1))
+    # الآية 1 بداية الربع الأول مستبعدة، و3 قصيرة (صعبة)
+    assert sorted(q['ayah_id'] for q in questions) == [2, 4]
+    by_id = {q['ayah_id']: q for q in questions}
+    assert by_id[2]['correct_quarter'] == 1 and by_id[4]['correct_quarter'] == 2
+    assert by_id[4]['quarter_start_page'] == 3 and by_id[4]['correct_page_in_quarter'] == 1
+    for q in questions:
+        assert q['question_type'] == 'verse_location_quarters'
+        assert q['correct_quarter'] in q['quarter_options'] and len(set(q['quarter_options'])) == 4
+    # ثلاث آيات فقط مؤهلة في النطاق
+    assert gen.generate(None, 4, 'mixed', juz_ids=[1], corpus=corpus) == []
+
+
+def test_quarter_options_stay_near_the_correct_quarter():
+    assert quarter_options(1, 1) == [1, 2, 5, 3]
+    assert quarter_options(30, 4) == [120, 119, 116, 118]
 
 
 def test_factory_returns_correct_strategy():
@@ -46,6 +56,10 @@ def test_factory_returns_correct_strategy():
         QuestionGeneratorFactory.get_generator('similar_on_pages'),
         SimilarOnPagesQuestionGenerator,
     )
+    assert isinstance(
+        QuestionGeneratorFactory.get_generator('similar_positions_on_pages'),
+        SimilarOnPagesQuestionGenerator,
+    )
     assert isinstance(
         QuestionGeneratorFactory.get_generator('verse_location_quarters'),
         VerseLocationQuestionGenerator,
@@ -0,0 +1,23 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.services.question_materializer import QuestionMaterializer
+
+
+def test_literal_ayahs_for_selected_phrases_in_one_pass(corpus):
+    m = QuestionMaterializer(corpus, corpus.scope_ayah_indices([1]))
+    literal = m.literal_ayahs([10, 11])
+    assert [(a['ayah_id'], a['surah_name'], a['positions']) for a in literal[10]] == [
+        (3, 'البقرة', [{'start_word': 2, 'end_word': 2}]),
+        (4, 'البقرة', [{'start_word': 2, 'end_word': 2}]),
+    ]
+    assert literal[11][0]['quarter_label'] == 'الم' and literal[11][0]['count'] == 1
+
+
+def test_similar_questions_keep_selection_order(corpus):
+    m = QuestionMaterializer(corpus, corpus.scope_ayah_indices(quarter_ids=[2]))
+    selected = [{'phrase_id': pid, 'phrase_text': str(pid), 'correct_count': 2, 'occurrence_ayah_ids': []} for pid in (11, 10)]
+    qs = m.similar_questions(selected)
+    assert [q['phrase_id'] for q in qs] == [11, 10]
+    assert qs[0]['literal_ayahs'] == [] and len(qs[1]['literal_ayahs']) == 2
+    assert qs[1]['given_answer'] is None
@@ -0,0 +1,43 @@
+import os, sys, random
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.services.corpus_service import QuranCorpus
+from core.services.question_pool import build_pool, sample_pool
+
+
+def test_pool_counts_frequency_over_whole_quarter_set(corpus):
+    assert build_pool(corpus, [2])['easy'] == [[10, 2, [3, 4]]]
+    # عبارة مرة واحدة في كل ربع: لا تظهر في مجمّع أي ربع منفرداً، بل في مجمّع الربعين معاً
+    corpus = QuranCorpus(
+        version='t', ayah_rows=[(a.id, a.surah, a.number, a.quarter_id, a.juz, a.page, a.line, a.text)
+                                for a in map(corpus.ayah, range(len(corpus)))],
+        quarter_rows=[(1, 1, 1, 'الم'), (2, 1, 2, 'الذين')],
+        phrase_rows=[(10, 'يؤمنون', 'يؤمنون', 1, 2, 0.0)],
+        occurrence_rows=[(10, 2, 1, 1), (10, 4, 2, 2)], normalize=lambda w: w,
+    )
+    assert not any(build_pool(corpus, [1]).values()) and not any(build_pool(corpus, [2]).values())
+    assert build_pool(corpus, [1, 2])['easy'] == [[10, 2, [2, 4]]]
+
+
+def test_pool_uses_confusability_bands_with_frequency_fallback(corpus):
+    corpus = QuranCorpus(
+        version='t', ayah_rows=[(a.id, a.surah, a.number, a.quarter_id, a.juz, a.page, a.line, a.text)
+                                for a in map(corpus.ayah, range(len(corpus)))],
+        quarter_rows=[(1, 1, 1, 'الم'), (2, 1, 2, 'الذين')],
+        phrase_rows=[(10, 'يؤمنون', 'يؤمنون', 3, 2, 0.5), (12, 'ذلك', 'ذلك', 5, 2, 0.0)],
+        occurrence_rows=[(10, 3, 2, 2), (10, 4, 2, 2), (12, 1, 1, 1), (12, 2, 1, 1)], normalize=lambda w: w,
+    )
+    assert corpus.confusability_band_ids('hard') == {10} and corpus.confusability_band_ids('easy') == set()
+    pool = build_pool(corpus, [1, 2])
+    # 10 من درجة التباسها (تكراره وطوله خارج كل المستويات)، و12 بلا درجة من طوله وتكراره
+    assert pool['hard'] == [[10, 2, [3, 4]]]
+    assert pool['easy'] == [[12, 2, [1, 2]]]
+
+
+def test_sample_pool_mixed_and_fixed_difficulty(corpus):
+    pool = {'easy': [[10, 2, [3, 4]]], 'medium': [[11, 3, [2]]], 'hard': []}
+    mixed = sample_pool(corpus, pool, 5, 'mixed', random.Random(1))
+    assert sorted(c['phrase_id'] for c in mixed) == [10, 11]
+    assert [c['phrase_id'] for c in sample_pool(corpus, pool, 5, 'medium')] == [11]
+    # مستوى فارغ: لا أسئلة (الواجهة تعرض رسالة المستوى)
+    assert sample_pool(corpus, pool, 1, 'hard') == []
@@ -0,0 +1,28 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.services.corpus_service import QuranCorpus
+from core.services.scope_metadata import JuzEntry, ScopeMetadata
+
+
+def test_quarters_map_and_allowed_juz_follow_pages():
+    # الربع 3 (الجزء الثاني) بلا صفحات
+    corpus = QuranCorpus(
+        version='t',
+        ayah_rows=[
+            (1, 2, 1, 1, 1, 2, 1, 'الم'),
+            (2, 2, 2, 2, 1, 3, 1, 'ذلك الكتاب'),
+            (3, 2, 142, 3, 2, None, None, 'سيقول السفهاء'),
+        ],
+        quarter_rows=[(2, 1, 2, 'ذلك'), (1, 1, 1, 'الم'), (3, 2, 1, 'سيقول')],
+        phrase_rows=[], occurrence_rows=[], normalize=lambda w: w,
+    )
+    meta = ScopeMetadata(corpus)
+    assert list(meta.juz_quarters_map) == [JuzEntry(1), JuzEntry(2)]
+    assert [q.id for q in meta.quarters(1)] == [1, 2]
+    assert meta.juz_quarters_map[JuzEntry(1)]['first_label'] == 'الم'
+
+    assert meta.allowed_juz_numbers() == [1]
+    assert meta.allowed_juz_numbers(juz_ids=['1', '2']) == [1]
+    assert meta.allowed_juz_numbers(quarter_ids=[3]) == [1]
+    assert meta.allowed_juz_numbers(quarter_ids=[2]) == [1]
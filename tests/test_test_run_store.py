@@ -0,0 +1,34 @@
+import os, sys, random
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from core.services.test_run_store import DISPLAY_KEYS, apply_deltas, compact, deltas, rehydrate
+from tests_app.question_generators.similar_count import SimilarCountQuestionGenerator
+from tests_app.question_generators.verse_location_quarters import VerseLocationQuestionGenerator
+
+
+def test_compact_round_trip_restores_display_fields(corpus):
+    similar = SimilarCountQuestionGenerator(pool_store=False).generate(
+        None, 2, 'easy', juz_ids=[1], corpus=corpus, rng=random.Random(1))
+    location = VerseLocationQuestionGenerator().generate(
+        None, 2, 'medium', juz_ids=[1], corpus=corpus, rng=random.Random(1))
+    questions = similar + location
+    questions[0]['given_answer'] = 3
+
+    stored = compact(questions)
+    assert not any(k in q for q in stored for k in DISPLAY_KEYS)
+    assert rehydrate(corpus, stored) == questions
+
+
+def test_seed_regenerates_questions_and_deltas_round_trip(corpus):
+    for generator, difficulty in ((SimilarCountQuestionGenerator(pool_store=False), 'mixed'),
+                                  (VerseLocationQuestionGenerator(), 'mixed')):
+        first = generator.generate(None, 3, difficulty, juz_ids=[1, 2], corpus=corpus, rng=random.Random(7))
+        again = generator.generate(None, 3, difficulty, quarter_ids=[], juz_ids=[2, 1], corpus=corpus,
+                                   rng=random.Random(7))
+        assert first and again == first
+
+        answered = [dict(q) for q in first]
+        answered[0]['given_answer'] = 2
+        changes = deltas(first, answered)
+        assert changes == [{'given_answer': 2}] + [{}] * (len(first) - 1)
+        assert apply_deltas(first, changes) == answered
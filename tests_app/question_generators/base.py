@@ -0,0 +1,68 @@
+import random
+from typing import Iterable, List, Optional, Tuple
+
+from core.services.corpus_service import QuranCorpus
+
+
+class BaseQuestionGenerator:
+    """
+    أساس مشترك للاستراتيجيات: تحديد النطاق ولقطة المصحف ومصدر العشوائية.
+    كل التوليد يعمل على لقطة المصحف في الذاكرة (QuranCorpus) بدون استعلامات.
+    """
+
+    question_type = ''
+
+    def generate(
+        self,
+        session,
+        num_questions: int,
+        difficulty: str,
+        *,
+        juz_ids: Optional[Iterable[int]] = None,
+        quarter_ids: Optional[Iterable[int]] = None,
+        corpus: Optional[QuranCorpus] = None,
+        rng: Optional[random.Random] = None,
+    ) -> List[dict]:
+        """
+        النطاق يُؤخذ من juz_ids/quarter_ids لو مُرِّرا (الواجهات تمررهما قبل
+        إنشاء الجلسة)، وإلا من أجزاء وأرباع الجلسة نفسها
+        """
+        if juz_ids is None and quarter_ids is None:
+            juz_ids, quarter_ids = self.session_scope(session)
+        if corpus is None:
+            from core.services.corpus_service import get_corpus
+            corpus = get_corpus()
+        scope_idx = corpus.scope_ayah_indices(juz_ids or (), quarter_ids or ())
+        if not scope_idx or num_questions <= 0:
+            return []
+        questions = self.build(corpus, list(juz_ids or ()), list(quarter_ids or ()), scope_idx,
+                               num_questions, difficulty, rng or random)
+        for q in questions:
+            q['question_type'] = self.question_type
+        return questions
+
+    def build(self, corpus: QuranCorpus, juz_ids: List[int], quarter_ids: List[int], scope_idx: List[int],
+              num_questions: int, difficulty: str, rng) -> List[dict]:
+        raise NotImplementedError
+
+    def rebuild(self, session, rows: List, corpus: QuranCorpus, rng: random.Random) -> List[dict]:
+        """
+        أسئلة الجلسة كما وُلِّدت من صفوف TestQuestion الخاصة بها (بترتيب الأسئلة)،
+        لو تعذرت إعادة توليدها من البذرة؛ سؤال لكل صف حتى تبقى الإجابات على ترتيبها
+        """
+        juz_ids, quarter_ids = self.session_scope(session)
+        scope_idx = corpus.scope_ayah_indices(juz_ids, quarter_ids)
+        questions = self.build_from_rows(corpus, scope_idx, rows, rng)
+        for q in questions:
+            q['question_type'] = self.question_type
+        return questions
+
+    def build_from_rows(self, corpus: QuranCorpus, scope_idx: List[int], rows: List, rng) -> List[dict]:
+        raise NotImplementedError
+
+    @staticmethod
+    def session_scope(session) -> Tuple[List[int], List[int]]:
+        if session is None or not getattr(session, 'pk', None):
+            return [], []
+        return (list(session.juzs.values_list('number', flat=True)),
+                list(session.quarters.values_list('id', flat=True)))
@@ -1,12 +1,47 @@
-class SimilarCountQuestionGenerator:
-    """Strategy for generating similar count questions."""
-
-    def generate(self, session, num_questions: int, difficulty: str):
-        return [
-            {
-                "question_type": "similar_count",
-                "difficulty": difficulty,
-                "index": i + 1,
-            }
-            for i in range(num_questions)
-        ]
+from typing import List
+
+from core.services.corpus_service import QuranCorpus
+from core.services.question_materializer import QuestionMaterializer
+from core.services.question_pool import Pool, build_pool, sample_pool
+from tests_app.question_generators.base import BaseQuestionGenerator
+
+
+class SimilarCountQuestionGenerator(BaseQuestionGenerator):
+    """
+    Strategy for generating similar count questions.
+
+    المرشحون من مجمّع النطاق (QuestionPool)، ثم عينة حسب الصعوبة، ثم تُبنى
+    المواضع للمختار فقط. pool_store=False يحسب المجمّع مباشرة بدون قاعدة بيانات.
+    """
+
+    question_type = 'similar_count'
+
+    def __init__(self, pool_store: bool = True):
+        self.pool_store = pool_store
+
+    def pool(self, corpus: QuranCorpus, juz_ids: List[int], quarter_ids: List[int]) -> Pool:
+        if self.pool_store:
+            from core.services.question_pool_service import QuestionPoolService
+            return QuestionPoolService(corpus).get(juz_ids, quarter_ids)
+        return build_pool(corpus, sorted(set(corpus.scope_quarter_ids(juz_ids, quarter_ids))))
+
+    def build(self, corpus, juz_ids, quarter_ids, scope_idx, num_questions, difficulty, rng):
+        pool = self.pool(corpus, juz_ids, quarter_ids)
+        if not any(pool.values()):
+            return []
+        selected = sample_pool(corpus, pool, num_questions, difficulty, rng)
+        return QuestionMaterializer(corpus, scope_idx).similar_questions(selected)
+
+    def build_from_rows(self, corpus, scope_idx, rows, rng):
+        # الصف يحمل العبارة والعدد الصحيح، والمواضع من النطاق في اللقطة الحالية
+        occ = corpus.phrase_ayah_sets(scope_idx, [row.phrase_id for row in rows])
+        selected = []
+        for row in rows:
+            phrase = corpus.phrase(row.phrase_id)
+            selected.append({
+                'phrase_id': row.phrase_id,
+                'phrase_text': phrase.text if phrase else row.question_text or '',
+                'correct_count': int(row.correct_answer),
+                'occurrence_ayah_ids': sorted(occ.get(row.phrase_id, ())),
+            })
+        return QuestionMaterializer(corpus, scope_idx).similar_questions(selected)
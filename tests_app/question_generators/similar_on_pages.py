@@ -1,12 +1,28 @@
-class SimilarOnPagesQuestionGenerator:
-    """Strategy for generating similar-on-pages questions."""
-
-    def generate(self, session, num_questions: int, difficulty: str):
-        return [
-            {
-                "question_type": "similar_on_pages",
-                "difficulty": difficulty,
-                "index": i + 1,
-            }
-            for i in range(num_questions)
-        ]
+from tests_app.question_generators.similar_count import SimilarCountQuestionGenerator
+
+
+class SimilarOnPagesQuestionGenerator(SimilarCountQuestionGenerator):
+    """
+    Strategy for generating similar-on-pages questions.
+
+    نفس أسئلة المتشابهات مع حالة تحديد المواضع على الصفحات.
+    """
+
+    question_type = 'similar_on_pages'
+
+    def build(self, corpus, juz_ids, quarter_ids, scope_idx, num_questions, difficulty, rng):
+        return self.with_positions(
+            super().build(corpus, juz_ids, quarter_ids, scope_idx, num_questions, difficulty, rng))
+
+    def build_from_rows(self, corpus, scope_idx, rows, rng):
+        return self.with_positions(super().build_from_rows(corpus, scope_idx, rows, rng))
+
+    @staticmethod
+    def with_positions(questions):
+        for q in questions:
+            q.update({
+                'positions_answered': [],  # المواضع التي تم الإجابة عليها
+                'positions_correct': [],  # المواضع الصحيحة
+                'positions_wrong': [],    # المواضع الخاطئة
+            })
+        return questions
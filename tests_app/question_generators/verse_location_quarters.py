@@ -1,12 +1,197 @@
-class VerseLocationQuestionGenerator:
-    """Strategy for generating verse location questions."""
-
-    def generate(self, session, num_questions: int, difficulty: str):
-        return [
-            {
-                "question_type": "verse_location_quarters",
-                "difficulty": difficulty,
-                "index": i + 1,
-            }
-            for i in range(num_questions)
-        ]
+import json
+from typing import List, Optional
+
+from tests_app.question_generators.base import BaseQuestionGenerator
+
+# آخر رقم ربع في ترقيم (الجزء - 1) * 4 + رقم الربع في الجزء
+LAST_QUARTER_NUMBER = 120
+
+PAGE_IN_QUARTER_OPTIONS = [1, 2, 3, 4]
+
+# نسب الاختيار في المستوى المختلط
+MIXED_SHARE = {'easy': 0.40, 'medium': 0.45}
+
+
+def quarter_number(juz: int, quarter_in_juz: int) -> int:
+    """رقم الربع الإجمالي = (رقم الجزء - 1) * 4 + رقم الربع في الجزء"""
+    return (juz - 1) * 4 + quarter_in_juz
+
+
+def ayah_difficulty_by_count(word_count: int) -> str:
+    """تصنيف الآية حسب عدد كلماتها: القصيرة أصعب في تحديد موقعها"""
+    if word_count <= 3:
+        return 'hard'
+    if word_count <= 6:
+        return 'medium'
+    return 'easy'
+
+
+def page_in_quarter(current_page: Optional[int], quarter_start_page: int) -> int:
+    """رقم صفحة الآية داخل ربعها (1..4) من فرق الصفحة عن بداية الربع"""
+    if not current_page:
+        return 1
+    diff = current_page - quarter_start_page
+    if diff < 0:
+        # الصفحة قبل بداية الربع تُعتبر الصفحة الأولى
+        return 1
+    if diff <= 3:
+        return diff + 1
+    # فجوة أكبر من 3 صفحات: كل 4 صفحات = ربع جديد
+    if diff <= 7:
+        return 1
+    if diff <= 11:
+        return 2
+    if diff <= 15:
+        return 3
+    return 4
+
+
+def quarter_options(juz: int, quarter_in_juz: int) -> List[int]:
+    """
+    الربع الصحيح أولاً ثم أرباع قريبة منه: من نفس الجزء، ثم نفس الربع في
+    الجزء المجاور، ثم فجوات أكبر، وأخيراً أي ربع متاح حتى 4 خيارات
+    """
+    current = quarter_number(juz, quarter_in_juz)
+    options = [current]
+    if quarter_in_juz > 1:
+        options.append(quarter_number(juz, quarter_in_juz - 1))
+    if quarter_in_juz < 4:
+        options.append(quarter_number(juz, quarter_in_juz + 1))
+
+    while len(options) < 4:
+        if juz > 1:
+            prev_juz_quarter = quarter_number(juz - 1, quarter_in_juz)
+            if prev_juz_quarter > 0 and prev_juz_quarter not in options:
+                options.append(prev_juz_quarter)
+                continue
+        if juz < 30:
+            next_juz_quarter = quarter_number(juz + 1, quarter_in_juz)
+            if next_juz_quarter <= LAST_QUARTER_NUMBER and next_juz_quarter not in options:
+                options.append(next_juz_quarter)
+                continue
+        if quarter_in_juz > 2:
+            far_prev = quarter_number(juz, quarter_in_juz - 2)
+            if far_prev > 0 and far_prev not in options:
+                options.append(far_prev)
+                continue
+        if quarter_in_juz < 3:
+            far_next = quarter_number(juz, quarter_in_juz + 2)
+            if far_next <= LAST_QUARTER_NUMBER and far_next not in options:
+                options.append(far_next)
+                continue
+
+        # أرباع مجاورة برقم ربع مختلف من الجزء السابق ثم التالي
+        if juz > 1:
+            for offset in (-1, 1):
+                if 1 <= quarter_in_juz + offset <= 4:
+                    adj = quarter_number(juz - 1, quarter_in_juz + offset)
+                    if adj > 0 and adj not in options:
+                        options.append(adj)
+                        break
+        if len(options) < 4 and juz < 30:
+            for offset in (-1, 1):
+                if 1 <= quarter_in_juz + offset <= 4:
+                    adj = quarter_number(juz + 1, quarter_in_juz + offset)
+                    if adj <= LAST_QUARTER_NUMBER and adj not in options:
+                        options.append(adj)
+                        break
+
+        if len(options) < 4:
+            for i in range(1, LAST_QUARTER_NUMBER + 1):
+                if i not in options:
+                    options.append(i)
+                    break
+    return options
+
+
+class VerseLocationQuestionGenerator(BaseQuestionGenerator):
+    """
+    Strategy for generating verse location questions.
+
+    سؤال لكل آية مختارة: في أي ربع هي، وفي أي صفحة من صفحات الربع. تُستبعد
+    سورة الفاتحة وآيات بداية الأرباع، وصفحة بداية كل ربع من جدول حدود الأرباع.
+    """
+
+    question_type = 'verse_location_quarters'
+
+    def build(self, corpus, juz_ids, quarter_ids, scope_idx, num_questions, difficulty, rng):
+        # التصفية والتصنيف من أعمدة اللقطة مباشرة؛ AyahInfo يُبنى للمختار فقط
+        quarters = corpus.quarters
+        quarter_col, number_col, surah_col, words = corpus.quarter_id, corpus.number, corpus.surah, corpus.words_norm
+        by_level = {'easy': [], 'medium': [], 'hard': []}
+        total = 0
+        for i in scope_idx:
+            quarter = quarters.get(quarter_col[i])
+            if quarter is None:
+                continue
+            if quarter.index_in_juz == 1 and number_col[i] == 1:
+                continue
+            if surah_col[i] == 1:
+                continue
+            by_level[ayah_difficulty_by_count(len(words[i]))].append((i, quarter))
+            total += 1
+        if total < num_questions:
+            return []
+
+        if difficulty == 'mixed':
+            ne = max(0, round(num_questions * MIXED_SHARE['easy']))
+            nm = max(0, round(num_questions * MIXED_SHARE['medium']))
+            nh = max(0, num_questions - ne - nm)
+            selected = []
+            for level, n in (('easy', ne), ('medium', nm), ('hard', nh)):
+                selected += rng.sample(by_level[level], min(n, len(by_level[level])))
+            remaining = num_questions - len(selected)
+            if remaining > 0:
+                taken = {i for i, _ in selected}
+                rest = [e for level in ('easy', 'medium', 'hard') for e in by_level[level] if e[0] not in taken]
+                selected += rng.sample(rest, min(remaining, len(rest)))
+        else:
+            pool = by_level.get(difficulty, by_level['hard'])
+            if len(pool) < num_questions:
+                return []
+            selected = rng.sample(pool, num_questions)
+
+        questions = [self.question(corpus, i, quarter, rng) for i, quarter in selected if quarter.first_page]
+        return questions[:num_questions]
+
+    def build_from_rows(self, corpus, scope_idx, rows, rng):
+        questions = []
+        for row in rows:
+            answer = json.loads(row.correct_answer)
+            i = corpus.index_of(answer['ayah_id'])
+            quarter = corpus.quarters.get(corpus.quarter_id[i]) if i is not None else None
+            if quarter is not None and quarter.first_page:
+                questions.append(self.question(corpus, i, quarter, rng))
+            else:
+                # الآية أو ربعها لم يعد في اللقطة: السؤال كما حُفظ في الصف
+                questions.append({
+                    'ayah_id': answer['ayah_id'],
+                    'ayah_text': row.question_text or '',
+                    'correct_quarter': answer['quarter'],
+                    'quarter_options': [answer['quarter']],
+                    'correct_page_in_quarter': answer['page_in_quarter'],
+                    'page_in_quarter_options': list(PAGE_IN_QUARTER_OPTIONS),
+                    'given_answer': None,
+                    'stage': 'combined_selection',
+                })
+        return questions
+
+    @staticmethod
+    def question(corpus, i, quarter, rng) -> dict:
+        ayah = corpus.ayah(i)
+        options = quarter_options(quarter.juz, quarter.index_in_juz)
+        rng.shuffle(options)
+        return {
+            'ayah_id': ayah.id,
+            'ayah_text': ayah.text,
+            'correct_quarter': quarter_number(quarter.juz, quarter.index_in_juz),
+            'quarter_options': options,
+            'correct_page_in_quarter': page_in_quarter(ayah.page, quarter.first_page),
+            'page_in_quarter_options': list(PAGE_IN_QUARTER_OPTIONS),
+            'given_answer': None,
+            'stage': 'combined_selection',  # المرحلة المشتركة: اختيار الربع والصفحة
+            'juz_number': quarter.juz,
+            'quarter_in_juz': quarter.index_in_juz,
+            'quarter_start_page': quarter.first_page,
+            'current_page': ayah.page,
+        }
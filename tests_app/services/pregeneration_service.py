@@ -0,0 +1,131 @@
+"""
+توليد الاختبار التالي للطالب مسبقاً في الخلفية
+
+بعد انتهاء اختبار يُرسل توليد اختبار بنفس النوع والنطاق والصعوبة وعدد الأسئلة
+إلى مجمّع خيوط داخل العملية، وتُحفظ النتيجة (مع بذرتها) في ذاكرة قصيرة العمر.
+واجهة البداية تسأل الذاكرة أولاً، فمسار "اختبار جديد بنفس الاختيارات" لا ينتظر
+التوليد. الذاكرة محلية لكل عملية: لو وصل الطلب لعملية أخرى يُولَّد الاختبار
+عادياً.
+"""
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+# عمر الاختبار المولَّد مسبقاً، وأقصى عدد في ذاكرة كل عملية
+TTL_SECONDS = 15 * 60
+CACHE_SIZE = 256
+WORKERS = 2
+
+_cache: 'OrderedDict[tuple, Tuple[float, str, int, List[Dict[str, Any]]]]' = OrderedDict()
+_lock = threading.Lock()
+_counters = {'scheduled': 0, 'stored': 0, 'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def enabled() -> bool:
+    return getattr(settings, 'TEST_PREGENERATION_ENABLED', True)
+
+
+def cache_key(student_id: int, test_type: str, juz_ids: Iterable[int], quarter_ids: Iterable[int],
+              num_questions: int, difficulty: str) -> tuple:
+    return (int(student_id), test_type, tuple(sorted({int(j) for j in juz_ids or ()})),
+            tuple(sorted({int(q) for q in quarter_ids or ()})), int(num_questions), difficulty)
+
+
+def schedule_next_test(test_session_id: int) -> None:
+    """توليد اختبار مثل الجلسة المنتهية في الخلفية؛ لا استعلامات في طلب المستخدم"""
+    global _executor
+    if not enabled() or not test_session_id:
+        return
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='pregenerate')
+        _counters['scheduled'] += 1
+    _executor.submit(_pregenerate, int(test_session_id))
+
+
+def take_pregenerated(student_id: int, test_type: str, juz_ids: Iterable[int], quarter_ids: Iterable[int],
+                      num_questions: int, difficulty: str) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    (البذرة، الأسئلة) لو وُلِّد اختبار بنفس الاختيارات ولم تنتهِ صلاحيته ولم
+    تتغير لقطة المصحف؛ الاختبار يُحذف من الذاكرة عند أخذه
+    """
+    if not enabled():
+        return None
+    from core.services.corpus_service import get_corpus
+
+    key = cache_key(student_id, test_type, juz_ids, quarter_ids, num_questions, difficulty)
+    version = get_corpus().version
+    with _lock:
+        entry = _cache.pop(key, None)
+        if entry is not None and (entry[0] < time.monotonic() or entry[1] != version):
+            _counters['expired'] += 1
+            entry = None
+        _counters['hits' if entry else 'misses'] += 1
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("pregenerated %s %s: %s", test_type, 'hit' if entry else 'miss', stats())
+    if entry is None:
+        return None
+    return entry[2], entry[3]
+
+
+def stats() -> Dict[str, Any]:
+    """عدادات العملية الحالية ونسبة الإصابة"""
+    with _lock:
+        out: Dict[str, Any] = dict(_counters, cached=len(_cache))
+    lookups = out['hits'] + out['misses']
+    out['hit_rate'] = out['hits'] / lookups if lookups else 0.0
+    return out
+
+
+def _pregenerate(test_session_id: int) -> None:
+    from core.models import TestSession
+    from core.services.corpus_service import get_corpus
+    from tests_app.question_generators.base import BaseQuestionGenerator
+    from tests_app.services.question_generator_factory import QuestionGeneratorFactory
+    from tests_app.services.test_service import new_generation_seed
+
+    close_old_connections()
+    try:
+        session = TestSession.objects.filter(id=test_session_id).first()
+        if session is None:
+            return
+        juz_ids, quarter_ids = BaseQuestionGenerator.session_scope(session)
+        corpus = get_corpus()
+        seed = new_generation_seed()
+        generator = QuestionGeneratorFactory.get_generator(session.test_type)
+        questions = generator.generate(None, session.num_questions, session.difficulty, juz_ids=juz_ids,
+                                       quarter_ids=quarter_ids, corpus=corpus, rng=random.Random(seed))
+        if not questions:
+            return
+        key = cache_key(session.student_id, session.test_type, juz_ids, quarter_ids,
+                        session.num_questions, session.difficulty)
+        _store(key, corpus.version, seed, questions)
+    except Exception:
+        logger.exception("pre-generation failed for TestSession %s", test_session_id)
+    finally:
+        connection.close()
+
+
+def _store(key: tuple, version: str, seed: int, questions: List[Dict[str, Any]]) -> None:
+    """حفظ اختبار مولَّد مع حذف المنتهي، ثم الأقدم لو زادت الذاكرة عن CACHE_SIZE"""
+    with _lock:
+        _cache[key] = (time.monotonic() + TTL_SECONDS, version, seed, questions)
+        _cache.move_to_end(key)
+        _counters['stored'] += 1
+        now = time.monotonic()
+        for k in [k for k, e in _cache.items() if e[0] < now]:
+            del _cache[k]
+            _counters['expired'] += 1
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+            _counters['evicted'] += 1
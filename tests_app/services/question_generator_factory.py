@@ -9,12 +9,13 @@ class QuestionGeneratorFactory:
     _mapping = {
         "similar_count": SimilarCountQuestionGenerator,
         "similar_on_pages": SimilarOnPagesQuestionGenerator,
+        "similar_positions_on_pages": SimilarOnPagesQuestionGenerator,
         "verse_location_quarters": VerseLocationQuestionGenerator,
     }
 
     @classmethod
-    def get_generator(cls, test_type: str):
+    def get_generator(cls, test_type: str, **options):
         generator_cls = cls._mapping.get(test_type)
         if not generator_cls:
             raise ValueError(f"Unknown test type: {test_type}")
-        return generator_cls()
+        return generator_cls(**options)
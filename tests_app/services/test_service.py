@@ -1,12 +1,75 @@
 """خدمة إدارة الاختبارات"""
-from typing import Dict, List
+import json
+import random
+from typing import Any, Dict, List, Optional
 from django.db import transaction
 from django.utils import timezone
 
-from core.models import Student, TestSession, Juz, Quarter
+from core.models import Student, TestSession, TestQuestion, Juz, Quarter
+from core.services.corpus_service import get_corpus
+from core.services.question_materializer import QuestionMaterializer
 from .question_generator_factory import QuestionGeneratorFactory
 
 
+def question_row_fields(question: Dict[str, Any], test_type: str) -> Dict[str, Any]:
+    """
+    محتوى صف TestQuestion من سؤال السيشن: أسئلة المتشابهات تحفظ العبارة
+    والعدد الصحيح، وأسئلة موقع الآية تحفظ نص الآية والربع والصفحة الصحيحين
+    """
+    fields = {'question_type': question.get('question_type') or test_type}
+    if 'phrase_id' in question:
+        fields.update(
+            phrase_id=question['phrase_id'],
+            question_text=question.get('phrase_text', ''),
+            correct_answer=str(question.get('correct_count', '')),
+        )
+    elif 'ayah_id' in question:
+        fields.update(
+            question_text=question.get('ayah_text', ''),
+            correct_answer=json.dumps({
+                'ayah_id': question['ayah_id'],
+                'quarter': question.get('correct_quarter'),
+                'page_in_quarter': question.get('correct_page_in_quarter'),
+            }),
+        )
+    return fields
+
+
+def new_generation_seed() -> int:
+    """بذرة جلسة جديدة؛ أقل من 2^53 لتبقى دقيقة عند مرورها بـ JSON"""
+    return random.SystemRandom().randrange(1 << 53)
+
+
+def regenerate_questions(session: TestSession, corpus=None) -> Optional[List[Dict]]:
+    """
+    أسئلة الجلسة كما وُلِّدت عند بدايتها (قبل أي إجابة) من بذرتها ونطاقها.
+    None لو الجلسة بلا بذرة أو تغيّر إصدار لقطة المصحف بعد توليدها.
+    """
+    if session.generation_seed is None:
+        return None
+    corpus = corpus or get_corpus()
+    if session.corpus_version != corpus.version:
+        return None
+    generator = QuestionGeneratorFactory.get_generator(session.test_type)
+    return generator.generate(session, session.num_questions, session.difficulty,
+                              corpus=corpus, rng=random.Random(session.generation_seed))
+
+
+def questions_from_rows(session: TestSession, corpus=None) -> Optional[List[Dict]]:
+    """
+    أسئلة الجلسة مبنية من صفوف TestQuestion الخاصة بها على اللقطة الحالية،
+    لو تعذرت إعادة توليدها من البذرة (تغيّر إصدار اللقطة أثناء الاختبار).
+    عشوائية ترتيب الخيارات من بذرة الجلسة حتى تبني كل العمليات الأسئلة نفسها.
+    None لو الجلسة بلا صفوف.
+    """
+    rows = list(session.questions.order_by('id'))
+    if not rows:
+        return None
+    corpus = corpus or get_corpus()
+    generator = QuestionGeneratorFactory.get_generator(session.test_type)
+    return generator.rebuild(session, rows, corpus, random.Random(session.generation_seed))
+
+
 class TestService:
     """خدمة إدارة الاختبارات"""
     
@@ -20,9 +83,13 @@ class TestService:
         selected_quarters: List[int],
         num_questions: int,
         difficulty: str = 'mixed',
-        position_order: str = 'normal'
+        position_order: str = 'normal',
+        generation_seed: Optional[int] = None,
     ) -> TestSession:
-        """إنشاء جلسة اختبار جديدة"""
+        """
+        إنشاء جلسة اختبار جديدة؛ generation_seed هي بذرة توليد أسئلتها
+        (انظر regenerate_questions)
+        """
         
         with transaction.atomic():
             # إنشاء جلسة الاختبار
@@ -32,7 +99,9 @@ class TestService:
                 num_questions=num_questions,
                 difficulty=difficulty,
                 position_order=position_order,
-                started_at=timezone.now()
+                started_at=timezone.now(),
+                generation_seed=generation_seed,
+                corpus_version=get_corpus().version,
             )
             
             # إضافة الأجزاء المختارة
@@ -45,27 +114,76 @@ class TestService:
             
             return session
     
+    def create_test_questions(self, session: TestSession, questions: List[Dict]) -> List[int]:
+        """صفوف TestQuestion لكل الأسئلة في INSERT واحد، ثم معرّفاتها بترتيب الأسئلة"""
+        TestQuestion.objects.bulk_create([
+            TestQuestion(session=session, **question_row_fields(q, session.test_type)) for q in questions
+        ])
+        return list(TestQuestion.objects.filter(session=session).order_by('id').values_list('id', flat=True))
+
+    def detailed_results(self, session: TestSession) -> List[Dict]:
+        """
+        تفاصيل نتيجة اختبار المتشابهات من صفوف TestQuestion (بدون السيشن):
+        المواضع تُبنى من لقطة المصحف على نطاق الجلسة
+        """
+        rows = list(session.questions.order_by('id').values_list('phrase_id', 'question_text',
+                                                                 'correct_answer', 'student_response'))
+        corpus = get_corpus()
+        scope_idx = corpus.scope_ayah_indices(
+            session.juzs.values_list('number', flat=True), session.quarters.values_list('id', flat=True)
+        )
+        literal = QuestionMaterializer(corpus, scope_idx).literal_ayahs(
+            pid for pid, _, _, _ in rows if pid is not None
+        )
+        detailed = []
+        for pid, text, correct, response in rows:
+            occurrences = literal.get(pid, [])
+            detailed.append({
+                'phrase': text or '',
+                'correct_count': int(correct) if (correct or '').isdigit() else None,
+                'given_answer': int(response) if (response or '').isdigit() else None,
+                'occurrences': occurrences,
+                'total_occurrences': sum(item.get('count', 1) for item in occurrences),
+            })
+        return detailed
+
     def generate_questions_for_session(
         self,
         session: TestSession,
         num_questions: int,
         difficulty: str,
+        juz_ids: Optional[List[int]] = None,
+        quarter_ids: Optional[List[int]] = None,
     ) -> List[Dict]:
-        """إنشاء أسئلة الاختبار باستخدام أنماط التوليد المختلفة"""
+        """
+        إنشاء أسئلة الاختبار باستخدام أنماط التوليد المختلفة
+        النطاق من juz_ids/quarter_ids لو مُرِّرا، وإلا من أجزاء وأرباع الجلسة،
+        والعشوائية من بذرة الجلسة إن وُجدت
+        """
 
         generator = QuestionGeneratorFactory.get_generator(session.test_type)
-        return generator.generate(session, num_questions, difficulty)
+        return generator.generate(session, num_questions, difficulty, juz_ids=juz_ids, quarter_ids=quarter_ids,
+                                  rng=self.session_rng(session))
     
     def generate_verse_location_questions(
         self,
         session: TestSession,
         num_questions: int,
         difficulty: str,
+        juz_ids: Optional[List[int]] = None,
+        quarter_ids: Optional[List[int]] = None,
     ) -> List[Dict]:
         """واجهة متوافقة لتوليد أسئلة موقع الآيات"""
 
         generator = QuestionGeneratorFactory.get_generator('verse_location_quarters')
-        return generator.generate(session, num_questions, difficulty)
+        return generator.generate(session, num_questions, difficulty, juz_ids=juz_ids, quarter_ids=quarter_ids,
+                                  rng=self.session_rng(session))
+
+    @staticmethod
+    def session_rng(session: TestSession) -> Optional[random.Random]:
+        if session is None or session.generation_seed is None:
+            return None
+        return random.Random(session.generation_seed)
     
     def make_options(self, correct_count: int) -> List[int]:
         """اختيارات مرتّبة تصاعديًا بدون تدوير، حول الإجابة الصحيحة."""
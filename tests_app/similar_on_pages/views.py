@@ -6,8 +6,12 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 
 from core.models import Student, Juz, Quarter, Phrase, PhraseOccurrence, Ayah, TestSession, TestQuestion
+from core.services.answer_journal import AnswerJournal
+from core.services.scope_metadata import get_scope_metadata
+from core.services.test_run_store import TestRunStore
 from core.services.user_service import UserService
-from tests_app.services.test_service import TestService
+from tests_app.services.pregeneration_service import schedule_next_test, take_pregenerated
+from tests_app.services.test_service import TestService, new_generation_seed
 
 
 def _ensure_type_in_session(request):
@@ -53,13 +57,8 @@ def selection(request):
         request.session.pop('scope_label', None)
         return redirect('tests:similar_on_pages:start')
     
-    # تجهيز عرض الأجزاء + أرباعها
-    juz_list = Juz.objects.all().order_by('number')
-    juz_quarters_map = {}
-    for j in juz_list:
-        qs = list(Quarter.objects.filter(juz=j).order_by('index_in_juz'))
-        first_label = qs[0].label if qs else ''
-        juz_quarters_map[j] = {'quarters': qs, 'first_label': first_label}
+    # تجهيز عرض الأجزاء + أرباعها (من ذاكرة العملية لكل إصدار من لقطة المصحف)
+    juz_quarters_map = get_scope_metadata().juz_quarters_map
     
     return render(request, 'core/test_selection.html', {
         'student': student,
@@ -85,6 +84,10 @@ def start(request):
     desired = int(request.session.get('num_questions', 5))
     difficulty = request.session.get('difficulty', 'mixed')
     
+    # اختبار مولَّد مسبقاً بنفس الاختيارات إن وُجد
+    pregenerated = take_pregenerated(student.id, 'similar_on_pages', juz_ids, q_ids, desired, difficulty)
+    seed, questions = pregenerated or (new_generation_seed(), None)
+    
     # إنشاء جلسة الاختبار
     test_service = TestService(student)
     session = test_service.create_test_session(
@@ -92,29 +95,32 @@ def start(request):
         selected_juz=juz_ids,
         selected_quarters=q_ids,
         num_questions=desired,
-        difficulty=difficulty
+        difficulty=difficulty,
+        generation_seed=seed,
     )
     
     # إنشاء الأسئلة
-    questions = test_service.generate_questions_for_session(session, desired, difficulty)
+    if questions is None:
+        questions = test_service.generate_questions_for_session(
+            session, desired, difficulty, juz_ids=juz_ids, quarter_ids=q_ids
+        )
     
+    if not questions and difficulty != 'mixed':
+        messages.error(request, "لا توجد أسئلة مناسبة لهذا المستوى في النطاق.")
+        return redirect('tests:similar_on_pages:selection')
     if not questions:
         messages.error(request, "مافيش عبارات متشابهة كافية فى النطاق.")
         return redirect('tests:similar_on_pages:selection')
     
     # حفظ الأسئلة في الجلسة
-    request.session['questions'] = questions
+    TestRunStore(request).start(questions, session)
     request.session['test_index'] = 0
     request.session['score'] = 0
     request.session['db_session_id'] = session.id
     request.session['scope_label'] = test_service.build_scope_label(juz_ids, q_ids)
     
-    # إنشاء أسئلة في قاعدة البيانات للتتبع
-    db_qids = []
-    for _ in questions:
-        tq = TestQuestion.objects.create(session=session)
-        db_qids.append(tq.id)
-    request.session['db_question_ids'] = db_qids
+    # إنشاء أسئلة في قاعدة البيانات للتتبع (بمحتواها، في INSERT واحد)
+    request.session['db_question_ids'] = test_service.create_test_questions(session, questions)
     
     return redirect('tests:similar_on_pages:question')
 
@@ -129,7 +135,7 @@ def question(request):
     student = user_service.get_or_create_student(request.user)
     
     idx = request.session.get('test_index', 0)
-    qs = request.session.get('questions', [])
+    qs = TestRunStore(request).questions()
     total = len(qs)
     
     # انتهى الامتحان؟
@@ -147,14 +153,11 @@ def question(request):
         # علّم الجلسة كمكتملة
         db_sid = request.session.get('db_session_id')
         if db_sid:
-            from django.utils import timezone
-            TestSession.objects.filter(id=db_sid).update(
-                completed=True,
-                completed_at=timezone.now()
-            )
+            AnswerJournal(db_sid).complete()
+            schedule_next_test(db_sid)
         
         # نظّف السيشن
-        for k in ['questions', 'test_index', 'score', 'selected_juz', 'selected_quarters',
+        for k in ['questions', 'test_run_id', 'test_index', 'score', 'selected_juz', 'selected_quarters',
                   'num_questions', 'scope_label', 'difficulty', 'db_session_id', 'db_question_ids']:
             request.session.pop(k, None)
     
@@ -173,11 +176,8 @@ def question(request):
     if request.method == 'POST' and request.POST.get('action') == 'end':
         db_sid = request.session.get('db_session_id')
         if db_sid:
-            from django.utils import timezone
-            TestSession.objects.filter(id=db_sid).update(
-                completed=True,
-                completed_at=timezone.now()
-            )
+            AnswerJournal(db_sid).complete()
+            schedule_next_test(db_sid)
         request.session['test_index'] = len(qs)
         return redirect('tests:similar_on_pages:question')
     
@@ -188,7 +188,7 @@ def question(request):
             qs[idx]['given_answer'] = int(ans)
         except (ValueError, TypeError):
             qs[idx]['given_answer'] = None
-        request.session['questions'] = qs
+        TestRunStore(request).save(qs)
         
         # الصحيحة لهذا السؤال
         try:
@@ -198,12 +198,12 @@ def question(request):
         
         # سجّل الإجابة في الـDB حسب ترتيب السؤال
         db_qids = request.session.get('db_question_ids') or []
-        if isinstance(db_qids, list) and idx < len(db_qids):
+        db_sid = request.session.get('db_session_id')
+        if db_sid and isinstance(db_qids, list) and idx < len(db_qids):
             given = qs[idx]['given_answer']
             is_corr = bool(given is not None and int(given) == correct_count)
-            TestQuestion.objects.filter(id=db_qids[idx]).update(
-                student_response=str(given if given is not None else ''),
-                is_correct=is_corr
+            AnswerJournal(db_sid).record_answer(
+                db_qids[idx], str(given if given is not None else ''), is_corr, position=idx
             )
         
         # لو النوع صفحات → جهّز فلو الصفحات لهذا السؤال ولا تزود المؤشر
@@ -0,0 +1,147 @@
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from core.models import Juz, Student, TestQuestion
+from core.services import test_run_store
+from core.services.answer_journal import AnswerJournal, idle_session_ids
+from core.services.corpus_service import get_corpus
+from core.services.test_run_store import TestRunStore
+from tests.corpus_factory import make_corpus
+from tests_app.services import pregeneration_service
+from tests_app.services.pregeneration_service import _store, cache_key, stats, take_pregenerated
+from tests_app.services.test_service import TestService, new_generation_seed, regenerate_questions
+
+
+class FakeRequest:
+    def __init__(self):
+        self.session = {}
+
+
+class TestRunStoreTests(TestCase):
+    def test_seeded_run_survives_corpus_version_change(self):
+        student = Student.objects.create(user=User.objects.create(username='s1'), display_name='s1')
+        Juz.objects.create(number=1)
+        before = make_corpus('v1')
+        session = TestService(student).create_test_session(
+            'verse_location_quarters', [1], [], 2, 'medium', generation_seed=new_generation_seed())
+        session.corpus_version = before.version
+        session.save(update_fields=['corpus_version'])
+        questions = regenerate_questions(session, before)
+        self.assertTrue(questions)
+
+        request = FakeRequest()
+        TestService(student).create_test_questions(session, questions)
+        store = TestRunStore(request, corpus=before)
+        store.start(questions, session)
+        questions[0]['given_answer'] = 1
+        store.save(questions)
+
+        # عملية أخرى (لا أسئلة في ذاكرتها) بعد تغيّر إصدار اللقطة: تُبنى من صفوف الجلسة
+        test_run_store._bases.clear()
+        after = make_corpus('v2')
+        self.assertIsNone(regenerate_questions(session, after))
+        rebuilt = TestRunStore(request, corpus=after).questions()
+
+        def answers(qs):
+            return [(q['ayah_id'], q['correct_quarter'], sorted(q['quarter_options']),
+                     q['correct_page_in_quarter'], q['given_answer']) for q in qs]
+        self.assertEqual(answers(rebuilt), answers(questions))
+
+
+class AnswerJournalTests(TestCase):
+    def setUp(self):
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        settings = override_settings(ANSWER_JOURNAL_DIR=journal_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.student = Student.objects.create(user=User.objects.create(username='s1'), display_name='s1')
+        Juz.objects.create(number=1)
+
+    def start(self, request):
+        test_service = TestService(self.student)
+        session = test_service.create_test_session(
+            'verse_location_quarters', [1], [], 2, 'medium', generation_seed=new_generation_seed())
+        session.corpus_version = 'v1'
+        session.save(update_fields=['corpus_version'])
+        questions = regenerate_questions(session, make_corpus('v1'))
+        TestRunStore(request, corpus=make_corpus('v1')).start(questions, session)
+        request.session['db_session_id'] = session.id
+        return session, test_service.create_test_questions(session, questions)
+
+    def test_abandoned_test_is_flushed_when_next_test_starts(self):
+        request = FakeRequest()
+        session, qids = self.start(request)
+        AnswerJournal(session.id).record_answer(qids[0], '1', True, position=0)
+        self.assertFalse(TestQuestion.objects.get(id=qids[0]).student_response)
+        self.assertEqual(idle_session_ids(0), [session.id])
+
+        self.start(request)
+        self.assertEqual(TestQuestion.objects.get(id=qids[0]).student_response, '1')
+        self.assertEqual(idle_session_ids(0), [])
+
+    def test_flush_waits_for_the_session_lock(self):
+        request = FakeRequest()
+        session, qids = self.start(request)
+        journal = AnswerJournal(session.id)
+        journal.record_answer(qids[0], '1', True, position=0)
+        flushed = threading.Event()
+
+        def flush():
+            # بدون قاعدة بيانات: الخيط يصل للقفل فقط ثم يتوقف عنده
+            with AnswerJournal(session.id)._locked():
+                flushed.set()
+
+        with journal._locked():
+            thread = threading.Thread(target=flush)
+            thread.start()
+            self.assertFalse(flushed.wait(0.2))
+        thread.join(5)
+        self.assertTrue(flushed.is_set())
+
+
+class PregenerationCacheTests(TestCase):
+    def setUp(self):
+        pregeneration_service._cache.clear()
+        self.addCleanup(pregeneration_service._cache.clear)
+        self.version = get_corpus().version
+        self.questions = [{'phrase_id': 10, 'given_answer': None}]
+
+    def store(self, student_id, version=None, seed=1):
+        _store(cache_key(student_id, 'similar_count', [1], [], 5, 'mixed'), version or self.version, seed, self.questions)
+
+    def take(self, student_id):
+        return take_pregenerated(student_id, 'similar_count', [1], [], 5, 'mixed')
+
+    def test_hit_is_taken_once(self):
+        hits = stats()['hits']
+        self.store(1, seed=7)
+        self.assertEqual(self.take(1), (7, self.questions))
+        self.assertEqual(stats()['hits'], hits + 1)
+        self.assertIsNone(self.take(1))
+
+    def test_expired_entry_is_a_miss(self):
+        self.store(1)
+        key = cache_key(1, 'similar_count', [1], [], 5, 'mixed')
+        pregeneration_service._cache[key] = (time.monotonic() - 1,) + pregeneration_service._cache[key][1:]
+        expired = stats()['expired']
+        self.assertIsNone(self.take(1))
+        self.assertEqual(stats()['expired'], expired + 1)
+
+    def test_other_corpus_version_is_a_miss(self):
+        self.store(1, version=self.version + '-old')
+        self.assertIsNone(self.take(1))
+
+    def test_oldest_entry_is_evicted(self):
+        size = pregeneration_service.CACHE_SIZE
+        pregeneration_service.CACHE_SIZE = 2
+        self.addCleanup(setattr, pregeneration_service, 'CACHE_SIZE', size)
+        for student_id in (1, 2, 3):
+            self.store(student_id)
+        self.assertIsNone(self.take(1))
+        self.assertIsNotNone(self.take(2))
+        self.assertIsNotNone(self.take(3))